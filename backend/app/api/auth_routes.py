@@ -1,12 +1,16 @@
+from typing import Optional
 from fastapi import APIRouter, Request, Response, Depends, HTTPException
 from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
 
+from app.api.deps import create_session, get_current_user_id, get_session_token, hash_session_token
+from app.core.config import settings
 from app.db.database import get_db
-from app.services.gmail_service import GmailService
+from app.db.repository import UserRepository
+from app.services.gmail_pool import gmail_pool
+from app.services.gmail_service import GmailService, gmail_service
 
 router = APIRouter(prefix="/auth", tags=["auth"])
-gmail_service = GmailService()
 
 @router.get("/login")
 async def login():
@@ -18,26 +22,54 @@ async def login():
     return {"auth_url": auth_url}
 
 @router.get("/callback")
-async def callback(code: str, state: str = None):
-    """Handle OAuth callback from Google"""
-    success = gmail_service.get_credentials_from_code(code)
+async def callback(code: str, state: str = None, db: Session = Depends(get_db)):
+    """Handle OAuth callback from Google and store the mailbox's credentials"""
+    creds = gmail_service.exchange_code(code)
+    if creds is None:
+        return RedirectResponse(url="/auth-failed.html")
     
-    if not success:
+    # Get user profile to identify the mailbox
+    profile = GmailService(credentials=creds).get_user_profile()
+    if not profile or "emailAddress" not in profile:
         return RedirectResponse(url="/auth-failed.html")
     
-    # Get user profile to verify authentication
-    profile = gmail_service.get_user_profile()
+    user = UserRepository.save_gmail_token(db, profile["emailAddress"], creds.to_json())
+    gmail_pool.invalidate(user.id)
     
-    # On success, redirect to the frontend
-    return RedirectResponse(url="/auth-success.html")
+    # On success, start a session for the mailbox; the token travels only in an HttpOnly cookie
+    token = await create_session(db, user.id)
+    response = RedirectResponse(url="/auth-success.html")
+    response.set_cookie(
+        settings.SESSION_COOKIE_NAME,
+        token,
+        max_age=settings.SESSION_MAX_AGE_DAYS * 86400,
+        httponly=True,
+        secure=settings.SESSION_COOKIE_SECURE,
+        samesite="lax"
+    )
+    return response
+
+@router.post("/logout")
+async def logout(request: Request, db: Session = Depends(get_db)):
+    """End the caller's session"""
+    token = get_session_token(request)
+    if token:
+        UserRepository.delete_session(db, hash_session_token(token))
+    response = Response(status_code=204)
+    response.delete_cookie(settings.SESSION_COOKIE_NAME)
+    return response
 
 @router.get("/status")
-async def auth_status():
+async def auth_status(user_id: Optional[int] = Depends(get_current_user_id), db: Session = Depends(get_db)):
     """Check if the user is authenticated with Gmail"""
-    profile = gmail_service.get_user_profile() if not gmail_service.use_mock else None
+    gmail = gmail_pool.get(db, user_id)
+    if gmail is None:
+        return {"authenticated": False, "profile": None, "mock_mode": False}
+    
+    profile = gmail.get_user_profile() if not gmail.use_mock else None
     
     return {
-        "authenticated": not gmail_service.use_mock and profile is not None,
+        "authenticated": not gmail.use_mock and profile is not None,
         "profile": profile if profile else None,
-        "mock_mode": gmail_service.use_mock
-    } 
\ No newline at end of file
+        "mock_mode": gmail.use_mock
+    }
@@ -0,0 +1,86 @@
+import hashlib
+import secrets
+from datetime import timedelta
+from typing import Optional, Union
+from fastapi import Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.requests import HTTPConnection
+
+from app.core.config import settings
+from app.db.database import get_session, run_db
+from app.db.repository import UserRepository
+
+def hash_session_token(token: str) -> str:
+    """Hash under which a session token is stored"""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+async def create_session(db: Union[AsyncSession, Session], user_id: int) -> str:
+    """
+    Start a session for a user
+
+    Returns:
+        The session token, to be sent back in the session cookie or as a bearer token
+    """
+    token = secrets.token_urlsafe(32)
+    max_age = timedelta(days=settings.SESSION_MAX_AGE_DAYS)
+    await run_db(db, UserRepository.create_session, user_id, hash_session_token(token), max_age)
+    return token
+
+def get_session_token(connection: HTTPConnection) -> Optional[str]:
+    """Get the session token of a request or WebSocket handshake, from the cookie or a bearer token"""
+    authorization = connection.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token.strip():
+        return token.strip()
+    return connection.cookies.get(settings.SESSION_COOKIE_NAME) or None
+
+async def resolve_user_id(db: Union[AsyncSession, Session], connection: HTTPConnection) -> Optional[int]:
+    """
+    Get the user a request or WebSocket acts for from its session
+
+    Requests without a session use the default mailbox (token.pickle), but
+    only while no account has been connected; after that every caller needs
+    a session.
+
+    Raises:
+        LookupError: If the session token is missing, unknown or expired
+    """
+    token = get_session_token(connection)
+    if token is None:
+        if await run_db(db, UserRepository.has_users):
+            raise LookupError("Not signed in")
+        return None
+    user_id = await run_db(db, UserRepository.get_session_user_id, hash_session_token(token))
+    if user_id is None:
+        raise LookupError("Invalid or expired session")
+    return user_id
+
+async def get_current_user_id(
+    connection: HTTPConnection,
+    db: Union[AsyncSession, Session] = Depends(get_session)
+) -> Optional[int]:
+    """Get the user a request acts for from its session, or None for the default mailbox"""
+    try:
+        return await resolve_user_id(db, connection)
+    except LookupError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+async def require_stats_access(
+    connection: HTTPConnection,
+    db: Union[AsyncSession, Session] = Depends(get_session)
+):
+    """
+    Allow only operators to read the stats and metrics endpoints
+
+    With STATS_TOKEN set, callers must send it as a bearer token. Without it
+    the endpoints stay open only while no account has been connected, since
+    they describe every mailbox on the server.
+    """
+    if settings.STATS_TOKEN:
+        token = get_session_token(connection)
+        if token is not None and secrets.compare_digest(token, settings.STATS_TOKEN):
+            return
+    elif not await run_db(db, UserRepository.has_users):
+        return
+    raise HTTPException(status_code=401, detail="Stats token required")
@@ -1,42 +1,192 @@
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, Query
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Union
 import json
 
-from app.db.database import get_db
-from app.services.email_service import EmailService
+from app.api.deps import get_current_user_id, require_stats_access, resolve_user_id
+from app.core.metrics import metrics
+from app.db.database import get_db, get_session, run_db
+from app.services.body_store import body_store
+from app.services.email_service import email_service
+from app.services.embedding_index import embedding_index
+from app.services.page_cache import etag_matches, make_etag, summary_page_cache
 from app.services.websocket_service import connection_manager
+from app.services.summarization_queue import summarization_queue
+from app.services.summary_cache import summary_cache
+from app.services.sync_scheduler import sync_scheduler
+from app.utils.serialization import JSON_MEDIA_TYPE, dumps
+from app.utils.streaming import NDJSON_MEDIA_TYPE, SSE_MEDIA_TYPE, encode_stream
 
 router = APIRouter()
-email_service = EmailService()
 
 @router.get("/summaries", response_model=List[Dict[str, Any]])
 async def get_email_summaries(
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    db: Union[AsyncSession, Session] = Depends(get_session),
+    user_id: Optional[int] = Depends(get_current_user_id)
+):
+    """
+    Get email summaries, newest first
+    
+    Pages are linked by the X-Next-Cursor response header; pass it back as
+    `cursor` for the next page. `skip` keeps the older offset paging.
+    
+    Responses carry an ETag that changes whenever the mailbox's summaries do;
+    send it back in If-None-Match to get 304 Not Modified instead of the page.
+    """
+    # Read the version before the rows, so a page is never older than its tag
+    version = await email_service.get_summaries_version(db, user_id)
+    key = (user_id, skip, cursor, limit)
+    etag = make_etag(key, version)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Cookie, Authorization"}
+    
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        summary_page_cache.record_not_modified()
+        return Response(status_code=304, headers=headers)
+    
+    page = summary_page_cache.get(key, version)
+    if page is None:
+        if skip:
+            summaries, next_cursor = await email_service.get_email_summaries(db, skip, limit, user_id), None
+        else:
+            try:
+                summaries, next_cursor = await email_service.get_email_summaries_page(db, cursor, limit, user_id)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+        page = summary_page_cache.put(key, version, dumps(summaries), next_cursor)
+    
+    if page.next_cursor:
+        headers["X-Next-Cursor"] = page.next_cursor
+    return Response(content=page.body, media_type=JSON_MEDIA_TYPE, headers=headers)
+
+@router.get("/search", response_model=List[Dict[str, Any]])
+async def search_emails(
+    q: str = Query(..., min_length=1, max_length=500, description="Words to search for; end a word with * to match a prefix"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: Union[AsyncSession, Session] = Depends(get_session),
+    user_id: Optional[int] = Depends(get_current_user_id)
 ):
-    """Get all email summaries"""
-    return email_service.get_email_summaries(db, skip, limit)
+    """Search email subjects, senders, bodies and summaries, best match first"""
+    return await email_service.search_emails(db, q, skip, limit, user_id)
+
+@router.get("/emails/{email_id}/related", response_model=List[Dict[str, Any]])
+async def get_related_emails(
+    email_id: int,
+    limit: int = Query(10, ge=1, le=100),
+    db: Union[AsyncSession, Session] = Depends(get_session),
+    user_id: Optional[int] = Depends(get_current_user_id)
+):
+    """Get the emails most similar in content to an email, most similar first"""
+    related = await email_service.get_related_emails(db, email_id, limit, user_id)
+    if related is None:
+        raise HTTPException(status_code=404, detail="Email not found")
+    return related
+
+@router.get("/emails/{email_id}/body")
+async def get_email_body(
+    email_id: int,
+    db: Union[AsyncSession, Session] = Depends(get_session),
+    user_id: Optional[int] = Depends(get_current_user_id)
+):
+    """Get an email's full body; `body` is null once retention has dropped it"""
+    body = await email_service.get_email_body(db, email_id, user_id)
+    if body is None:
+        raise HTTPException(status_code=404, detail="Email not found")
+    return body
+
+@router.post("/refresh", status_code=202)
+async def refresh_emails(user_id: Optional[int] = Depends(get_current_user_id)):
+    """Queue a job that fetches new emails and creates summaries, or join the running one"""
+    job = email_service.start_refresh_job(user_id)
+    message = "Refresh queued" if job.status == "queued" else "Refresh already running"
+    return {"message": message, "job_id": job.id, "status": job.status}
+
+@router.post("/refresh/stream")
+async def refresh_emails_stream(request: Request, user_id: Optional[int] = Depends(get_current_user_id)):
+    """
+    Start or join a refresh and stream each summary as soon as it is saved
 
-@router.post("/refresh")
-async def refresh_emails(db: Session = Depends(get_db)):
-    """Fetch new emails and create summaries"""
-    summaries = await email_service.fetch_and_summarize_emails(db)
-    return {"message": f"Processed {len(summaries)} new emails", "summaries": summaries}
+    Records are newline-delimited JSON, or Server-Sent Events when the
+    request accepts text/event-stream.
+    """
+    job = email_service.start_refresh_job(user_id)
+    sse = SSE_MEDIA_TYPE in request.headers.get("accept", "")
+    return StreamingResponse(
+        encode_stream(email_service.stream_refresh_job(job), sse),
+        media_type=SSE_MEDIA_TYPE if sse else NDJSON_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Job-Id": job.id}
+    )
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str, user_id: Optional[int] = Depends(get_current_user_id)):
+    """Get the status of a refresh job"""
+    job = summarization_queue.get_job(job_id)
+    if not job or job.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@router.get("/cache/stats", dependencies=[Depends(require_stats_access)])
+async def get_cache_stats():
+    """Get summary cache and rendered page cache hit and miss counters"""
+    return {**summary_cache.stats(), "pages": summary_page_cache.stats()}
 
 @router.put("/summaries/{summary_id}/seen")
-async def mark_summary_seen(summary_id: int, db: Session = Depends(get_db)):
+async def mark_summary_seen(
+    summary_id: int,
+    db: Union[AsyncSession, Session] = Depends(get_session),
+    user_id: Optional[int] = Depends(get_current_user_id)
+):
     """Mark a summary as seen"""
-    success = email_service.mark_summary_as_seen(db, summary_id)
+    success = await email_service.mark_summary_as_seen(db, summary_id, user_id)
     if not success:
         raise HTTPException(status_code=404, detail="Summary not found")
     return {"success": True}
 
+@router.get("/sync/stats", dependencies=[Depends(require_stats_access)])
+async def get_sync_stats():
+    """Get background sync intervals, durations and lag"""
+    return sync_scheduler.stats()
+
+@router.get("/embeddings/stats", dependencies=[Depends(require_stats_access)])
+async def get_embedding_stats():
+    """Get embedding index sizes"""
+    return embedding_index.stats()
+
+@router.get("/bodies/stats", dependencies=[Depends(require_stats_access)])
+async def get_body_stats(db: Union[AsyncSession, Session] = Depends(get_session)):
+    """Get stored body sizes and the compression ratio"""
+    return await run_db(db, body_store.stats)
+
+@router.get("/ws/stats", dependencies=[Depends(require_stats_access)])
+async def get_websocket_stats():
+    """Get WebSocket connection and message counters"""
+    return connection_manager.stats()
+
+@router.get("/metrics", dependencies=[Depends(require_stats_access)])
+async def get_metrics():
+    """Get pipeline, inference, database and WebSocket metrics in the Prometheus text format"""
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket, db: Session = Depends(get_db)):
-    """WebSocket endpoint for real-time notifications"""
-    await connection_manager.connect(websocket)
+async def websocket_endpoint(
+    websocket: WebSocket,
+    db: Session = Depends(get_db)
+):
+    """WebSocket endpoint for real-time notifications of the session's mailbox"""
+    try:
+        user_id = await resolve_user_id(db, websocket)
+    except LookupError:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await connection_manager.connect(websocket, user_id)
     try:
         while True:
             # Wait for messages from the client
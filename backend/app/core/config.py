@@ -10,18 +10,87 @@ class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     PROJECT_NAME: str = "EchoLoop"
     
+    # Session settings
+    SESSION_COOKIE_NAME: str = os.getenv("SESSION_COOKIE_NAME", "echoloop_session")
+    SESSION_COOKIE_SECURE: bool = os.getenv("SESSION_COOKIE_SECURE", "false").lower() == "true"  # Send the cookie over HTTPS only
+    SESSION_MAX_AGE_DAYS: int = int(os.getenv("SESSION_MAX_AGE_DAYS", "30"))
+    STATS_TOKEN: str = os.getenv("STATS_TOKEN", "")  # Bearer token for the stats and metrics endpoints
+    
     # Database settings
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./echoloop.db")
+    DATABASE_ASYNC: bool = os.getenv("DATABASE_ASYNC", "false").lower() == "true"  # aiosqlite / asyncpg sessions
     
     # Gmail API settings
     GMAIL_CREDENTIALS_FILE: str = os.getenv("GMAIL_CREDENTIALS_FILE", "credentials.json")
+    GMAIL_API_ENDPOINT: str = os.getenv("GMAIL_API_ENDPOINT", "")  # Override to point at a local Gmail stand-in
+    GMAIL_LIST_PAGE_SIZE: int = int(os.getenv("GMAIL_LIST_PAGE_SIZE", "100"))  # Message IDs per list page (max 500)
+    GMAIL_BATCH_SIZE: int = int(os.getenv("GMAIL_BATCH_SIZE", "50"))  # Messages per batch request (max 100)
+    GMAIL_CLIENT_POOL_SIZE: int = int(os.getenv("GMAIL_CLIENT_POOL_SIZE", "256"))  # Per-user Gmail clients kept open
+    GMAIL_MAX_CONCURRENT_SYNCS: int = int(os.getenv("GMAIL_MAX_CONCURRENT_SYNCS", "8"))  # Mailboxes fetched from Gmail at once
+    GMAIL_FETCH_CONCURRENCY: int = int(os.getenv("GMAIL_FETCH_CONCURRENCY", "4"))  # Batch requests in flight
     
     # LLM settings (Hugging Face)
     HUGGINGFACE_API_KEY: str = os.getenv("HUGGINGFACE_API_KEY", "")
     HUGGINGFACE_MODEL: str = os.getenv("HUGGINGFACE_MODEL", "google/flan-t5-base")
+    LLM_BACKEND: str = os.getenv("LLM_BACKEND", "torch")  # "torch", "torch-int8" or "onnx"
+    LLM_NUM_THREADS: int = int(os.getenv("LLM_NUM_THREADS", "0"))  # Intra-op threads; 0 keeps the runtime default
+    LLM_ONNX_DIR: str = os.getenv("LLM_ONNX_DIR", "")  # Where the ONNX export is cached
+    LLM_PRELOAD: bool = os.getenv("LLM_PRELOAD", "false").lower() == "true"  # Load at import so forked workers share the weights
+    LLM_LONG_MODE: bool = os.getenv("LLM_LONG_MODE", "false").lower() == "true"  # Map-reduce bodies longer than one chunk instead of truncating them
+    LLM_CHUNK_TOKENS: int = int(os.getenv("LLM_CHUNK_TOKENS", "512"))  # Body tokens per chunk in long mode
+    LLM_MAX_INPUT_TOKENS: int = int(os.getenv("LLM_MAX_INPUT_TOKENS", "4096"))  # Body tokens summarized per email in long mode
+    LLM_MAX_BATCH_SIZE: int = int(os.getenv("LLM_MAX_BATCH_SIZE", "16"))
+    LLM_BATCH_TOKEN_BUDGET: int = int(os.getenv("LLM_BATCH_TOKEN_BUDGET", "4096"))  # Padded input tokens per batch
+    SUMMARY_CACHE_ENABLED: bool = os.getenv("SUMMARY_CACHE_ENABLED", "true").lower() == "true"
+    SUMMARY_CACHE_SIZE: int = int(os.getenv("SUMMARY_CACHE_SIZE", "1024"))  # Entries kept in memory
+    SUMMARY_WORKERS: int = int(os.getenv("SUMMARY_WORKERS", "1"))  # Worker processes; 0 runs on a background thread
+    SUMMARY_PAGE_CACHE_SIZE: int = int(os.getenv("SUMMARY_PAGE_CACHE_SIZE", "256"))  # Rendered GET /summaries pages kept in memory; 0 disables
+    
+    # WebSocket notification settings
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", "64"))  # Outbound messages buffered per client
+    WS_SLOW_CLIENT_POLICY: str = os.getenv("WS_SLOW_CLIENT_POLICY", "disconnect")  # "disconnect" or "drop" when a client's buffer is full
+    WS_BATCH_WINDOW_MS: int = int(os.getenv("WS_BATCH_WINDOW_MS", "200"))  # Coalesce a user's new summaries over this window; 0 sends each one at once
+    WS_BATCH_MAX_SIZE: int = int(os.getenv("WS_BATCH_MAX_SIZE", "50"))  # Summaries per new_summaries message
+    NOTIFY_BACKEND: str = os.getenv("NOTIFY_BACKEND", "local")  # "local" (single worker) or "redis" (all workers and nodes)
+    NOTIFY_REDIS_URL: str = os.getenv("NOTIFY_REDIS_URL", "redis://localhost:6379")  # redis:// or unix:// broker address
+    NOTIFY_CHANNEL: str = os.getenv("NOTIFY_CHANNEL", "echoloop:notifications")
+    
+    # Background sync settings
+    SYNC_ENABLED: bool = os.getenv("SYNC_ENABLED", "true").lower() == "true"  # Poll connected mailboxes in the background
+    SYNC_MIN_INTERVAL: int = int(os.getenv("SYNC_MIN_INTERVAL", "60"))  # Seconds between polls of a busy mailbox
+    SYNC_MAX_INTERVAL: int = int(os.getenv("SYNC_MAX_INTERVAL", "900"))  # Longest wait between polls of a quiet mailbox
+    SYNC_BACKOFF_FACTOR: float = float(os.getenv("SYNC_BACKOFF_FACTOR", "2.0"))  # Interval growth after a poll finds nothing
+    SYNC_LEASE_SECONDS: int = int(os.getenv("SYNC_LEASE_SECONDS", "120"))  # Lease a worker holds on a mailbox it is syncing; renewed while the sync runs
+    
+    # Refresh pipeline settings
+    PIPELINE_QUEUE_SIZE: int = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))  # Batches buffered between refresh stages
+    PIPELINE_SUMMARY_CONCURRENCY: int = int(os.getenv("PIPELINE_SUMMARY_CONCURRENCY", "2"))  # Fetched batches of one refresh summarized at once
+    
+    # Similarity settings
+    EMBEDDINGS_ENABLED: bool = os.getenv("EMBEDDINGS_ENABLED", "false").lower() == "true"  # Index encoder embeddings of new emails (an extra encoder pass per email)
+    EMBEDDING_INDEX_DIR: str = os.getenv("EMBEDDING_INDEX_DIR", "embeddings")  # One append-only vector file per mailbox
+    EMBEDDING_DTYPE: str = os.getenv("EMBEDDING_DTYPE", "int8")  # "int8" (4x smaller) or "float32"
+    EMBEDDING_MAX_TOKENS: int = int(os.getenv("EMBEDDING_MAX_TOKENS", "256"))  # Tokens of subject and body embedded
+    SIMILARITY_REUSE_THRESHOLD: float = float(os.getenv("SIMILARITY_REUSE_THRESHOLD", "0"))  # Cosine similarity above which a summary is reused; 0 disables
+    
+    # Body storage settings
+    BODY_COMPRESSION: str = os.getenv("BODY_COMPRESSION", "zstd")  # "zstd" (needs zstandard; falls back to zlib), "zlib" or "raw"
+    BODY_COMPRESSION_LEVEL: int = int(os.getenv("BODY_COMPRESSION_LEVEL", "6"))
+    BODY_DICTIONARY_SIZE: int = int(os.getenv("BODY_DICTIONARY_SIZE", "65536"))  # Bytes of dictionary trained on stored mail; 0 disables
+    BODY_DICTIONARY_SAMPLES: int = int(os.getenv("BODY_DICTIONARY_SAMPLES", "1000"))  # Stored bodies needed before training
+    BODY_RETENTION_DAYS: int = int(os.getenv("BODY_RETENTION_DAYS", "0"))  # Drop bodies of summarized mail older than this; 0 keeps them
+    BODY_MAINTENANCE_INTERVAL: int = int(os.getenv("BODY_MAINTENANCE_INTERVAL", "3600"))  # Seconds between migration, training and retention runs
+    
+    # Search settings
+    SEARCH_TS_CONFIG: str = os.getenv("SEARCH_TS_CONFIG", "english")  # PostgreSQL text search configuration
+    
+    # Metrics settings
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"  # Record pipeline, inference and query timings for /metrics
     
     # Email fetching settings
-    EMAIL_FETCH_LIMIT: int = int(os.getenv("EMAIL_FETCH_LIMIT", "10"))
+    EMAIL_FETCH_LIMIT: int = int(os.getenv("EMAIL_FETCH_LIMIT", "10"))  # 0 fetches every matching email
     EMAIL_FETCH_DAYS: int = int(os.getenv("EMAIL_FETCH_DAYS", "7"))  # Fetch emails from the last 7 days
+    EMAIL_BODY_MAX_CHARS: int = int(os.getenv("EMAIL_BODY_MAX_CHARS", "0"))  # Body text extracted and stored per email, and served by /emails/{id}/body; 0 keeps all of it
+    EMAIL_SYNC_MODE: str = os.getenv("EMAIL_SYNC_MODE", "incremental")  # "incremental" (Gmail history) or "full"
 
 settings = Settings() 
\ No newline at end of file
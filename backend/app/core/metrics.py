@@ -0,0 +1,248 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from app.core.config import settings
+
+# Metrics in the Prometheus text exposition format, without the client library.
+#
+# Recording is a dictionary lookup and an addition under a lock, and gauges
+# that mirror state held elsewhere (WebSocket connections, queue lengths) are
+# read by collectors only when /metrics is scraped, so an unscraped server
+# pays next to nothing. Counters and histograms are per process; with several
+# workers, scrape each one or aggregate by instance.
+
+# Seconds; Prometheus client defaults extended for multi-second pipeline stages
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# A collector returns (name, type, help, [(labels, value), ...]) for each metric it exposes
+Sample = Tuple[Dict[str, str], float]
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+class _Metric:
+    """Values of one metric, keyed by label values"""
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self.lock:
+            return [(self.name, self._labels(key), value) for key, value in self.values.items()]
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.values: Dict[Tuple[str, ...], List[float]] = {}  # Bucket counts, then sum and count
+
+    def observe(self, value: float, **labels: Any):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            values = self.values.get(key)
+            if values is None:
+                values = self.values[key] = [0.0] * (len(self.buckets) + 3)
+            values[index] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self.lock:
+            values = {key: list(counts) for key, counts in self.values.items()}
+
+        samples = []
+        for key, counts in values.items():
+            labels = self._labels(key)
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            samples.append((f"{self.name}_sum", labels, counts[-2]))
+            samples.append((f"{self.name}_count", labels, counts[-1]))
+        return samples
+
+class StageTiming:
+    """Handle for the stage being timed; set items to the number of items it handled"""
+    __slots__ = ("items",)
+
+    def __init__(self):
+        self.items = 0
+
+class MetricsRegistry:
+    """
+    Metrics of this process and the collectors read at scrape time
+    """
+    def __init__(self, enabled: bool = settings.METRICS_ENABLED):
+        self.enabled = enabled
+        self.metrics: List[_Metric] = []
+        self.collectors: List[Collector] = []
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help_text, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Collector):
+        """Add a function that reports metrics when the registry is scraped"""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text format"""
+        lines = []
+        for metric in self.metrics:
+            samples = metric.samples()
+            if not samples:
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for name, labels, value in samples)
+
+        for collector in self.collectors:
+            for name, kind, help_text, collected in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in collected)
+        return "\n".join(lines) + "\n"
+
+    @contextmanager
+    def time_stage(self, stage: str) -> Iterator[StageTiming]:
+        """
+        Time a block as one call to a pipeline stage
+
+        Example:
+            with metrics.time_stage("list") as timing:
+                message_ids = list_messages()
+                timing.items = len(message_ids)
+        """
+        timing = StageTiming()
+        if not self.enabled:
+            yield timing
+            return
+        start = time.perf_counter()
+        try:
+            yield timing
+        finally:
+            self.observe_stage(stage, time.perf_counter() - start, timing.items)
+
+    def observe_stage(self, stage: str, seconds: float, items: int = 0):
+        """Record one call to a pipeline stage timed elsewhere, e.g. in a worker process"""
+        if not self.enabled:
+            return
+        PIPELINE_STAGE_SECONDS.observe(seconds, stage=stage)
+        if items:
+            PIPELINE_STAGE_ITEMS.inc(items, stage=stage)
+
+    def record_inference(self, usage: Dict[str, float]):
+        """Count the tokens of one summarization call (see LLMService.summarize_batch)"""
+        if not self.enabled or not usage:
+            return
+        INFERENCE_CALLS.inc()
+        for kind in ("input", "padded", "output"):
+            if usage.get(f"{kind}_tokens"):
+                INFERENCE_TOKENS.inc(usage[f"{kind}_tokens"], kind=kind)
+        if usage.get("batches"):
+            INFERENCE_BATCHES.inc(usage["batches"])
+
+    def observe_query(self, statement: str, seconds: float):
+        """Record the duration of one database statement"""
+        QUERY_SECONDS.observe(seconds, statement=_statement_kind(statement))
+
+def _statement_kind(statement: str) -> str:
+    """First keyword of a SQL statement, e.g. SELECT or INSERT"""
+    keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return keyword if keyword in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "PRAGMA") else "OTHER"
+
+# Create a singleton instance
+metrics = MetricsRegistry()
+
+PIPELINE_STAGE_SECONDS = metrics.histogram(
+    "echoloop_pipeline_stage_seconds",
+    "Time spent per call in each stage of fetching and summarizing mail",
+    ["stage"]
+)
+PIPELINE_STAGE_ITEMS = metrics.counter(
+    "echoloop_pipeline_stage_items_total",
+    "Messages, emails or summaries handled by each pipeline stage",
+    ["stage"]
+)
+INFERENCE_CALLS = metrics.counter("echoloop_inference_calls_total", "Summarization calls to the model")
+INFERENCE_BATCHES = metrics.counter("echoloop_inference_batches_total", "Padded generation batches run by the model")
+INFERENCE_TOKENS = metrics.counter(
+    "echoloop_inference_tokens_total",
+    "Tokens fed to (input, and padded including padding) and generated by (output) the model",
+    ["kind"]
+)
+QUERY_SECONDS = metrics.histogram(
+    "echoloop_db_query_seconds",
+    "Duration of database statements by kind",
+    ["statement"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+WS_FANOUT = metrics.histogram(
+    "echoloop_ws_fanout_connections",
+    "Connections on this worker each WebSocket message was delivered to",
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+)
@@ -0,0 +1,137 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Set, Tuple, Union
+
+from app.db.database import run_db
+from app.db.repository import EmailRepository, SearchRepository, SummaryRepository
+from app.models.email import Email, EmailSummary
+
+# Both repositories accept an AsyncSession (DATABASE_ASYNC) or a Session, and
+# run the matching sync repository query without blocking the event loop.
+AnySession = Union[AsyncSession, Session]
+
+class AsyncEmailRepository:
+    @staticmethod
+    async def create_email(db: AnySession, email_data: Dict[str, Any], user_id: Optional[int] = None) -> Email:
+        """Create a new email record"""
+        return await run_db(db, EmailRepository.create_email, email_data, user_id)
+    
+    @staticmethod
+    async def create_emails_bulk(db: AnySession, emails: List[Dict[str, Any]], user_id: Optional[int] = None) -> List[int]:
+        """Create email records in a single transaction and return their IDs in input order"""
+        return await run_db(db, EmailRepository.create_emails_bulk, emails, user_id)
+    
+    @staticmethod
+    async def get_email(db: AnySession, email_id: int, user_id: Optional[int] = None) -> Optional[Email]:
+        """Get one of a user's emails by database ID"""
+        return await run_db(db, EmailRepository.get_email, email_id, user_id)
+    
+    @staticmethod
+    async def get_email_by_email_id(db: AnySession, email_id: str, user_id: Optional[int] = None) -> Optional[Email]:
+        """Get an email by its Gmail ID"""
+        return await run_db(db, EmailRepository.get_email_by_email_id, email_id, user_id)
+    
+    @staticmethod
+    async def get_existing_email_ids(db: AnySession, email_ids: List[str], user_id: Optional[int] = None) -> Set[str]:
+        """Get which of the given Gmail IDs are already stored for a user"""
+        return await run_db(db, EmailRepository.get_existing_email_ids, email_ids, user_id)
+    
+    @staticmethod
+    async def get_emails(db: AnySession, skip: int = 0, limit: int = 100, user_id: Optional[int] = None) -> List[Email]:
+        """Get a list of a user's emails"""
+        return await run_db(db, EmailRepository.get_emails, skip, limit, user_id)
+
+
+class AsyncSummaryRepository:
+    @staticmethod
+    async def create_summary(
+        db: AnySession,
+        summary_text: str,
+        email_id: int,
+        user_id: Optional[int] = None
+    ) -> EmailSummary:
+        """Create a new email summary"""
+        return await run_db(db, SummaryRepository.create_summary, summary_text, email_id, user_id)
+    
+    @staticmethod
+    async def create_summaries_bulk(db: AnySession, summaries: List[Dict[str, Any]]) -> List[int]:
+        """Create summaries in a single transaction and return their IDs in input order"""
+        return await run_db(db, SummaryRepository.create_summaries_bulk, summaries)
+    
+    @staticmethod
+    async def get_summary_by_email_id(db: AnySession, email_id: int) -> Optional[EmailSummary]:
+        """Get a summary by email ID"""
+        return await run_db(db, SummaryRepository.get_summary_by_email_id, email_id)
+    
+    @staticmethod
+    async def get_summary_texts_by_email_ids(
+        db: AnySession,
+        email_ids: List[int],
+        user_id: Optional[int] = None
+    ) -> Dict[int, str]:
+        """Map a user's email IDs to the text of their latest summary"""
+        return await run_db(db, SummaryRepository.get_summary_texts_by_email_ids, email_ids, user_id)
+    
+    @staticmethod
+    async def get_summaries(
+        db: AnySession,
+        skip: int = 0,
+        limit: int = 100,
+        seen: Optional[bool] = None,
+        user_id: Optional[int] = None
+    ) -> List[EmailSummary]:
+        """Get a list of a user's summaries with optional filtering by seen status"""
+        return await run_db(db, SummaryRepository.get_summaries, skip, limit, seen, user_id)
+    
+    @staticmethod
+    async def mark_as_seen(db: AnySession, summary_id: int, user_id: Optional[int] = None) -> Optional[EmailSummary]:
+        """Mark one of a user's summaries as seen"""
+        return await run_db(db, SummaryRepository.mark_as_seen, summary_id, user_id)
+    
+    @staticmethod
+    async def get_version(db: AnySession, user_id: Optional[int] = None) -> int:
+        """Get the change counter of a user's summaries"""
+        return await run_db(db, SummaryRepository.get_version, user_id)
+    
+    @staticmethod
+    async def get_email_with_summary(
+        db: AnySession,
+        skip: int = 0,
+        limit: int = 100,
+        user_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Get a user's emails with their summaries for the frontend"""
+        return await run_db(db, SummaryRepository.get_email_with_summary, skip, limit, user_id)
+    
+    @staticmethod
+    async def get_email_with_summary_by_ids(
+        db: AnySession,
+        email_ids: List[int],
+        user_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Get a user's emails with their summaries, if any, by email ID"""
+        return await run_db(db, SummaryRepository.get_email_with_summary_by_ids, email_ids, user_id)
+    
+    @staticmethod
+    async def get_email_with_summary_after(
+        db: AnySession,
+        after: Optional[Tuple[datetime, int]] = None,
+        limit: int = 100,
+        user_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Get a user's emails with their summaries using keyset pagination"""
+        return await run_db(db, SummaryRepository.get_email_with_summary_after, after, limit, user_id)
+
+
+class AsyncSearchRepository:
+    @staticmethod
+    async def search(
+        db: AnySession,
+        query: str,
+        skip: int = 0,
+        limit: int = 20,
+        user_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Full-text search a user's emails and summaries, best match first"""
+        return await run_db(db, SearchRepository.search, query, skip, limit, user_id)
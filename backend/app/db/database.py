@@ -1,17 +1,65 @@
-from sqlalchemy import create_engine
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Union
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.utils.compression import decompress
 
 # Create SQLAlchemy engine
 engine = create_engine(
     settings.DATABASE_URL, connect_args={"check_same_thread": False} if settings.DATABASE_URL.startswith("sqlite") else {}
 )
 
+def _register_sqlite_functions(dbapi_connection, connection_record):
+    """Let SQL (the search index triggers) read compressed email bodies"""
+    dbapi_connection.create_function("decompress_body", 3, decompress, deterministic=True)
+
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    context.query_started = time.perf_counter()
+
+def _record_query_time(conn, cursor, statement, parameters, context, executemany):
+    """Time each statement for /metrics"""
+    metrics.observe_query(statement, time.perf_counter() - context.query_started)
+
+def _register_query_metrics(sync_engine):
+    event.listen(sync_engine, "before_cursor_execute", _start_query_timer)
+    event.listen(sync_engine, "after_cursor_execute", _record_query_time)
+
+if settings.DATABASE_URL.startswith("sqlite"):
+    event.listen(engine, "connect", _register_sqlite_functions)
+if settings.METRICS_ENABLED:
+    _register_query_metrics(engine)
+
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def _async_database_url(url: str) -> str:
+    """Swap the sync driver in a database URL for its asyncio counterpart"""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:"):
+        return url.replace("postgresql:", "postgresql+asyncpg:", 1)
+    if url.startswith("postgres:"):
+        return url.replace("postgres:", "postgresql+asyncpg:", 1)
+    return url
+
+# Create async engine and AsyncSessionLocal class when enabled
+async_engine = create_async_engine(_async_database_url(settings.DATABASE_URL)) if settings.DATABASE_ASYNC else None
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+) if settings.DATABASE_ASYNC else None
+if settings.DATABASE_ASYNC and settings.DATABASE_URL.startswith("sqlite"):
+    event.listen(async_engine.sync_engine, "connect", _register_sqlite_functions)
+if settings.DATABASE_ASYNC and settings.METRICS_ENABLED:
+    _register_query_metrics(async_engine.sync_engine)
+
 # Create Base class
 Base = declarative_base()
 
@@ -21,4 +69,34 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+@asynccontextmanager
+async def session_scope() -> AsyncIterator[Union[AsyncSession, Session]]:
+    """Open an AsyncSession when DATABASE_ASYNC is enabled, otherwise a Session"""
+    if settings.DATABASE_ASYNC:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+# Dependency to get a DB session for async route handlers
+async def get_session():
+    async with session_scope() as db:
+        yield db
+
+async def run_db(db: Union[AsyncSession, Session], fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    Run a sync repository function without blocking the event loop
+
+    With an AsyncSession the function runs through run_sync on the async
+    driver; with a Session it runs on a worker thread. Either way it is
+    called as fn(session, *args).
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args)
+    return await asyncio.to_thread(fn, db, *args)
@@ -1,11 +1,40 @@
+from sqlalchemy import inspect, text
 from sqlalchemy.orm import Session
 
 from app.db.database import Base, engine
-from app.models import email
+from app.db.search import create_search_index
+from app.models import email, meta, sync, user
 
 def init_db() -> None:
+    # Let a new SQLite database return the space of dropped bodies (no effect once tables exist)
+    if engine.dialect.name == "sqlite":
+        with engine.begin() as conn:
+            conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+    
     # Create tables
     Base.metadata.create_all(bind=engine)
+    
+    # create_all skips existing tables, so add columns declared since they were created
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=engine.dialect)
+                with engine.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+    
+    # Likewise for indexes, replacing any whose uniqueness has changed (emails.email_id
+    # was unique across all mailboxes before accounts were added)
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"]: bool(index["unique"]) for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing and existing[index.name] != bool(index.unique):
+                index.drop(bind=engine)
+            index.create(bind=engine, checkfirst=True)
+    
+    # Full-text search index and the triggers that maintain it
+    create_search_index(engine)
 
 if __name__ == "__main__":
-    init_db() 
\ No newline at end of file
+    init_db()
\ No newline at end of file
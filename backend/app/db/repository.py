@@ -1,20 +1,47 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+from sqlalchemy import desc, func, insert, text, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
+import uuid
+from typing import List, Dict, Any, Iterable, Optional, Set, Tuple
 
-from app.models.email import Email, EmailSummary
+from app.models.email import CompressionDictionary, Email, EmailBody, EmailSummary, SummaryCacheEntry
+from app.models.meta import DatabaseIdentity
+from app.models.sync import MailboxVersion, SyncLease, SyncState
+from app.models.user import User, UserSession
 from app.models.schema import EmailCreate, EmailSummaryCreate
+from app.core.config import settings
+from app.db.search import (
+    POSTGRES_INDEX_BODY,
+    POSTGRES_INDEX_LEGACY_BODIES,
+    POSTGRES_UNINDEX_BODIES,
+    build_search_query
+)
+
+# Maximum number of bound parameters used in one IN (...) clause (SQLite allows 999)
+IN_CLAUSE_CHUNK_SIZE = 500
+
+# Sync state and version key for the default mailbox (requests without a user)
+DEFAULT_MAILBOX = "me"
+
+def mailbox_key(user_id: Optional[int]) -> str:
+    """Sync state and version key for a user's mailbox"""
+    return DEFAULT_MAILBOX if user_id is None else f"user:{user_id}"
+
+def _owned_by(column, user_id: Optional[int]):
+    """Filter rows by owner; user_id None selects the default mailbox"""
+    return column.is_(None) if user_id is None else column == user_id
 
 class EmailRepository:
     @staticmethod
-    def create_email(db: Session, email_data: Dict[str, Any]) -> Email:
-        """Create a new email record"""
+    def create_email(db: Session, email_data: Dict[str, Any], user_id: Optional[int] = None) -> Email:
+        """Create a new email record (the body is stored separately through BodyRepository)"""
         db_email = Email(
+            user_id=user_id,
             email_id=email_data["email_id"],
             sender=email_data["sender"],
             subject=email_data["subject"],
-            body=email_data["body"],
             received_at=email_data["received_at"]
         )
         db.add(db_email)
@@ -23,43 +50,154 @@ class EmailRepository:
         return db_email
     
     @staticmethod
-    def get_email_by_email_id(db: Session, email_id: str) -> Optional[Email]:
+    def create_emails_bulk(db: Session, emails: List[Dict[str, Any]], user_id: Optional[int] = None) -> List[int]:
+        """
+        Create email records in a single transaction and return their IDs in input order
+        
+        Bodies are not stored here; save them with BodyRepository.save_bodies.
+        """
+        if not emails:
+            return []
+        
+        # One executemany INSERT, then one query to read back the generated IDs
+        db.execute(insert(Email), [
+            {
+                "user_id": user_id,
+                "email_id": email_data["email_id"],
+                "sender": email_data["sender"],
+                "subject": email_data["subject"],
+                "received_at": email_data["received_at"]
+            }
+            for email_data in emails
+        ])
+        ids = EmailRepository._get_ids_by_email_id(db, [email_data["email_id"] for email_data in emails], user_id)
+        db.commit()
+        return [ids[email_data["email_id"]] for email_data in emails]
+    
+    @staticmethod
+    def get_email(db: Session, email_id: int, user_id: Optional[int] = None) -> Optional[Email]:
+        """Get one of a user's emails by database ID"""
+        return db.query(Email).filter(Email.id == email_id, _owned_by(Email.user_id, user_id)).first()
+    
+    @staticmethod
+    def get_email_by_email_id(db: Session, email_id: str, user_id: Optional[int] = None) -> Optional[Email]:
         """Get an email by its Gmail ID"""
-        return db.query(Email).filter(Email.email_id == email_id).first()
+        return db.query(Email).filter(Email.email_id == email_id, _owned_by(Email.user_id, user_id)).first()
+    
+    @staticmethod
+    def get_existing_email_ids(db: Session, email_ids: List[str], user_id: Optional[int] = None) -> Set[str]:
+        """Get which of the given Gmail IDs are already stored for a user"""
+        existing = set()
+        for start in range(0, len(email_ids), IN_CLAUSE_CHUNK_SIZE):
+            chunk = email_ids[start:start + IN_CLAUSE_CHUNK_SIZE]
+            rows = db.query(Email.email_id).filter(
+                Email.email_id.in_(chunk),
+                _owned_by(Email.user_id, user_id)
+            ).all()
+            existing.update(row.email_id for row in rows)
+        return existing
+    
+    @staticmethod
+    def _get_ids_by_email_id(db: Session, email_ids: List[str], user_id: Optional[int] = None) -> Dict[str, int]:
+        """Map a user's Gmail IDs to database IDs"""
+        ids = {}
+        for start in range(0, len(email_ids), IN_CLAUSE_CHUNK_SIZE):
+            chunk = email_ids[start:start + IN_CLAUSE_CHUNK_SIZE]
+            rows = db.query(Email.id, Email.email_id).filter(
+                Email.email_id.in_(chunk),
+                _owned_by(Email.user_id, user_id)
+            ).all()
+            ids.update({row.email_id: row.id for row in rows})
+        return ids
+    
+    @staticmethod
+    def get_unsummarized_emails(db: Session, limit: int, user_id: Optional[int] = None) -> List[Email]:
+        """Get a user's saved emails that have no summary, oldest first"""
+        return db.query(Email).outerjoin(
+            EmailSummary,
+            Email.id == EmailSummary.email_id
+        ).filter(
+            EmailSummary.id.is_(None),
+            _owned_by(Email.user_id, user_id)
+        ).order_by(Email.id).limit(limit).all()
     
     @staticmethod
-    def get_emails(db: Session, skip: int = 0, limit: int = 100) -> List[Email]:
-        """Get a list of emails"""
-        return db.query(Email).order_by(desc(Email.received_at)).offset(skip).limit(limit).all()
+    def get_emails(db: Session, skip: int = 0, limit: int = 100, user_id: Optional[int] = None) -> List[Email]:
+        """Get a list of a user's emails"""
+        return db.query(Email).filter(
+            _owned_by(Email.user_id, user_id)
+        ).order_by(desc(Email.received_at)).offset(skip).limit(limit).all()
 
 
 class SummaryRepository:
     @staticmethod
-    def create_summary(db: Session, summary_text: str, email_id: int) -> EmailSummary:
+    def create_summary(db: Session, summary_text: str, email_id: int, user_id: Optional[int] = None) -> EmailSummary:
         """Create a new email summary"""
         db_summary = EmailSummary(
             summary_text=summary_text,
-            email_id=email_id
+            email_id=email_id,
+            user_id=user_id
         )
         db.add(db_summary)
+        SummaryRepository._bump_versions(db, [user_id])
         db.commit()
         db.refresh(db_summary)
         return db_summary
     
+    @staticmethod
+    def create_summaries_bulk(db: Session, summaries: List[Dict[str, Any]]) -> List[int]:
+        """
+        Create summaries in a single transaction and return their IDs in input order
+        
+        Each item needs summary_text and email_id (one summary per email) and may
+        set user_id and created_at.
+        """
+        if not summaries:
+            return []
+        
+        now = datetime.utcnow()
+        # INSERT ... RETURNING (SQLite 3.35+, PostgreSQL) hands back exactly the rows inserted here, in input order
+        ids = db.execute(insert(EmailSummary).returning(EmailSummary.id, sort_by_parameter_order=True), [
+            {
+                "summary_text": summary_data["summary_text"],
+                "email_id": summary_data["email_id"],
+                "user_id": summary_data.get("user_id"),
+                "created_at": summary_data.get("created_at") or now
+            }
+            for summary_data in summaries
+        ]).scalars().all()
+        SummaryRepository._bump_versions(db, {summary_data.get("user_id") for summary_data in summaries})
+        db.commit()
+        return list(ids)
+    
     @staticmethod
     def get_summary_by_email_id(db: Session, email_id: int) -> Optional[EmailSummary]:
         """Get a summary by email ID"""
         return db.query(EmailSummary).filter(EmailSummary.email_id == email_id).first()
     
+    @staticmethod
+    def get_summary_texts_by_email_ids(db: Session, email_ids: List[int], user_id: Optional[int] = None) -> Dict[int, str]:
+        """Map a user's email IDs to the text of their latest summary"""
+        texts = {}
+        for start in range(0, len(email_ids), IN_CLAUSE_CHUNK_SIZE):
+            chunk = email_ids[start:start + IN_CLAUSE_CHUNK_SIZE]
+            rows = db.query(EmailSummary.email_id, EmailSummary.summary_text).filter(
+                EmailSummary.email_id.in_(chunk),
+                _owned_by(EmailSummary.user_id, user_id)
+            ).order_by(EmailSummary.id).all()
+            texts.update({row.email_id: row.summary_text for row in rows})
+        return texts
+    
     @staticmethod
     def get_summaries(
         db: Session, 
         skip: int = 0, 
         limit: int = 100, 
-        seen: Optional[bool] = None
+        seen: Optional[bool] = None,
+        user_id: Optional[int] = None
     ) -> List[EmailSummary]:
-        """Get a list of summaries with optional filtering by seen status"""
-        query = db.query(EmailSummary)
+        """Get a list of a user's summaries with optional filtering by seen status"""
+        query = db.query(EmailSummary).filter(_owned_by(EmailSummary.user_id, user_id))
         
         if seen is not None:
             query = query.filter(EmailSummary.seen == seen)
@@ -67,19 +205,102 @@ class SummaryRepository:
         return query.order_by(desc(EmailSummary.created_at)).offset(skip).limit(limit).all()
     
     @staticmethod
-    def mark_as_seen(db: Session, summary_id: int) -> Optional[EmailSummary]:
-        """Mark a summary as seen"""
-        db_summary = db.query(EmailSummary).filter(EmailSummary.id == summary_id).first()
-        if db_summary:
+    def mark_as_seen(db: Session, summary_id: int, user_id: Optional[int] = None) -> Optional[EmailSummary]:
+        """Mark one of a user's summaries as seen"""
+        db_summary = db.query(EmailSummary).filter(
+            EmailSummary.id == summary_id,
+            _owned_by(EmailSummary.user_id, user_id)
+        ).first()
+        if db_summary and not db_summary.seen:
             db_summary.seen = True
+            SummaryRepository._bump_versions(db, [user_id])
             db.commit()
             db.refresh(db_summary)
         return db_summary
     
     @staticmethod
-    def get_email_with_summary(db: Session, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
-        """Get emails with their summaries for the frontend"""
-        result = db.query(
+    def get_version(db: Session, user_id: Optional[int] = None) -> int:
+        """Get the change counter of a user's summaries; it grows on every insert or update"""
+        version = db.query(MailboxVersion.version).filter(MailboxVersion.mailbox == mailbox_key(user_id)).scalar()
+        return version or 0
+    
+    @staticmethod
+    def _bump_versions(db: Session, user_ids: Iterable[Optional[int]]) -> None:
+        """Count a change to the summaries of these users, in the caller's transaction"""
+        # Atomic upsert, so concurrent writers in other workers never lose an increment
+        for user_id in user_ids:
+            db.execute(text(
+                "INSERT INTO mailbox_versions (mailbox, version) VALUES (:mailbox, 1) "
+                "ON CONFLICT (mailbox) DO UPDATE SET version = mailbox_versions.version + 1"
+            ), {"mailbox": mailbox_key(user_id)})
+    
+    @staticmethod
+    def get_email_with_summary(
+        db: Session,
+        skip: int = 0,
+        limit: int = 100,
+        user_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Get a user's emails with their summaries for the frontend"""
+        result = SummaryRepository._email_with_summary_query(db, user_id).offset(skip).limit(limit).all()
+        
+        # Convert to list of dictionaries
+        return [dict(row._mapping) for row in result]
+    
+    @staticmethod
+    def get_email_with_summary_after(
+        db: Session,
+        after: Optional[Tuple[datetime, int]] = None,
+        limit: int = 100,
+        user_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get a user's emails with their summaries using keyset pagination
+        
+        Args:
+            after: (created_at, summary id) of the last row of the previous page
+            limit: Maximum number of rows to return
+            user_id: Owner of the summaries, or None for the default mailbox
+        """
+        query = SummaryRepository._email_with_summary_query(db, user_id)
+        if after is not None:
+            query = query.filter(tuple_(EmailSummary.created_at, EmailSummary.id) < tuple_(*after))
+        
+        return [dict(row._mapping) for row in query.limit(limit).all()]
+    
+    @staticmethod
+    def get_email_with_summary_by_ids(
+        db: Session,
+        email_ids: List[int],
+        user_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Get a user's emails with their summaries, if any, by email ID"""
+        rows = []
+        for start in range(0, len(email_ids), IN_CLAUSE_CHUNK_SIZE):
+            chunk = email_ids[start:start + IN_CLAUSE_CHUNK_SIZE]
+            rows.extend(db.query(
+                Email.id,
+                Email.email_id,
+                Email.sender,
+                Email.subject,
+                Email.received_at,
+                EmailSummary.summary_text,
+                EmailSummary.created_at,
+                EmailSummary.seen,
+                EmailSummary.id.label("summary_id")
+            ).outerjoin(
+                EmailSummary,
+                Email.id == EmailSummary.email_id
+            ).filter(
+                Email.id.in_(chunk),
+                _owned_by(Email.user_id, user_id)
+            ).all())
+        return [dict(row._mapping) for row in rows]
+    
+    @staticmethod
+    def _email_with_summary_query(db: Session, user_id: Optional[int] = None):
+        """Join a user's emails with their summaries, newest summary first"""
+        return db.query(
             Email.id, 
             Email.email_id,
             Email.sender,
@@ -92,9 +313,343 @@ class SummaryRepository:
         ).join(
             EmailSummary, 
             Email.id == EmailSummary.email_id
+        ).filter(
+            _owned_by(EmailSummary.user_id, user_id)
         ).order_by(
-            desc(EmailSummary.created_at)
-        ).offset(skip).limit(limit).all()
+            desc(EmailSummary.created_at),
+            desc(EmailSummary.id)
+        )
+
+
+class BodyRepository:
+    @staticmethod
+    def save_bodies(db: Session, bodies: List[Dict[str, Any]], texts: Dict[int, str]) -> None:
+        """
+        Store compressed bodies in a single transaction
         
-        # Convert to list of dictionaries
-        return [dict(row._mapping) for row in result] 
\ No newline at end of file
+        Args:
+            bodies: email_id, codec, dictionary_id, data and size of each body
+            texts: Uncompressed text by email ID, indexed for search on PostgreSQL
+        """
+        if not bodies:
+            return
+        
+        db.execute(insert(EmailBody), bodies)
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(POSTGRES_INDEX_BODY, [
+                {"email_id": email_id, "body": body, "config": settings.SEARCH_TS_CONFIG}
+                for email_id, body in texts.items()
+            ])
+        db.commit()
+    
+    @staticmethod
+    def get_body(db: Session, email_id: int, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get the stored body of one of a user's emails
+        
+        Returns:
+            Dictionary with the inline body of emails saved before bodies were
+            compressed, or the compressed body's codec, dictionary_id and data
+            (all None once retention dropped it); None if the email does not exist
+        """
+        row = db.query(
+            Email.body,
+            EmailBody.codec,
+            EmailBody.dictionary_id,
+            EmailBody.data
+        ).outerjoin(
+            EmailBody,
+            Email.id == EmailBody.email_id
+        ).filter(
+            Email.id == email_id,
+            _owned_by(Email.user_id, user_id)
+        ).first()
+        return dict(row._mapping) if row else None
+    
+    @staticmethod
+    def get_recent_bodies(db: Session, limit: int, codec: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get the most recently stored compressed bodies, optionally of one codec only"""
+        query = db.query(EmailBody.codec, EmailBody.dictionary_id, EmailBody.data)
+        if codec is not None:
+            query = query.filter(EmailBody.codec == codec)
+        return [dict(row._mapping) for row in query.order_by(desc(EmailBody.email_id)).limit(limit).all()]
+    
+    @staticmethod
+    def get_legacy_bodies(db: Session, limit: int) -> List[Tuple[int, str]]:
+        """Get (email ID, body) of emails whose body is still stored inline"""
+        rows = db.query(Email.id, Email.body).filter(Email.body.isnot(None)).order_by(Email.id).limit(limit).all()
+        return [(row.id, row.body) for row in rows]
+    
+    @staticmethod
+    def migrate_legacy_bodies(db: Session, bodies: List[Dict[str, Any]]) -> None:
+        """Replace inline bodies with compressed ones in a single transaction"""
+        if not bodies:
+            return
+        
+        email_ids = [body["email_id"] for body in bodies]
+        db.execute(insert(EmailBody), bodies)
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(POSTGRES_INDEX_LEGACY_BODIES, {"email_ids": email_ids, "config": settings.SEARCH_TS_CONFIG})
+        else:
+            db.query(Email).filter(Email.id.in_(email_ids)).update({Email.body: None}, synchronize_session=False)
+        db.commit()
+    
+    @staticmethod
+    def get_expired_email_ids(db: Session, before: datetime, limit: int) -> List[int]:
+        """Get summarized emails received before a time that still have a body"""
+        summarized = db.query(EmailSummary.id).filter(EmailSummary.email_id == Email.id).exists()
+        stored = db.query(EmailBody.email_id).filter(EmailBody.email_id == Email.id).exists()
+        rows = db.query(Email.id).filter(
+            func.coalesce(Email.received_at, Email.created_at) < before,
+            summarized,
+            stored | Email.body.isnot(None)
+        ).order_by(Email.id).limit(limit).all()
+        return [email_id for email_id, in rows]
+    
+    @staticmethod
+    def delete_bodies(db: Session, email_ids: List[int]) -> None:
+        """Drop the bodies of emails in a single transaction, keeping the emails"""
+        if not email_ids:
+            return
+        
+        db.query(EmailBody).filter(EmailBody.email_id.in_(email_ids)).delete(synchronize_session=False)
+        db.query(Email).filter(
+            Email.id.in_(email_ids),
+            Email.body.isnot(None)
+        ).update({Email.body: None}, synchronize_session=False)
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(POSTGRES_UNINDEX_BODIES, {"email_ids": email_ids})
+        db.commit()
+    
+    @staticmethod
+    def get_latest_dictionary_id(db: Session, codec: str) -> Optional[int]:
+        """Get the ID of the newest compression dictionary for a codec"""
+        row = db.query(CompressionDictionary.id).filter(
+            CompressionDictionary.codec == codec
+        ).order_by(desc(CompressionDictionary.id)).first()
+        return row.id if row else None
+    
+    @staticmethod
+    def get_dictionary(db: Session, dictionary_id: int) -> Optional[bytes]:
+        """Get the data of a compression dictionary"""
+        row = db.query(CompressionDictionary.data).filter(CompressionDictionary.id == dictionary_id).first()
+        return row.data if row else None
+    
+    @staticmethod
+    def create_dictionary(db: Session, codec: str, data: bytes) -> CompressionDictionary:
+        """Store a trained compression dictionary"""
+        dictionary = CompressionDictionary(codec=codec, data=data)
+        db.add(dictionary)
+        db.commit()
+        db.refresh(dictionary)
+        return dictionary
+    
+    @staticmethod
+    def get_stats(db: Session) -> Dict[str, Any]:
+        """Count stored bodies and their uncompressed and compressed sizes"""
+        count, size, compressed = db.query(
+            func.count(EmailBody.email_id),
+            func.coalesce(func.sum(EmailBody.size), 0),
+            func.coalesce(func.sum(func.length(EmailBody.data)), 0)
+        ).one()
+        legacy = db.query(func.count(Email.id)).filter(Email.body.isnot(None)).scalar()
+        return {"bodies": count, "size": size, "compressed_size": compressed, "legacy_bodies": legacy}
+    
+    @staticmethod
+    def reclaim_space(db: Session) -> None:
+        """Return pages freed by dropped bodies to the filesystem (SQLite with incremental auto-vacuum)"""
+        if db.get_bind().dialect.name == "sqlite":
+            db.execute(text("PRAGMA incremental_vacuum"))
+            db.commit()
+
+
+class SearchRepository:
+    @staticmethod
+    def search(
+        db: Session,
+        query: str,
+        skip: int = 0,
+        limit: int = 20,
+        user_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Full-text search a user's emails and summaries, best match first
+        
+        Args:
+            query: Words to search for; all must match, and a trailing * matches a prefix
+            skip: Number of results to skip
+            limit: Maximum number of results to return
+            user_id: Owner of the emails, or None for the default mailbox
+        """
+        search = build_search_query(db.get_bind().dialect.name, query, skip, limit, user_id)
+        if search is None:
+            return []
+        
+        statement, params = search
+        return [dict(row._mapping) for row in db.execute(statement, params)]
+
+
+class SummaryCacheRepository:
+    @staticmethod
+    def get_many(db: Session, cache_keys: List[str]) -> Dict[str, str]:
+        """Get cached summary texts for the given keys"""
+        if not cache_keys:
+            return {}
+        
+        rows = db.query(SummaryCacheEntry.cache_key, SummaryCacheEntry.summary_text).filter(
+            SummaryCacheEntry.cache_key.in_(cache_keys)
+        ).all()
+        return {row.cache_key: row.summary_text for row in rows}
+    
+    @staticmethod
+    def save_many(db: Session, model_name: str, entries: Dict[str, str]) -> None:
+        """Store summary texts by cache key, keeping any entry that already exists"""
+        if not entries:
+            return
+        
+        existing = SummaryCacheRepository.get_many(db, list(entries))
+        db.add_all([
+            SummaryCacheEntry(cache_key=cache_key, model_name=model_name, summary_text=summary_text)
+            for cache_key, summary_text in entries.items()
+            if cache_key not in existing
+        ])
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another job cached the same content first
+            db.rollback()
+
+
+class SyncStateRepository:
+    @staticmethod
+    def get_history_id(db: Session, mailbox: str) -> Optional[str]:
+        """Get the historyId a mailbox was last synced to"""
+        state = db.query(SyncState).filter(SyncState.mailbox == mailbox).first()
+        return state.history_id if state else None
+    
+    @staticmethod
+    def save_history_id(db: Session, mailbox: str, history_id: str) -> SyncState:
+        """Record the historyId a mailbox has been synced to"""
+        state = db.query(SyncState).filter(SyncState.mailbox == mailbox).first()
+        if state:
+            state.history_id = history_id
+        else:
+            state = SyncState(mailbox=mailbox, history_id=history_id)
+            db.add(state)
+        db.commit()
+        return state
+    
+    @staticmethod
+    def acquire_lease(db: Session, mailbox: str, owner: str, seconds: float) -> bool:
+        """
+        Take or renew the lease on syncing a mailbox
+        
+        Succeeds if the mailbox is not leased, its lease has expired or the
+        owner already holds it. The upsert is atomic, so of several workers
+        racing for a mailbox exactly one gets it.
+        
+        Returns:
+            True if the owner now holds the lease
+        """
+        now = datetime.utcnow()
+        dialect_insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+        statement = dialect_insert(SyncLease).values(
+            mailbox=mailbox,
+            owner=owner,
+            expires_at=now + timedelta(seconds=seconds)
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[SyncLease.mailbox],
+            set_={"owner": statement.excluded.owner, "expires_at": statement.excluded.expires_at},
+            where=(SyncLease.expires_at < now) | (SyncLease.owner == owner)
+        )
+        db.execute(statement)
+        holder = db.query(SyncLease.owner).filter(SyncLease.mailbox == mailbox).scalar()
+        db.commit()
+        return holder == owner
+    
+    @staticmethod
+    def release_lease(db: Session, mailbox: str, owner: str) -> None:
+        """Give up the lease on a mailbox if the owner still holds it"""
+        db.query(SyncLease).filter(
+            SyncLease.mailbox == mailbox,
+            SyncLease.owner == owner
+        ).delete(synchronize_session=False)
+        db.commit()
+
+
+class DatabaseIdentityRepository:
+    @staticmethod
+    def get_database_id(db: Session) -> str:
+        """Get the random ID of this database, creating it on first use"""
+        identity = db.query(DatabaseIdentity).filter(DatabaseIdentity.id == 1).first()
+        if identity:
+            return identity.database_id
+        try:
+            identity = DatabaseIdentity(id=1, database_id=uuid.uuid4().hex)
+            db.add(identity)
+            db.commit()
+            return identity.database_id
+        except IntegrityError:
+            # Another process created it first
+            db.rollback()
+            return db.query(DatabaseIdentity.database_id).filter(DatabaseIdentity.id == 1).scalar()
+
+
+class UserRepository:
+    @staticmethod
+    def get_user(db: Session, user_id: int) -> Optional[User]:
+        """Get a user by ID"""
+        return db.query(User).filter(User.id == user_id).first()
+    
+    @staticmethod
+    def get_user_by_email(db: Session, email: str) -> Optional[User]:
+        """Get a user by Gmail address"""
+        return db.query(User).filter(User.email == email).first()
+    
+    @staticmethod
+    def has_users(db: Session) -> bool:
+        """Whether any Gmail account has been connected"""
+        return db.query(User.id).first() is not None
+    
+    @staticmethod
+    def get_connected_user_ids(db: Session) -> List[int]:
+        """Get the IDs of every user with stored Gmail credentials"""
+        rows = db.query(User.id).filter(User.gmail_token.isnot(None)).order_by(User.id).all()
+        return [user_id for user_id, in rows]
+    
+    @staticmethod
+    def create_session(db: Session, user_id: int, token_hash: str, max_age: timedelta) -> UserSession:
+        """Store a new session for a user by the hash of its token"""
+        now = datetime.utcnow()
+        session = UserSession(token_hash=token_hash, user_id=user_id, created_at=now, expires_at=now + max_age)
+        db.add(session)
+        db.commit()
+        return session
+    
+    @staticmethod
+    def get_session_user_id(db: Session, token_hash: str) -> Optional[int]:
+        """Get the user of an unexpired session by the hash of its token"""
+        return db.query(UserSession.user_id).filter(
+            UserSession.token_hash == token_hash,
+            UserSession.expires_at > datetime.utcnow()
+        ).scalar()
+    
+    @staticmethod
+    def delete_session(db: Session, token_hash: str) -> None:
+        """End a session"""
+        db.query(UserSession).filter(UserSession.token_hash == token_hash).delete(synchronize_session=False)
+        db.commit()
+    
+    @staticmethod
+    def save_gmail_token(db: Session, email: str, gmail_token: str) -> User:
+        """Store Gmail credentials for a mailbox, creating its user if needed"""
+        user = UserRepository.get_user_by_email(db, email)
+        if user:
+            user.gmail_token = gmail_token
+        else:
+            user = User(email=email, gmail_token=gmail_token)
+            db.add(user)
+        db.commit()
+        db.refresh(user)
+        return user
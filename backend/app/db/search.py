@@ -0,0 +1,252 @@
+import logging
+import re
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, String, Text, bindparam, inspect, text
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Full-text index over email subject, sender, body and the latest summary.
+#
+# On SQLite this is a contentless FTS5 table (it stores only the index, not a
+# second copy of every body) keyed by emails.id. Each row also carries an
+# owner token ("default" or "user<id>") so searches filter by mailbox inside
+# the index instead of after ranking. Compressed bodies are read from
+# email_bodies through the decompress_body() SQL function registered in
+# app.db.database. On PostgreSQL it is a weighted tsvector column on emails
+# with a GIN index. Triggers keep both up to date on every insert, update and
+# delete, including the bulk inserts of the sync path.
+
+SQLITE_TABLE = "email_search"
+
+# bm25 column weights for (owner, subject, sender, body, summary_text)
+SQLITE_WEIGHTS = "0.0, 4.0, 2.0, 1.0, 2.0"
+
+def _sqlite_owner(row: str) -> str:
+    return f"CASE WHEN {row}.user_id IS NULL THEN 'default' ELSE 'user' || {row}.user_id END"
+
+def _sqlite_latest_summary(email_id: str, exclude: str = "NULL") -> str:
+    return (
+        "coalesce((SELECT summary_text FROM email_summaries "
+        f"WHERE email_id = {email_id} AND id IS NOT {exclude} ORDER BY id DESC LIMIT 1), '')"
+    )
+
+def _sqlite_body(row: str) -> str:
+    """Body of an email, whether stored inline (legacy rows) or compressed in email_bodies"""
+    return (
+        f"coalesce({row}.body, (SELECT decompress_body(b.codec, b.data, d.data) FROM email_bodies b "
+        f"LEFT JOIN compression_dictionaries d ON d.id = b.dictionary_id WHERE b.email_id = {row}.id), '')"
+    )
+
+def _sqlite_index_row(command: str, row: str, summary: str, body: Optional[str] = None) -> str:
+    """Add (command '') or remove (command 'delete') one email's index entry"""
+    columns = "rowid, owner, subject, sender, body, summary_text"
+    values = (
+        f"{row}.id, {_sqlite_owner(row)}, coalesce({row}.subject, ''), "
+        f"coalesce({row}.sender, ''), {body or _sqlite_body(row)}, {summary}"
+    )
+    if command:
+        columns = f"{SQLITE_TABLE}, {columns}"
+        values = f"'{command}', {values}"
+    return f"INSERT INTO {SQLITE_TABLE}({columns}) SELECT {values}"
+
+SQLITE_TABLE_DDL = f"""CREATE VIRTUAL TABLE {SQLITE_TABLE} USING fts5(
+    owner, subject, sender, body, summary_text,
+    content='', tokenize='unicode61 remove_diacritics 2'
+)"""
+
+# A contentless index can only remove an entry given the exact values it was
+# added with, so every trigger recomputes the old entry before adding the new
+# one. Trigger names map to their definitions; they are recreated on startup.
+SQLITE_TRIGGERS = {
+    "emails_search_insert": f"""AFTER INSERT ON emails BEGIN
+        {_sqlite_index_row('', 'new', "''")};
+    END""",
+    "emails_search_update": f"""AFTER UPDATE OF user_id, subject, sender, body ON emails BEGIN
+        {_sqlite_index_row('delete', 'old', _sqlite_latest_summary('old.id'))};
+        {_sqlite_index_row('', 'new', _sqlite_latest_summary('new.id'))};
+    END""",
+    # Runs before the delete, while a cascade cannot yet have removed the compressed body
+    "emails_search_delete": f"""BEFORE DELETE ON emails BEGIN
+        {_sqlite_index_row('delete', 'old', _sqlite_latest_summary('old.id'))};
+    END""",
+    # Foreign keys are only enforced when enabled per connection, so remove the body here
+    "emails_bodies_delete": """AFTER DELETE ON emails BEGIN
+        DELETE FROM email_bodies WHERE email_id = old.id;
+    END""",
+    "email_summaries_search_insert": f"""AFTER INSERT ON email_summaries BEGIN
+        {_sqlite_index_row('delete', 'e', _sqlite_latest_summary('e.id', 'new.id'))} FROM emails e WHERE e.id = new.email_id;
+        {_sqlite_index_row('', 'e', _sqlite_latest_summary('e.id'))} FROM emails e WHERE e.id = new.email_id;
+    END""",
+    # Only the latest summary is indexed, so only deleting it changes the entry
+    "email_summaries_search_delete": f"""AFTER DELETE ON email_summaries
+        WHEN NOT EXISTS (SELECT 1 FROM email_summaries WHERE email_id = old.email_id AND id > old.id) BEGIN
+        {_sqlite_index_row('delete', 'e', "coalesce(old.summary_text, '')")} FROM emails e WHERE e.id = old.email_id;
+        {_sqlite_index_row('', 'e', _sqlite_latest_summary('e.id'))} FROM emails e WHERE e.id = old.email_id;
+    END""",
+    # Bodies are saved after their email and dropped by retention; rows are never updated
+    "email_bodies_search_insert": f"""AFTER INSERT ON email_bodies BEGIN
+        {_sqlite_index_row('delete', 'e', _sqlite_latest_summary('e.id'), "coalesce(e.body, '')")} FROM emails e WHERE e.id = new.email_id;
+        {_sqlite_index_row('', 'e', _sqlite_latest_summary('e.id'))} FROM emails e WHERE e.id = new.email_id;
+    END""",
+    "email_bodies_search_delete": f"""AFTER DELETE ON email_bodies BEGIN
+        {_sqlite_index_row('delete', 'e', _sqlite_latest_summary('e.id'), (
+            "coalesce(e.body, decompress_body(old.codec, old.data, "
+            "(SELECT data FROM compression_dictionaries WHERE id = old.dictionary_id)), '')"
+        ))} FROM emails e WHERE e.id = old.email_id;
+        {_sqlite_index_row('', 'e', _sqlite_latest_summary('e.id'), "coalesce(e.body, '')")} FROM emails e WHERE e.id = old.email_id;
+    END"""
+}
+
+# Index every email that existed before the index did
+SQLITE_BACKFILL = _sqlite_index_row('', 'e', _sqlite_latest_summary('e.id')) + " FROM emails e"
+
+# PostgreSQL keeps the body's tsvector on the email, since the trigger that
+# builds search_vector cannot read compressed bodies
+POSTGRES_INDEX_BODY = text(
+    "UPDATE emails SET body_vector = to_tsvector(CAST(:config AS regconfig), :body) WHERE id = :email_id"
+)
+POSTGRES_INDEX_LEGACY_BODIES = text(
+    "UPDATE emails SET body_vector = to_tsvector(CAST(:config AS regconfig), coalesce(body, '')), body = NULL "
+    "WHERE id IN :email_ids"
+).bindparams(bindparam("email_ids", expanding=True))
+POSTGRES_UNINDEX_BODIES = text(
+    "UPDATE emails SET body_vector = NULL WHERE id IN :email_ids"
+).bindparams(bindparam("email_ids", expanding=True))
+
+def _postgres_ddl(config: str) -> Tuple[str, ...]:
+    return (
+        "ALTER TABLE emails ADD COLUMN IF NOT EXISTS search_vector tsvector",
+        "ALTER TABLE emails ADD COLUMN IF NOT EXISTS body_vector tsvector",
+        "CREATE INDEX IF NOT EXISTS ix_emails_search_vector ON emails USING GIN (search_vector)",
+        f"""CREATE OR REPLACE FUNCTION emails_search_vector() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector :=
+                setweight(to_tsvector('{config}', coalesce(NEW.subject, '')), 'A') ||
+                setweight(to_tsvector('{config}', coalesce(NEW.sender, '')), 'B') ||
+                setweight(to_tsvector('{config}', coalesce((
+                    SELECT summary_text FROM email_summaries WHERE email_id = NEW.id ORDER BY id DESC LIMIT 1
+                ), '')), 'B') ||
+                setweight(coalesce(NEW.body_vector, to_tsvector('{config}', coalesce(NEW.body, ''))), 'D');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql""",
+        "DROP TRIGGER IF EXISTS emails_search_vector ON emails",
+        """CREATE TRIGGER emails_search_vector BEFORE INSERT OR UPDATE OF subject, sender, body, body_vector ON emails
+            FOR EACH ROW EXECUTE FUNCTION emails_search_vector()""",
+        # A new or deleted summary recomputes its email's vector through the trigger above
+        """CREATE OR REPLACE FUNCTION email_summaries_search_vector() RETURNS trigger AS $$
+        BEGIN
+            UPDATE emails SET body = body WHERE id = coalesce(NEW.email_id, OLD.email_id);
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql""",
+        "DROP TRIGGER IF EXISTS email_summaries_search_vector ON email_summaries",
+        """CREATE TRIGGER email_summaries_search_vector AFTER INSERT OR DELETE ON email_summaries
+            FOR EACH ROW EXECUTE FUNCTION email_summaries_search_vector()""",
+        "UPDATE emails SET body = body WHERE search_vector IS NULL"
+    )
+
+def create_search_index(engine: Engine) -> None:
+    """Create the full-text index and its triggers, indexing existing emails once"""
+    dialect = engine.dialect.name
+    if dialect == "sqlite":
+        statements = []
+        for name, definition in SQLITE_TRIGGERS.items():
+            statements += [f"DROP TRIGGER IF EXISTS {name}", f"CREATE TRIGGER {name} {definition}"]
+        if not inspect(engine).has_table(SQLITE_TABLE):
+            logger.info("Creating full-text search index")
+            statements = [SQLITE_TABLE_DDL] + statements + [SQLITE_BACKFILL]
+    elif dialect == "postgresql":
+        statements = _postgres_ddl(settings.SEARCH_TS_CONFIG)
+    else:
+        logger.warning(f"Full-text search is not supported on {dialect}")
+        return
+
+    with engine.begin() as conn:
+        for statement in statements:
+            conn.execute(text(statement))
+
+def _sqlite_match(query: str, user_id: Optional[int]) -> Optional[str]:
+    """
+    Build an FTS5 MATCH expression for a user's search terms
+
+    Every word must match; a trailing * matches it as a prefix. Quoting each
+    word keeps FTS5 operators in user input from being interpreted.
+    """
+    terms = [
+        f'"{word}"*' if star else f'"{word}"'
+        for word, star in re.findall(r"(\w+)(\*?)", query)
+    ]
+    if not terms:
+        return None
+    owner = "default" if user_id is None else f"user{user_id}"
+    return f"owner : {owner} AND {{subject sender body summary_text}} : ({' '.join(terms)})"
+
+RESULT_COLUMNS = dict(
+    id=Integer,
+    email_id=String,
+    sender=String,
+    subject=String,
+    received_at=DateTime,
+    summary_text=Text,
+    created_at=DateTime,
+    seen=Boolean,
+    summary_id=Integer,
+    rank=Float
+)
+
+def build_search_query(dialect: str, query: str, skip: int, limit: int, user_id: Optional[int]):
+    """
+    Build the ranked search statement for a dialect
+
+    Returns:
+        Tuple of (statement, bound parameters), or None when the query has no
+        searchable terms or the dialect has no full-text index
+    """
+    select = """SELECT e.id, e.email_id, e.sender, e.subject, e.received_at,
+            s.summary_text, s.created_at, s.seen, s.id AS summary_id, {rank} AS rank
+        FROM {source}
+        LEFT JOIN email_summaries s ON s.id = (
+            SELECT max(id) FROM email_summaries WHERE email_id = e.id
+        )
+        WHERE {condition}
+        ORDER BY rank {order}, e.id DESC
+        LIMIT :limit OFFSET :skip"""
+    params: Dict[str, Any] = {"limit": limit, "skip": skip}
+
+    if dialect == "sqlite":
+        match = _sqlite_match(query, user_id)
+        if match is None:
+            return None
+        params["match"] = match
+        statement = select.format(
+            rank=f"bm25({SQLITE_TABLE}, {SQLITE_WEIGHTS})",
+            source=f"{SQLITE_TABLE} JOIN emails e ON e.id = {SQLITE_TABLE}.rowid",
+            condition=f"{SQLITE_TABLE} MATCH :match",
+            order="ASC"  # bm25 scores are negative; lower is better
+        )
+    elif dialect == "postgresql":
+        if not re.search(r"\w", query):
+            return None
+        params["query"] = query
+        params["config"] = settings.SEARCH_TS_CONFIG
+        owner = "e.user_id IS NULL"
+        if user_id is not None:
+            owner = "e.user_id = :user_id"
+            params["user_id"] = user_id
+        statement = select.format(
+            rank="ts_rank_cd(e.search_vector, websearch_to_tsquery(CAST(:config AS regconfig), :query))",
+            source="emails e",
+            condition=(
+                f"{owner} AND e.search_vector @@ websearch_to_tsquery(CAST(:config AS regconfig), :query)"
+            ),
+            order="DESC"
+        )
+    else:
+        return None
+
+    return text(statement).columns(**RESULT_COLUMNS), params
@@ -1,4 +1,4 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
@@ -6,6 +6,15 @@ import os
 from app.core.config import settings
 from app.api.api import api_router
 from app.db.init_db import init_db
+from app.services.body_store import body_store
+from app.services.model_registry import model_registry
+from app.services.summarization_queue import summarization_queue
+from app.services.sync_scheduler import sync_scheduler
+from app.services.websocket_service import connection_manager
+
+# Load the model before a preloading server (gunicorn --preload) forks its workers
+if settings.LLM_PRELOAD:
+    model_registry.preload()
 
 # Initialize the app
 app = FastAPI(title="EchoLoop API", description="API for the EchoLoop email summarization system")
@@ -17,6 +26,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Create a static directory if it doesn't exist
@@ -79,10 +89,45 @@ app.include_router(api_router, prefix=settings.API_V1_STR)
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/api/ready")
+async def readiness_check(response: Response):
+    """Report whether the summarization model has finished loading"""
+    readiness = summarization_queue.readiness()
+    if not readiness["ready"]:
+        response.status_code = 503
+    return readiness
+
 @app.on_event("startup")
 async def startup_event():
     # Initialize database
     init_db()
+    
+    # Load the summarization model in the background
+    summarization_queue.warm_up()
+    
+    # Receive notifications published by every worker
+    await connection_manager.start()
+    
+    # Poll connected mailboxes in the background
+    if settings.SYNC_ENABLED:
+        sync_scheduler.start()
+    
+    # Compress inline bodies, train the compression dictionary and apply body retention
+    body_store.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Stop polling mailboxes
+    await sync_scheduler.stop()
+    
+    # Stop body maintenance
+    await body_store.stop()
+    
+    # Stop summarization workers
+    summarization_queue.shutdown()
+    
+    # Stop receiving notifications
+    await connection_manager.stop()
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,17 +1,30 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Index, LargeBinary, text
+from sqlalchemy.orm import deferred, relationship
 from datetime import datetime
 
 from app.db.database import Base
 
 class Email(Base):
     __tablename__ = "emails"
+    __table_args__ = (
+        # Gmail message IDs are unique within a mailbox. NULLs never conflict, so the
+        # default mailbox (user_id NULL) needs its own partial index
+        Index("uq_emails_user_id_email_id", "user_id", "email_id", unique=True),
+        Index(
+            "uq_emails_default_email_id",
+            "email_id",
+            unique=True,
+            sqlite_where=text("user_id IS NULL"),
+            postgresql_where=text("user_id IS NULL")
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    email_id = Column(String, unique=True, index=True)  # Gmail message ID
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)  # Owner; NULL for the default mailbox
+    email_id = Column(String, index=True)  # Gmail message ID
     sender = Column(String)
     subject = Column(String)
-    body = Column(Text)
+    body = deferred(Column(Text))  # Bodies saved before email_bodies existed; NULL once migrated
     received_at = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
     
@@ -20,12 +33,43 @@ class Email(Base):
 
 class EmailSummary(Base):
     __tablename__ = "email_summaries"
+    __table_args__ = (
+        # Keyset pagination over (created_at, id) within a user's summaries
+        Index("ix_email_summaries_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    email_id = Column(Integer, ForeignKey("emails.id", ondelete="CASCADE"))
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))  # Owner; NULL for the default mailbox
+    email_id = Column(Integer, ForeignKey("emails.id", ondelete="CASCADE"), index=True)
     summary_text = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
     seen = Column(Boolean, default=False)
     
     # Relationship with Email
-    email = relationship("Email", back_populates="summary") 
\ No newline at end of file
+    email = relationship("Email", back_populates="summary") 
+
+class EmailBody(Base):
+    __tablename__ = "email_bodies"
+
+    # Kept apart from emails so listing and search never read compressed bodies
+    email_id = Column(Integer, ForeignKey("emails.id", ondelete="CASCADE"), primary_key=True)
+    codec = Column(String)  # "zstd", "zlib" or "raw"
+    dictionary_id = Column(Integer, ForeignKey("compression_dictionaries.id"), nullable=True)
+    data = Column(LargeBinary)
+    size = Column(Integer)  # Uncompressed size in bytes
+
+class CompressionDictionary(Base):
+    __tablename__ = "compression_dictionaries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    codec = Column(String)
+    data = Column(LargeBinary)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class SummaryCacheEntry(Base):
+    __tablename__ = "summary_cache"
+
+    cache_key = Column(String, primary_key=True)  # Hash of model, generation params and normalized content
+    model_name = Column(String)
+    summary_text = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
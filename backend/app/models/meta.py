@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime
+
+from app.db.database import Base
+
+class DatabaseIdentity(Base):
+    __tablename__ = "database_identity"
+
+    id = Column(Integer, primary_key=True)  # Always 1
+    database_id = Column(String)  # Random ID of this database, e.g. to tie files derived from it to it
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime
+
+from app.db.database import Base
+
+class SyncState(Base):
+    __tablename__ = "sync_state"
+
+    id = Column(Integer, primary_key=True, index=True)
+    mailbox = Column(String, unique=True, index=True)  # Mailbox the state belongs to
+    history_id = Column(String)  # Gmail historyId to resume incremental sync from
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class MailboxVersion(Base):
+    __tablename__ = "mailbox_versions"
+
+    mailbox = Column(String, primary_key=True)  # Same keys as sync_state
+    version = Column(Integer, default=0)  # Bumped whenever the mailbox's summaries change
+
+class SyncLease(Base):
+    __tablename__ = "sync_leases"
+
+    mailbox = Column(String, primary_key=True)  # Same keys as sync_state
+    owner = Column(String)  # Worker process syncing the mailbox
+    expires_at = Column(DateTime)  # Another worker may take the mailbox over after this
@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.database import run_db, session_scope
+from app.db.repository import BodyRepository
+from app.utils.compression import available_codec, compress, decompress, train_dictionary
+
+logger = logging.getLogger(__name__)
+
+# Emails handled per transaction by migration and retention
+MAINTENANCE_BATCH_SIZE = 500
+
+class BodyStore:
+    """
+    Stores email bodies compressed in their own table
+
+    Listing and search queries never read email_bodies, so bodies only cost
+    disk space until a client asks for one. Once BODY_DICTIONARY_SAMPLES bodies
+    are stored, a dictionary is trained on them and used for every body saved
+    afterwards; bodies keep a reference to the dictionary they were compressed
+    with. A background task also compresses bodies stored inline by earlier
+    versions and, with BODY_RETENTION_DAYS set, drops the bodies of summarized
+    mail older than that.
+    """
+    def __init__(
+        self,
+        codec: str = settings.BODY_COMPRESSION,
+        level: int = settings.BODY_COMPRESSION_LEVEL,
+        dictionary_size: int = settings.BODY_DICTIONARY_SIZE,
+        dictionary_samples: int = settings.BODY_DICTIONARY_SAMPLES,
+        retention_days: int = settings.BODY_RETENTION_DAYS,
+        interval: float = settings.BODY_MAINTENANCE_INTERVAL
+    ):
+        self.codec = available_codec(codec)
+        self.level = level
+        self.dictionary_size = dictionary_size
+        self.dictionary_samples = dictionary_samples
+        self.retention_days = retention_days
+        self.interval = interval
+        self.dictionaries: Dict[int, bytes] = {}  # Dictionary ID -> data; dictionaries never change
+        self.lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        # Totals since startup
+        self.saved = 0
+        self.saved_size = 0
+        self.saved_compressed_size = 0
+        self.loaded = 0
+        self.migrated = 0
+        self.dropped = 0
+
+    def save(self, db: Session, bodies: Dict[int, str]):
+        """
+        Compress and store the bodies of newly saved emails
+
+        Args:
+            bodies: Body text by email database ID
+        """
+        if not bodies:
+            return
+        rows = self._compress_all(db, bodies)
+        BodyRepository.save_bodies(db, rows, bodies)
+        self._count_saved(rows)
+
+    def load(self, db: Session, email_id: int, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Get the body of one of a user's emails
+
+        Returns:
+            Dictionary with the email ID and its body text, which is None if
+            the body was dropped by retention; None if the email does not exist
+        """
+        stored = BodyRepository.get_body(db, email_id, user_id)
+        if stored is None:
+            return None
+
+        body = stored["body"]
+        if body is None and stored["data"] is not None:
+            dictionary = self._dictionary(db, stored["dictionary_id"])
+            body = decompress(stored["codec"], stored["data"], dictionary)
+        self.loaded += 1
+        return {"id": email_id, "body": body}
+
+    def start(self):
+        """Run maintenance in the background"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop background maintenance"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self, db: Session) -> Dict[str, Any]:
+        """Get stored sizes, the compression ratio and counters since startup"""
+        stored = BodyRepository.get_stats(db)
+        return {
+            "codec": self.codec,
+            "dictionary_id": BodyRepository.get_latest_dictionary_id(db, self.codec),
+            "retention_days": self.retention_days,
+            **stored,
+            "ratio": stored["size"] / stored["compressed_size"] if stored["compressed_size"] else None,
+            "saved": self.saved,
+            "saved_ratio": self.saved_size / self.saved_compressed_size if self.saved_compressed_size else None,
+            "loaded": self.loaded,
+            "migrated": self.migrated,
+            "dropped": self.dropped
+        }
+
+    def maintain(self, db: Session):
+        """Compress inline bodies, train a dictionary when due and apply retention"""
+        self.migrate_legacy(db)
+        self.train(db)
+        if self.retention_days > 0:
+            self.apply_retention(db, datetime.utcnow() - timedelta(days=self.retention_days))
+
+    def migrate_legacy(self, db: Session) -> int:
+        """
+        Move bodies stored inline on emails into compressed storage
+
+        Returns:
+            Number of bodies moved
+        """
+        migrated = 0
+        while True:
+            legacy = BodyRepository.get_legacy_bodies(db, MAINTENANCE_BATCH_SIZE)
+            if not legacy:
+                break
+            rows = self._compress_all(db, dict(legacy))
+            BodyRepository.migrate_legacy_bodies(db, rows)
+            migrated += len(rows)
+
+        if migrated:
+            self.migrated += migrated
+            logger.info(f"Compressed {migrated} email bodies stored inline")
+            BodyRepository.reclaim_space(db)
+        return migrated
+
+    def train(self, db: Session) -> Optional[int]:
+        """
+        Train a dictionary for the codec on stored mail, once enough is stored
+
+        Returns:
+            ID of the new dictionary, or None if none was trained
+        """
+        if self.dictionary_size <= 0 or self.codec == "raw":
+            return None
+        if BodyRepository.get_latest_dictionary_id(db, self.codec) is not None:
+            return None
+
+        samples = BodyRepository.get_recent_bodies(db, self.dictionary_samples)
+        if len(samples) < self.dictionary_samples:
+            return None
+
+        texts = [
+            decompress(sample["codec"], sample["data"], self._dictionary(db, sample["dictionary_id"]))
+            for sample in samples
+        ]
+        data = train_dictionary(texts, self.codec, self.dictionary_size)
+        if not data:
+            return None
+
+        dictionary = BodyRepository.create_dictionary(db, self.codec, data)
+        logger.info(f"Trained a {len(data)}-byte {self.codec} dictionary on {len(texts)} email bodies")
+        return dictionary.id
+
+    def apply_retention(self, db: Session, before: datetime) -> int:
+        """
+        Drop the bodies of summarized emails received before a time
+
+        The emails and their summaries are kept.
+
+        Returns:
+            Number of bodies dropped
+        """
+        dropped = 0
+        while True:
+            email_ids = BodyRepository.get_expired_email_ids(db, before, MAINTENANCE_BATCH_SIZE)
+            if not email_ids:
+                break
+            BodyRepository.delete_bodies(db, email_ids)
+            dropped += len(email_ids)
+
+        if dropped:
+            self.dropped += dropped
+            logger.info(f"Dropped {dropped} email bodies received before {before.isoformat()}")
+            BodyRepository.reclaim_space(db)
+        return dropped
+
+    async def _run(self):
+        """Run maintenance every interval"""
+        while True:
+            try:
+                async with session_scope() as db:
+                    await run_db(db, self.maintain)
+            except Exception as e:
+                logger.error(f"Error maintaining email bodies: {str(e)}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    def _compress_all(self, db: Session, bodies: Dict[int, str]) -> List[Dict[str, Any]]:
+        """Compress bodies with the newest dictionary into email_bodies rows"""
+        dictionary_id = None
+        if self.dictionary_size > 0:
+            dictionary_id = BodyRepository.get_latest_dictionary_id(db, self.codec)
+        dictionary = self._dictionary(db, dictionary_id)
+
+        return [
+            {
+                "email_id": email_id,
+                "codec": self.codec,
+                "dictionary_id": dictionary_id,
+                "data": compress(body, self.codec, dictionary, self.level),
+                "size": len(body.encode("utf-8"))
+            }
+            for email_id, body in bodies.items()
+        ]
+
+    def _dictionary(self, db: Session, dictionary_id: Optional[int]) -> Optional[bytes]:
+        """Get a dictionary's data, reading it from the database once"""
+        if dictionary_id is None:
+            return None
+        with self.lock:
+            data = self.dictionaries.get(dictionary_id)
+        if data is None:
+            data = BodyRepository.get_dictionary(db, dictionary_id)
+            with self.lock:
+                self.dictionaries[dictionary_id] = data
+        return data
+
+    def _count_saved(self, rows: List[Dict[str, Any]]):
+        self.saved += len(rows)
+        self.saved_size += sum(row["size"] for row in rows)
+        self.saved_compressed_size += sum(len(row["data"]) for row in rows)
+
+# Create a singleton instance
+body_store = BodyStore()
@@ -1,92 +1,718 @@
-from typing import List, Dict, Any
+import asyncio
+import logging
+import os
+import socket
+import time
+import numpy as np
+from contextlib import asynccontextmanager
+from datetime import datetime
+from functools import partial
+from typing import AsyncIterator, Awaitable, List, Dict, Any, Iterator, Optional, Set, Tuple, Union
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from app.services.body_store import body_store
+from app.services.embedding_index import embedding_index
+from app.services.gmail_pool import gmail_pool
 from app.services.gmail_service import GmailService
 from app.services.llm_service import LLMService
 from app.services.websocket_service import connection_manager
-from app.db.repository import EmailRepository, SummaryRepository
+from app.services.summarization_queue import SummarizationJob, summarization_queue
+from app.services.summary_cache import summary_cache
+from app.db.async_repository import AsyncEmailRepository, AsyncSearchRepository, AsyncSummaryRepository
+from app.db.database import run_db, session_scope
+from app.db.repository import EmailRepository, SummaryRepository, SyncStateRepository, mailbox_key
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.utils.pagination import decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+def _worker_id() -> str:
+    """Name of this worker process for sync leases (read at call time, so forked workers differ)"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+async def _run_stages(*stages: Awaitable[None]):
+    """Run pipeline stages concurrently; if one fails, cancel the others and raise its error"""
+    tasks = [asyncio.ensure_future(stage) for stage in stages]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
 
 class EmailService:
     def __init__(self):
-        self.gmail_service = GmailService()
-        self.llm_service = LLMService()
+        # Limits how many mailboxes are fetched from Gmail at the same time
+        self.sync_slots = asyncio.Semaphore(settings.GMAIL_MAX_CONCURRENT_SYNCS)
+        
+        # Unfinished refresh job per mailbox, so concurrent refreshes share one sync
+        self.active_jobs: Dict[Optional[int], SummarizationJob] = {}
     
-    async def fetch_and_summarize_emails(self, db: Session) -> List[Dict[str, Any]]:
+    async def fetch_and_summarize_emails(self, db: Session, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Fetch unread emails, summarize them, and save to database
         
+        Runs the same streaming pipeline as a refresh job (see _run_pipeline).
+        
+        Args:
+            user_id: User whose mailbox to sync, or None for the default mailbox
+            
         Returns:
             List of email summaries
         """
-        # Fetch unread emails
-        emails = self.gmail_service.get_unread_emails(
-            days=settings.EMAIL_FETCH_DAYS,
-            max_results=settings.EMAIL_FETCH_LIMIT
-        )
-        
-        if not emails:
+        gmail = await run_db(db, gmail_pool.get, user_id)
+        if gmail is None:
             return []
         
-        summaries = []
+        async with self._mailbox_lease(user_id) as leased:
+            if not leased:
+                return []
+            return await self._run_pipeline(db, gmail, user_id)
+    
+    def start_refresh_job(self, user_id: Optional[int] = None) -> SummarizationJob:
+        """
+        Queue a background refresh on the summarization queue
+        
+        At most one refresh runs per mailbox; while one is unfinished, callers
+        get that job instead of starting another.
+        
+        Args:
+            user_id: User whose mailbox to sync, or None for the default mailbox
+            
+        Returns:
+            The queued or already running job
+        """
+        job = self.active_jobs.get(user_id)
+        if job is not None and job.finished_at is None:
+            return job
+        
+        job = summarization_queue.submit(partial(self.run_refresh_job, user_id=user_id), user_id)
+        self.active_jobs[user_id] = job
+        return job
+    
+    async def stream_refresh_job(self, job: SummarizationJob) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Follow a refresh job, yielding records as its summaries are saved
         
-        # Process each email
-        for email_data in emails:
-            # Check if email already exists
-            existing_email = EmailRepository.get_email_by_email_id(db, email_data["email_id"])
+        Yields:
+            {"type": "job"} with the job's status and the IDs of summaries
+            saved before the stream started, a {"type": "summary"} record for
+            each summary saved afterwards, then {"type": "done"} with the final
+            status, counts and time to the first summary
+        """
+        queue = job.subscribe()
+        started = time.perf_counter()
+        first_summary_seconds = None
+        streamed = 0
+        try:
+            yield {"type": "job", "data": job.to_dict()}
             
-            if existing_email:
-                # Skip if already processed
-                continue
+            while (summary_data := await queue.get()) is not None:
+                if first_summary_seconds is None:
+                    first_summary_seconds = time.perf_counter() - started
+                streamed += 1
+                yield {"type": "summary", "data": summary_data}
             
-            # Save email to database
-            db_email = EmailRepository.create_email(db, email_data)
+            stats = job.to_dict()
+            del stats["summary_ids"]
+            yield {
+                "type": "done",
+                "data": {
+                    **stats,
+                    "streamed": streamed,
+                    "first_summary_seconds": first_summary_seconds,
+                    "elapsed_seconds": time.perf_counter() - started
+                }
+            }
+        finally:
+            job.unsubscribe(queue)
+    
+    async def run_refresh_job(self, job: SummarizationJob, user_id: Optional[int] = None):
+        """
+        Fetch unread emails and summarize them on the worker pool
+        
+        Summaries are saved and broadcast as each chunk of emails finishes.
+        Chunks are scheduled fairly against other users' refreshes.
+        
+        Args:
+            job: Job to report progress on
+            user_id: User whose mailbox to sync, or None for the default mailbox
+        """
+        async with session_scope() as db:
+            gmail = await run_db(db, gmail_pool.get, user_id)
+            if gmail is None:
+                raise LookupError(f"No Gmail account connected for user {user_id}")
             
-            # Generate summary
-            summary_text = self.llm_service.summarize_email(
-                email_data["subject"],
-                email_data["body"]
+            async with self._mailbox_lease(user_id) as leased:
+                if leased:
+                    await self._run_pipeline(db, gmail, user_id, job)
+    
+    @asynccontextmanager
+    async def _mailbox_lease(self, user_id: Optional[int] = None) -> AsyncIterator[bool]:
+        """
+        Hold the database lease on syncing a mailbox for the duration of the block
+        
+        active_jobs keeps one refresh per mailbox within this process; the
+        lease does the same across workers and nodes, so their schedulers do
+        not poll one mailbox at once and race on its emails and sync state.
+        The lease is renewed while the block runs and released after it.
+        
+        Yields:
+            True if this worker holds the lease; False if another worker is
+            syncing the mailbox, whose summaries reach clients through the
+            notification bus
+        """
+        mailbox = mailbox_key(user_id)
+        owner = _worker_id()
+        async with session_scope() as db:
+            leased = await run_db(db, SyncStateRepository.acquire_lease, mailbox, owner, settings.SYNC_LEASE_SECONDS)
+        if not leased:
+            logger.info(f"Mailbox {mailbox} is being synced by another worker; skipping")
+            yield False
+            return
+        
+        async def renew():
+            while True:
+                await asyncio.sleep(settings.SYNC_LEASE_SECONDS / 3)
+                async with session_scope() as db:
+                    if not await run_db(db, SyncStateRepository.acquire_lease, mailbox, owner, settings.SYNC_LEASE_SECONDS):
+                        logger.warning(f"Lost the sync lease on mailbox {mailbox} to another worker")
+        
+        renewal = asyncio.create_task(renew())
+        try:
+            yield True
+        finally:
+            renewal.cancel()
+            await asyncio.gather(renewal, return_exceptions=True)
+            async with session_scope() as db:
+                await run_db(db, SyncStateRepository.release_lease, mailbox, owner)
+    
+    async def _run_pipeline(
+        self,
+        db: Union[AsyncSession, Session],
+        gmail: GmailService,
+        user_id: Optional[int] = None,
+        job: Optional[SummarizationJob] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Sync a mailbox as a pipeline of concurrent stages
+        
+        Emails flow one Gmail batch request at a time through four stages:
+        fetch (Gmail requests and parsing, on a thread), store (dedup, saving
+        emails and bodies, summary cache and similarity lookups), summarize
+        (up to PIPELINE_SUMMARY_CONCURRENCY batches on the worker pool) and
+        publish (saving and broadcasting summaries). Stages are connected by
+        queues of PIPELINE_QUEUE_SIZE batches, so while one batch is being
+        summarized the next is being stored and the one after fetched, and a
+        slow stage holds back the ones before it down to Gmail itself.
+        Summaries are broadcast as soon as their chunk is summarized.
+        
+        The sync state advances only after every stage has finished, and saved
+        emails left without a summary by a failed sync are summarized again by
+        the next one, so a failure never skips mail.
+        
+        Args:
+            db: Session for the fetch and store stages; publishing uses its own
+            gmail: Client for the user's mailbox
+            user_id: User whose mailbox to sync, or None for the default mailbox
+            job: Refresh job to report progress on, if any
+            
+        Returns:
+            List of email summaries created
+        """
+        fetched: asyncio.Queue = asyncio.Queue(maxsize=settings.PIPELINE_QUEUE_SIZE)
+        stored: asyncio.Queue = asyncio.Queue(maxsize=settings.PIPELINE_QUEUE_SIZE)
+        summarized: asyncio.Queue = asyncio.Queue(maxsize=settings.PIPELINE_QUEUE_SIZE)
+        summaries: List[Dict[str, Any]] = []
+        
+        # Gmail calls block, so keep them off the event loop
+        history_id = await run_db(db, self._load_sync_state, user_id)
+        async with self.sync_slots:
+            batches, history_id = await asyncio.to_thread(self._stream_new_emails, gmail, history_id)
+        
+        async def fetch():
+            try:
+                while True:
+                    async with self.sync_slots:
+                        emails = await asyncio.to_thread(next, batches, None)
+                    if emails is None:
+                        break
+                    await fetched.put(emails)
+            except BaseException:
+                # Stop fetching ahead; a batch still being fetched on its thread finishes on its own
+                close = getattr(batches, "close", None)
+                if close is not None:
+                    try:
+                        await asyncio.to_thread(close)
+                    except ValueError:
+                        pass
+                raise
+            await fetched.put(None)
+        
+        async def prepare(new_emails, embed=True):
+            if job is not None:
+                job.total += len(new_emails)
+            if not new_emails:
+                return
+            
+            items = [(email_data["subject"], email_data["body"]) for _, email_data in new_emails]
+            cached_texts, pending = await run_db(db, self._lookup_cached_summaries, items)
+            
+            vectors = await self._embed_new_emails(new_emails, items, user_id) if embed else None
+            if vectors is not None and settings.SIMILARITY_REUSE_THRESHOLD > 0:
+                await self._reuse_similar_summaries(db, vectors, cached_texts, pending, user_id)
+            if vectors is not None:
+                await asyncio.to_thread(
+                    embedding_index.add, user_id, [email_id for email_id, _ in new_emails], vectors
+                )
+            
+            # Cached summaries are published without touching the model
+            hits = [i for i, summary_text in enumerate(cached_texts) if summary_text is not None]
+            if hits:
+                await summarized.put(([new_emails[i] for i in hits], [cached_texts[i] for i in hits], None))
+            if pending:
+                await stored.put((new_emails, items, pending))
+        
+        async def store():
+            # Emails an earlier sync saved but did not get to summarize (it failed or
+            # the process died) are summarized again first; they are already indexed
+            await prepare(await run_db(db, self._load_unsummarized_emails, user_id), embed=False)
+            
+            while (emails := await fetched.get()) is not None:
+                await prepare(await run_db(db, self._save_new_emails, emails, user_id))
+            await stored.put(None)
+        
+        async def summarize_batch(new_emails, items, pending):
+            # Summarize one email per distinct uncached content
+            pending_keys = list(pending)
+            chunks = summarization_queue.summarize_chunks(
+                [items[pending[key][0]] for key in pending_keys],
+                tenant=user_id
             )
+            async for chunk_indices, summary_texts, cacheable in chunks:
+                chunk_keys = [pending_keys[i] for i in chunk_indices]
+                chunk_emails = []
+                chunk_texts = []
+                for key, summary_text in zip(chunk_keys, summary_texts):
+                    for i in pending[key]:
+                        chunk_emails.append(new_emails[i])
+                        chunk_texts.append(summary_text)
+                cache_entries = dict(zip(chunk_keys, summary_texts)) if cacheable else None
+                await summarized.put((chunk_emails, chunk_texts, cache_entries))
+        
+        async def summarize():
+            slots = asyncio.Semaphore(max(1, settings.PIPELINE_SUMMARY_CONCURRENCY))
             
-            if summary_text:
-                # Save summary to database
-                db_summary = SummaryRepository.create_summary(db, summary_text, db_email.id)
-                
-                # Prepare summary data for response
-                summary_data = {
-                    "id": db_email.id,
-                    "email_id": db_email.email_id,
-                    "sender": db_email.sender,
-                    "subject": db_email.subject,
-                    "received_at": db_email.received_at.isoformat(),
-                    "summary_text": summary_text,
-                    "created_at": db_summary.created_at.isoformat(),
-                    "seen": False,
-                    "summary_id": db_summary.id
-                }
-                
-                summaries.append(summary_data)
-                
-                # Notify connected clients about new summary
-                await connection_manager.broadcast_new_summary(summary_data)
+            async def run(batch):
+                try:
+                    await summarize_batch(*batch)
+                finally:
+                    slots.release()
+            
+            tasks: Set[asyncio.Task] = set()
+            try:
+                while (batch := await stored.get()) is not None:
+                    await slots.acquire()
+                    for task in [task for task in tasks if task.done()]:
+                        tasks.discard(task)
+                        task.result()  # Raise a failed batch's error
+                    tasks.add(asyncio.create_task(run(batch)))
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                raise
+            await summarized.put(None)
         
+        async def publish():
+            async with session_scope() as publish_db:
+                while (chunk := await summarized.get()) is not None:
+                    chunk_emails, chunk_texts, cache_entries = chunk
+                    if cache_entries:
+                        await run_db(publish_db, summary_cache.put_many, cache_entries)
+                    summaries.extend(
+                        await self._publish_summaries(publish_db, chunk_emails, chunk_texts, user_id, job)
+                    )
+        
+        await _run_stages(fetch(), store(), summarize(), publish())
+        
+        # Every fetched email is saved and summarized, so the next sync can start after them
+        await run_db(db, self._save_sync_state, history_id, user_id)
+        return summaries
+    
+    async def _publish_summaries(
+        self,
+        db: Union[AsyncSession, Session],
+        new_emails: List[Tuple[int, Dict[str, Any]]],
+        summary_texts: List[Optional[str]],
+        user_id: Optional[int] = None,
+        job: Optional[SummarizationJob] = None
+    ) -> List[Dict[str, Any]]:
+        """Save summaries, record a refresh job's progress and notify the user's clients"""
+        summaries = await run_db(db, self._save_summaries, new_emails, summary_texts, user_id)
+        if job is not None:
+            # Emails whose summary failed are not saved, so they do not count as processed
+            job.processed += len(summaries)
+            job.publish(summaries)
+        
+        with metrics.time_stage("broadcast") as timing:
+            for summary_data in summaries:
+                await connection_manager.broadcast_new_summary(summary_data, user_id)
+            timing.items = len(summaries)
         return summaries
     
-    def get_email_summaries(self, db: Session, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+    async def _embed_new_emails(
+        self,
+        new_emails: List[Tuple[int, Dict[str, Any]]],
+        items: List[Tuple[str, str]],
+        user_id: Optional[int] = None
+    ) -> Optional[np.ndarray]:
+        """Embed new emails on the worker pool, or return None if embeddings are off or unavailable"""
+        if not settings.EMBEDDINGS_ENABLED:
+            return None
+        try:
+            return await summarization_queue.embed(items, tenant=user_id)
+        except Exception as e:
+            logger.error(f"Error embedding {len(new_emails)} new emails: {str(e)}", exc_info=True)
+            return None
+    
+    async def _reuse_similar_summaries(
+        self,
+        db: Union[AsyncSession, Session],
+        vectors: np.ndarray,
+        summary_texts: List[Optional[str]],
+        pending: Dict[str, List[int]],
+        user_id: Optional[int] = None
+    ):
+        """
+        Take summaries for near-duplicate emails instead of generating them
+        
+        A pending email within SIMILARITY_REUSE_THRESHOLD of an already
+        summarized email in the mailbox gets that summary. Pending emails
+        that are near-duplicates of each other are grouped so only the first
+        is summarized. Updates summary_texts and pending in place.
         """
-        Get emails with their summaries
+        threshold = settings.SIMILARITY_REUSE_THRESHOLD
+        keys = list(pending)
+        
+        # Near-duplicates of summarized emails reuse their summary
+        matches = await asyncio.to_thread(
+            embedding_index.search, user_id, vectors[[pending[key][0] for key in keys]], 3
+        )
+        candidates = {email_id for result in matches for email_id, score in result if score >= threshold}
+        texts = await AsyncSummaryRepository.get_summary_texts_by_email_ids(db, list(candidates), user_id)
+        for key, result in zip(keys, matches):
+            for email_id, score in result:
+                summary_text = texts.get(email_id)
+                if score >= threshold and summary_text and summary_text != LLMService.ERROR_SUMMARY:
+                    for i in pending.pop(key):
+                        summary_texts[i] = summary_text
+                    break
+        
+        # Near-duplicates within this refresh share one generated summary
+        keys = list(pending)
+        if len(keys) < 2:
+            return
+        leaders = vectors[[pending[key][0] for key in keys]]
+        similar = (leaders @ leaders.T) >= threshold
+        kept: List[int] = []
+        for j, key in enumerate(keys):
+            match = next((i for i in kept if similar[j, i]), None)
+            if match is None:
+                kept.append(j)
+            else:
+                pending[keys[match]].extend(pending.pop(key))
+    
+    def _lookup_cached_summaries(
+        self,
+        db: Session,
+        items: List[Tuple[str, str]]
+    ) -> Tuple[List[Optional[str]], Dict[str, List[int]]]:
+        """
+        Look up cached summaries for (subject, body) tuples
+        
+        Returns:
+            Tuple of (cached summary text or None for each item,
+            indices of the uncached items grouped by cache key)
+        """
+        with metrics.time_stage("dedup") as timing:
+            cache_keys = [summary_cache.make_key(subject, body) for subject, body in items]
+            summary_texts = summary_cache.get_many(db, cache_keys)
+            timing.items = len(items)
+        
+        pending: Dict[str, List[int]] = {}
+        for i, summary_text in enumerate(summary_texts):
+            if summary_text is None:
+                pending.setdefault(cache_keys[i], []).append(i)
+        
+        return summary_texts, pending
+    
+    def _load_sync_state(self, db: Session, user_id: Optional[int] = None) -> Optional[str]:
+        """Get the historyId an incremental sync should resume from"""
+        if settings.EMAIL_SYNC_MODE != "incremental":
+            return None
+        return SyncStateRepository.get_history_id(db, mailbox_key(user_id))
+    
+    def _stream_new_emails(
+        self,
+        gmail: GmailService,
+        history_id: Optional[str]
+    ) -> Tuple[Iterator[List[Dict[str, Any]]], Optional[str]]:
+        """
+        List unread emails, incrementally from the last synced historyId when enabled
+        
+        Returns:
+            Tuple of (iterator fetching the emails one batch at a time,
+            historyId to store once they are saved)
+        """
+        if settings.EMAIL_SYNC_MODE != "incremental":
+            batches, _ = gmail.stream_unread_emails(
+                None,
+                days=settings.EMAIL_FETCH_DAYS,
+                max_results=settings.EMAIL_FETCH_LIMIT
+            )
+            return batches, None
+        
+        return gmail.stream_unread_emails(
+            history_id,
+            days=settings.EMAIL_FETCH_DAYS,
+            max_results=settings.EMAIL_FETCH_LIMIT
+        )
+    
+    def _save_sync_state(self, db: Session, history_id: Optional[str], user_id: Optional[int] = None):
+        """Remember where the next incremental sync should resume"""
+        if history_id:
+            SyncStateRepository.save_history_id(db, mailbox_key(user_id), history_id)
+    
+    def _save_new_emails(
+        self,
+        db: Session,
+        emails: List[Dict[str, Any]],
+        user_id: Optional[int] = None
+    ) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Save emails that are not yet in the user's mailbox
+        
+        Returns:
+            List of (email ID, email data) tuples
+        """
+        # Skip emails that were already processed, with one lookup for the whole batch
+        with metrics.time_stage("dedup") as timing:
+            existing = EmailRepository.get_existing_email_ids(
+                db, [email_data["email_id"] for email_data in emails], user_id
+            )
+            
+            unsaved = []
+            for email_data in emails:
+                if email_data["email_id"] not in existing:
+                    existing.add(email_data["email_id"])
+                    unsaved.append(email_data)
+            timing.items = len(emails)
+        
+        with metrics.time_stage("insert") as timing:
+            ids = EmailRepository.create_emails_bulk(db, unsaved, user_id)
+            body_store.save(db, {email_id: email_data["body"] for email_id, email_data in zip(ids, unsaved)})
+            timing.items = len(ids)
+        return list(zip(ids, unsaved))
+    
+    def _load_unsummarized_emails(self, db: Session, user_id: Optional[int] = None) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Load saved emails of a user that have no summary yet, with their bodies
+        
+        Returns:
+            List of (email ID, email data) tuples, at most one Gmail batch of them
+        """
+        emails = EmailRepository.get_unsummarized_emails(db, settings.GMAIL_BATCH_SIZE, user_id)
+        unsummarized = []
+        for email in emails:
+            stored = body_store.load(db, email.id, user_id)
+            unsummarized.append((email.id, {
+                "email_id": email.email_id,
+                "sender": email.sender,
+                "subject": email.subject,
+                "body": (stored or {}).get("body") or "",
+                "received_at": email.received_at
+            }))
+        return unsummarized
+    
+    def _save_summaries(
+        self,
+        db: Session,
+        new_emails: List[Tuple[int, Dict[str, Any]]],
+        summary_texts: List[Optional[str]],
+        user_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Save generated summaries for saved emails in one transaction
+        
+        Returns:
+            List of email summaries
+        """
+        created_at = datetime.utcnow()
+        rows = [
+            (email_id, email_data, summary_text)
+            for (email_id, email_data), summary_text in zip(new_emails, summary_texts)
+            if summary_text
+        ]
+        
+        with metrics.time_stage("insert") as timing:
+            summary_ids = SummaryRepository.create_summaries_bulk(db, [
+                {"summary_text": summary_text, "email_id": email_id, "user_id": user_id, "created_at": created_at}
+                for email_id, _, summary_text in rows
+            ])
+            timing.items = len(summary_ids)
+        
+        # Prepare summary data for response
+        return [
+            {
+                "id": email_id,
+                "email_id": email_data["email_id"],
+                "sender": email_data["sender"],
+                "subject": email_data["subject"],
+                "received_at": email_data["received_at"].isoformat(),
+                "summary_text": summary_text,
+                "created_at": created_at.isoformat(),
+                "seen": False,
+                "summary_id": summary_id
+            }
+            for (email_id, email_data, summary_text), summary_id in zip(rows, summary_ids)
+        ]
+    
+    async def get_email_summaries(
+        self,
+        db: Union[AsyncSession, Session],
+        skip: int = 0,
+        limit: int = 100,
+        user_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get a user's emails with their summaries
         
         Returns:
             List of email summaries
         """
-        return SummaryRepository.get_email_with_summary(db, skip, limit)
+        return await AsyncSummaryRepository.get_email_with_summary(db, skip, limit, user_id)
+    
+    async def get_email_summaries_page(
+        self,
+        db: Union[AsyncSession, Session],
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        user_id: Optional[int] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Get a page of a user's emails with their summaries using keyset pagination
+        
+        Args:
+            cursor: Cursor returned with the previous page, or None for the first page
+            limit: Page size
+            user_id: Owner of the summaries, or None for the default mailbox
+            
+        Returns:
+            Tuple of (email summaries, cursor for the next page or None on the last page)
+            
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        after = decode_cursor(cursor) if cursor else None
+        
+        # Fetch one extra row to learn whether another page follows
+        rows = await AsyncSummaryRepository.get_email_with_summary_after(db, after, limit + 1, user_id)
+        if len(rows) <= limit:
+            return rows, None
+        
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1]["created_at"], rows[-1]["summary_id"])
+    
+    async def get_summaries_version(self, db: Union[AsyncSession, Session], user_id: Optional[int] = None) -> int:
+        """
+        Get the change counter of a user's summaries
+        
+        Returns:
+            A number that grows whenever a summary is created or marked seen
+        """
+        return await AsyncSummaryRepository.get_version(db, user_id)
     
-    def mark_summary_as_seen(self, db: Session, summary_id: int) -> bool:
+    async def search_emails(
+        self,
+        db: Union[AsyncSession, Session],
+        query: str,
+        skip: int = 0,
+        limit: int = 20,
+        user_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
         """
-        Mark a summary as seen
+        Search a user's emails and summaries
+        
+        Returns:
+            Matching emails with their summaries, best match first
+        """
+        return await AsyncSearchRepository.search(db, query, skip, limit, user_id)
+    
+    async def get_related_emails(
+        self,
+        db: Union[AsyncSession, Session],
+        email_id: int,
+        limit: int = 10,
+        user_id: Optional[int] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Get the emails most similar to one of a user's emails
+        
+        Returns:
+            Emails with their summaries and a similarity score, most similar
+            first, or None if the email does not exist
+        """
+        if await AsyncEmailRepository.get_email(db, email_id, user_id) is None:
+            return None
+        
+        vector = await asyncio.to_thread(embedding_index.get_vector, user_id, email_id)
+        if vector is None:
+            return []
+        
+        matches = (await asyncio.to_thread(embedding_index.search, user_id, vector, limit, [email_id]))[0]
+        rows = await AsyncSummaryRepository.get_email_with_summary_by_ids(
+            db, [match_id for match_id, _ in matches], user_id
+        )
+        by_id = {row["id"]: row for row in rows}
+        return [
+            {**by_id[match_id], "similarity": similarity}
+            for match_id, similarity in matches
+            if match_id in by_id
+        ]
+    
+    async def get_email_body(
+        self,
+        db: Union[AsyncSession, Session],
+        email_id: int,
+        user_id: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Get the body of one of a user's emails, decompressing it on demand
+        
+        Returns:
+            The email ID and body text (None once retention dropped it), or
+            None if the email does not exist
+        """
+        return await run_db(db, body_store.load, email_id, user_id)
+    
+    async def mark_summary_as_seen(
+        self,
+        db: Union[AsyncSession, Session],
+        summary_id: int,
+        user_id: Optional[int] = None
+    ) -> bool:
+        """
+        Mark one of a user's summaries as seen
         
         Returns:
             True if successful, False otherwise
         """
-        result = SummaryRepository.mark_as_seen(db, summary_id)
-        return result is not None 
\ No newline at end of file
+        result = await AsyncSummaryRepository.mark_as_seen(db, summary_id, user_id)
+        return result is not None
+
+# Create a singleton instance
+email_service = EmailService()
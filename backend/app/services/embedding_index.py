@@ -0,0 +1,298 @@
+import json
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.db.repository import DatabaseIdentityRepository
+
+logger = logging.getLogger(__name__)
+
+# Rows scored per step of a search, bounding the float32 copy of int8 vectors
+SEARCH_BLOCK_ROWS = 65536
+
+# Header of an index directory, naming the database its email IDs refer to
+INDEX_HEADER = "index.json"
+
+class _Shard:
+    """
+    Vectors of one mailbox, mirrored from an append-only file of fixed-size records
+
+    Every record holds an email ID, a scale and the vector, so a batch is
+    appended with a single write and files written by several worker
+    processes stay aligned. Other processes' appends are picked up by reading
+    the file past the last record loaded.
+    """
+    def __init__(self, path: str, record: np.dtype):
+        self.path = path
+        self.record = record
+        self.records = np.zeros(0, dtype=record)
+        self.current = np.zeros(0, dtype=bool)  # False for rows superseded by a later vector
+        self.count = 0
+        self.positions: Dict[int, int] = {}  # Email ID -> row of its latest vector
+
+    def refresh(self):
+        """Load records appended to the file since the last refresh"""
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+
+        # A record still being written by another process is read next time
+        available = size // self.record.itemsize
+        if available <= self.count:
+            return
+
+        new = np.fromfile(
+            self.path,
+            dtype=self.record,
+            count=available - self.count,
+            offset=self.count * self.record.itemsize
+        )
+        self._extend(new)
+
+    def append(self, records: np.ndarray):
+        """Write records to the file and add them to memory"""
+        self.refresh()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(records.tobytes())
+        self._extend(records)
+
+    def vectors(self, start: int, stop: int) -> np.ndarray:
+        """Get rows as float32 vectors"""
+        block = self.records[start:stop]
+        vectors = block["vector"].astype(np.float32)
+        if block["vector"].dtype == np.int8:
+            vectors *= block["scale"][:, None]
+        return vectors
+
+    def _extend(self, new: np.ndarray):
+        # Grow geometrically so appending stays amortized O(1) per record
+        needed = self.count + len(new)
+        if needed > len(self.records):
+            capacity = max(needed, 2 * len(self.records), 1024)
+            grown = np.zeros(capacity, dtype=self.record)
+            grown[:self.count] = self.records[:self.count]
+            self.records = grown
+            current = np.zeros(capacity, dtype=bool)
+            current[:self.count] = self.current[:self.count]
+            self.current = current
+
+        self.records[self.count:needed] = new
+        self.current[self.count:needed] = True
+        for row, email_id in enumerate(new["id"].tolist(), self.count):
+            previous = self.positions.get(email_id)
+            if previous is not None:
+                self.current[previous] = False
+            self.positions[email_id] = row
+        self.count = needed
+
+
+class EmbeddingIndex:
+    """
+    Nearest-neighbour index over email embeddings, one shard per mailbox
+
+    Vectors are unit length, so cosine similarity is a dot product; a search
+    scores every vector of the mailbox with NumPy matrix products. With
+    EMBEDDING_DTYPE=int8 each vector is stored as int8 values with a float32
+    scale, a quarter of the float32 size.
+
+    Vectors are keyed by database row ID, so the directory's header records
+    which database they belong to; an index left over from another database
+    (recreated, or DATABASE_URL pointed elsewhere) is discarded on first use
+    and refills as mail is fetched.
+    """
+    def __init__(
+        self,
+        directory: str = settings.EMBEDDING_INDEX_DIR,
+        dtype: str = settings.EMBEDDING_DTYPE,
+        database_id: Optional[str] = None
+    ):
+        self.directory = os.path.join(directory, settings.HUGGINGFACE_MODEL.replace("/", "--"))
+        self.dtype = "float32" if dtype == "float32" else "int8"
+        self.shards: Dict[Optional[int], _Shard] = {}
+        self.dimension: Optional[int] = None
+        self.database_id = database_id  # Read from the database on first use when not given
+        self.verified = False
+        self.lock = threading.Lock()
+
+    def add(self, user_id: Optional[int], email_ids: List[int], vectors: np.ndarray):
+        """
+        Add vectors for a user's emails
+
+        Args:
+            user_id: Owner of the emails, or None for the default mailbox
+            email_ids: Database IDs of the emails
+            vectors: Unit-length float32 vectors, one row per email
+        """
+        if not email_ids:
+            return
+
+        with self.lock:
+            shard = self._shard(user_id, vectors.shape[1])
+            records = np.zeros(len(email_ids), dtype=shard.record)
+            records["id"] = email_ids
+            if self.dtype == "int8":
+                scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127
+                records["scale"] = scales
+                records["vector"] = np.round(vectors / scales[:, None]).astype(np.int8)
+            else:
+                records["vector"] = vectors
+            shard.append(records)
+
+    def get_vector(self, user_id: Optional[int], email_id: int) -> Optional[np.ndarray]:
+        """Get the stored vector of an email, or None if it is not indexed"""
+        with self.lock:
+            shard = self._existing_shard(user_id)
+            if shard is None or email_id not in shard.positions:
+                return None
+            row = shard.positions[email_id]
+            return shard.vectors(row, row + 1)[0]
+
+    def search(
+        self,
+        user_id: Optional[int],
+        queries: np.ndarray,
+        k: int = 10,
+        exclude: Optional[List[int]] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Find the most similar emails in a user's mailbox
+
+        Args:
+            user_id: Owner of the emails, or None for the default mailbox
+            queries: Unit-length float32 query vectors, one row per query
+            k: Number of neighbours per query
+            exclude: Email IDs never returned, e.g. the query emails themselves
+
+        Returns:
+            (email ID, cosine similarity) pairs for each query, most similar first
+        """
+        queries = np.atleast_2d(queries).astype(np.float32)
+        with self.lock:
+            shard = self._existing_shard(user_id)
+            if shard is None or shard.count == 0 or k <= 0:
+                return [[] for _ in range(len(queries))]
+
+            scores = np.empty((len(queries), shard.count), dtype=np.float32)
+            for start in range(0, shard.count, SEARCH_BLOCK_ROWS):
+                stop = min(start + SEARCH_BLOCK_ROWS, shard.count)
+                scores[:, start:stop] = queries @ shard.vectors(start, stop).T
+            ids = shard.records["id"][:shard.count].copy()
+
+            # Superseded rows and excluded emails never match
+            scores[:, ~shard.current[:shard.count]] = -np.inf
+            excluded = [shard.positions[email_id] for email_id in exclude or [] if email_id in shard.positions]
+            scores[:, excluded] = -np.inf
+
+        results = []
+        k = min(k, shard.count)
+        for row in scores:
+            top = np.argpartition(-row, k - 1)[:k]
+            top = top[np.argsort(-row[top])]
+            # int8 rounding can push a self-match just past 1
+            results.append([(int(ids[i]), min(float(row[i]), 1.0)) for i in top if np.isfinite(row[i])])
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        """Get index sizes"""
+        with self.lock:
+            vectors = sum(shard.count for shard in self.shards.values())
+            return {
+                "enabled": settings.EMBEDDINGS_ENABLED,
+                "dtype": self.dtype,
+                "dimension": self.dimension,
+                "mailboxes": len(self.shards),
+                "vectors": vectors,
+                "bytes": sum(shard.count * shard.record.itemsize for shard in self.shards.values())
+            }
+
+    def _record(self, dimension: int) -> np.dtype:
+        vector = np.int8 if self.dtype == "int8" else np.float32
+        return np.dtype([("id", "<i8"), ("scale", "<f4"), ("vector", vector, (dimension,))])
+
+    def _path(self, user_id: Optional[int]) -> str:
+        name = "default" if user_id is None else f"user{user_id}"
+        return os.path.join(self.directory, f"{name}.{self.dtype}x{self.dimension}.vec")
+
+    def _detect_dimension(self):
+        """Take the vector size from files written by an earlier run (lock held)"""
+        if not os.path.isdir(self.directory):
+            return
+        pattern = re.compile(rf"^\w+\.{self.dtype}x(\d+)\.vec$")
+        for name in os.listdir(self.directory):
+            match = pattern.match(name)
+            if match:
+                self.dimension = int(match.group(1))
+                return
+
+    def _verify_database(self):
+        """Discard vectors written for another database (lock held)"""
+        if self.verified:
+            return
+        if self.database_id is None:
+            db = SessionLocal()
+            try:
+                self.database_id = DatabaseIdentityRepository.get_database_id(db)
+            finally:
+                db.close()
+
+        header = os.path.join(self.directory, INDEX_HEADER)
+        try:
+            with open(header) as f:
+                indexed_database_id = json.load(f).get("database_id")
+        except (FileNotFoundError, ValueError):
+            indexed_database_id = None
+
+        if indexed_database_id != self.database_id:
+            stale = [name for name in os.listdir(self.directory) if name.endswith(".vec")] if os.path.isdir(self.directory) else []
+            if stale:
+                logger.warning(
+                    f"Embedding index in {self.directory} was built for another database; "
+                    f"discarding {len(stale)} shards to rebuild it"
+                )
+            for name in stale:
+                os.remove(os.path.join(self.directory, name))
+            self.shards.clear()
+            self.dimension = None
+
+            os.makedirs(self.directory, exist_ok=True)
+            with open(f"{header}.tmp", "w") as f:
+                json.dump({"database_id": self.database_id}, f)
+            os.replace(f"{header}.tmp", header)
+        self.verified = True
+
+    def _shard(self, user_id: Optional[int], dimension: int) -> _Shard:
+        """Get or open a user's shard for writing (lock held)"""
+        self._verify_database()
+        if self.dimension is None:
+            self.dimension = dimension
+        elif dimension != self.dimension:
+            raise ValueError(f"Expected {self.dimension}-dimensional vectors, got {dimension}")
+
+        shard = self.shards.get(user_id)
+        if shard is None:
+            shard = self.shards[user_id] = _Shard(self._path(user_id), self._record(dimension))
+        return shard
+
+    def _existing_shard(self, user_id: Optional[int]) -> Optional[_Shard]:
+        """Get a user's shard with records other processes appended (lock held)"""
+        self._verify_database()
+        shard = self.shards.get(user_id)
+        if shard is None:
+            if self.dimension is None:
+                self._detect_dimension()
+            if self.dimension is None or not os.path.exists(self._path(user_id)):
+                return None
+            shard = self._shard(user_id, self.dimension)
+        shard.refresh()
+        return shard
+
+# Create a singleton instance
+embedding_index = EmbeddingIndex()
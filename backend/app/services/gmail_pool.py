@@ -0,0 +1,76 @@
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.repository import UserRepository
+from app.services.gmail_service import SCOPES, GmailService, gmail_service
+
+logger = logging.getLogger(__name__)
+
+class GmailClientPool:
+    """
+    Gmail clients keyed by user, built from the credentials store on first use
+
+    The least recently used clients are dropped once more than
+    GMAIL_CLIENT_POOL_SIZE are open. user_id None is the default mailbox.
+    """
+    def __init__(self, max_clients: int = settings.GMAIL_CLIENT_POOL_SIZE):
+        self.max_clients = max_clients
+        self.clients: "OrderedDict[int, GmailService]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, db: Session, user_id: Optional[int]) -> Optional[GmailService]:
+        """
+        Get the Gmail client for a user
+
+        Returns:
+            The client, or None if the user has no stored credentials
+        """
+        if user_id is None:
+            return gmail_service
+
+        with self.lock:
+            client = self.clients.get(user_id)
+            if client is not None:
+                self.clients.move_to_end(user_id)
+                return client
+
+        # Build outside the lock; refreshing a token is a network call
+        client = self._build_client(db, user_id)
+        if client is None:
+            return None
+
+        with self.lock:
+            client = self.clients.setdefault(user_id, client)
+            self.clients.move_to_end(user_id)
+            while len(self.clients) > self.max_clients:
+                self.clients.popitem(last=False)
+        return client
+
+    def invalidate(self, user_id: int):
+        """Drop a user's client so the next get() uses freshly stored credentials"""
+        with self.lock:
+            self.clients.pop(user_id, None)
+
+    def _build_client(self, db: Session, user_id: int) -> Optional[GmailService]:
+        user = UserRepository.get_user(db, user_id)
+        if user is None or not user.gmail_token:
+            logger.warning(f"No Gmail credentials stored for user {user_id}")
+            return None
+
+        creds = Credentials.from_authorized_user_info(json.loads(user.gmail_token), SCOPES)
+        if creds.expired and creds.refresh_token:
+            logger.info(f"Refreshing Gmail token for user {user_id}")
+            creds.refresh(Request())
+            UserRepository.save_gmail_token(db, user.email, creds.to_json())
+
+        return GmailService(credentials=creds)
+
+# Create a singleton instance
+gmail_pool = GmailClientPool()
@@ -1,18 +1,26 @@
 import os
-import base64
 import email
 import json
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from itertools import islice
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from urllib.parse import urljoin
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import BatchHttpRequest
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
-import html2text
+from google_auth_httplib2 import AuthorizedHttp
+import httplib2
 import pickle
 
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.utils.mime import extract_text
 
 # Configure logging
 logging.basicConfig(
@@ -21,19 +29,47 @@ logging.basicConfig(
 )
 logger = logging.getLogger("gmail_service")
 
+# OAuth scopes requested for every mailbox
+SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
+
+class HistoryExpiredError(Exception):
+    """Raised when a stored historyId is older than the history Gmail keeps."""
+
+
 class GmailService:
-    def __init__(self):
+    def __init__(self, credentials: Optional[Credentials] = None):
+        """
+        Create a Gmail client.
+        
+        Args:
+            credentials: OAuth credentials of a connected user; without them the
+                default mailbox's token.pickle is used
+        """
         self.service = None
+        self.credentials = None
         self.use_mock = True  # Default to mock mode for development
         self.credentials_path = os.path.join(os.getcwd(), "credentials.json")
         self.token_path = os.path.join(os.getcwd(), "token.pickle")
-        self.initialize_service()
+        self.initialize_service(credentials)
     
-    def initialize_service(self):
+    def initialize_service(self, user_credentials: Optional[Credentials] = None):
         """Initialize the Gmail API service with OAuth credentials if available."""
         try:
             logger.info("Initializing Gmail service")
             
+            if user_credentials is not None:
+                self.service = self._build_service(user_credentials)
+                self.use_mock = False
+                logger.info("Gmail service initialized with user credentials")
+                return True
+            
+            # A local Gmail stand-in needs no OAuth credentials
+            if settings.GMAIL_API_ENDPOINT and not os.path.exists(self.credentials_path):
+                self.service = self._build_service(None)
+                self.use_mock = False
+                logger.info(f"Gmail service initialized against {settings.GMAIL_API_ENDPOINT}")
+                return True
+            
             # Check if credentials file exists
             if not os.path.exists(self.credentials_path):
                 logger.warning(f"Credentials file not found: {self.credentials_path}. Using mock mode.")
@@ -52,7 +88,7 @@ class GmailService:
                 return False
             
             # Build Gmail API service
-            self.service = build('gmail', 'v1', credentials=creds)
+            self.service = self._build_service(creds)
             self.use_mock = False
             logger.info("Gmail service initialized with OAuth credentials")
             return True
@@ -65,7 +101,6 @@ class GmailService:
     def get_auth_url(self):
         """Generate OAuth authorization URL."""
         try:
-            SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
             flow = InstalledAppFlow.from_client_secrets_file(
                 self.credentials_path, SCOPES)
             flow.redirect_uri = 'http://localhost:8000/api/v1/auth/callback'
@@ -79,22 +114,31 @@ class GmailService:
             logger.error(f"Error generating auth URL: {str(e)}", exc_info=True)
             return None
     
-    def get_credentials_from_code(self, code):
-        """Exchange authorization code for credentials."""
+    def exchange_code(self, code) -> Optional[Credentials]:
+        """Exchange an authorization code for credentials without storing them."""
         try:
-            SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
             flow = InstalledAppFlow.from_client_secrets_file(
                 self.credentials_path, SCOPES)
             flow.redirect_uri = 'http://localhost:8000/api/v1/auth/callback'
             flow.fetch_token(code=code)
-            creds = flow.credentials
+            return flow.credentials
+        except Exception as e:
+            logger.error(f"Error getting credentials from code: {str(e)}", exc_info=True)
+            return None
+    
+    def get_credentials_from_code(self, code):
+        """Exchange authorization code for credentials for the default mailbox."""
+        try:
+            creds = self.exchange_code(code)
+            if creds is None:
+                return False
             
             # Save the credentials for future use
             with open(self.token_path, 'wb') as token:
                 pickle.dump(creds, token)
             
             # Initialize service with new credentials
-            self.service = build('gmail', 'v1', credentials=creds)
+            self.service = self._build_service(creds)
             self.use_mock = False
             
             return True
@@ -108,7 +152,7 @@ class GmailService:
         
         Args:
             days: Number of days back to fetch emails from
-            max_results: Maximum number of emails to fetch
+            max_results: Maximum number of emails to fetch, or 0 for no limit
             
         Returns:
             List of email dictionaries with id, sender, subject, body, and received time
@@ -118,41 +162,49 @@ class GmailService:
             logger.info("Using mock email data")
             return self._get_mock_emails(max_results)
         
-        # Calculate the date for filtering
-        after_date = datetime.utcnow() - timedelta(days=days)
-        after_str = after_date.strftime('%Y/%m/%d')
-        
-        # Create query for unread messages after the specified date
-        query = f"is:unread after:{after_str}"
-        
         try:
-            logger.info(f"Fetching unread emails with query: {query}")
-            # List messages matching the query
-            results = self.service.users().messages().list(
-                userId='me', 
-                q=query, 
-                maxResults=max_results
-            ).execute()
-            
-            messages = results.get('messages', [])
-            emails = []
-            
-            logger.info(f"Found {len(messages)} unread messages")
-            
-            for message in messages:
-                msg_id = message['id']
-                msg = self.service.users().messages().get(userId='me', id=msg_id).execute()
-                
-                # Extract email details
-                email_data = self._parse_message(msg)
-                if email_data:
-                    emails.append(email_data)
-            
-            return emails
+            return self._fetch_unread_emails(days, max_results)
         except Exception as e:
             logger.error(f"Error fetching unread emails: {str(e)}", exc_info=True)
             return self._get_mock_emails(max_results)
     
+    def stream_unread_emails(
+        self,
+        history_id: Optional[str],
+        days: int = 7,
+        max_results: int = 10
+    ) -> Tuple[Iterator[List[Dict[str, Any]]], Optional[str]]:
+        """
+        List unread emails added since a previous sync and fetch them batch by batch.
+        
+        Uses users.history.list to list only messages added after history_id.
+        Falls back to a full listing of the last `days` days when there is no
+        history_id yet or Gmail no longer has history that old.
+        
+        Only the listing happens before returning. Each step of the returned iterator yields the parsed emails
+        of one batch request. At most GMAIL_FETCH_CONCURRENCY batch requests
+        run ahead of the consumer, so a slow consumer also slows fetching.
+        
+        Args:
+            history_id: historyId returned by the previous sync, if any
+            days: Number of days back to fetch emails from on a full sync
+            max_results: Maximum number of emails to fetch on a full sync, or 0 for no limit
+            
+        Returns:
+            Tuple of (iterator of email dictionary batches, historyId to resume from next time or None)
+            
+        Raises:
+            Exception: If Gmail cannot be listed; mock emails are only returned
+                in mock mode, never in place of a connected mailbox's mail
+        """
+        if self.use_mock:
+            logger.info("Using mock email data")
+            return iter([self._get_mock_emails(max_results)]), None
+        
+        # Errors propagate so the sync fails without advancing its state
+        message_ids, new_history_id = self._list_new_message_ids(history_id, days, max_results)
+        return self._iter_emails(message_ids), new_history_id
+    
     def get_user_profile(self):
         """Get the current user's Gmail profile."""
         if self.use_mock or not self.service:
@@ -165,6 +217,234 @@ class GmailService:
             logger.error(f"Error getting user profile: {str(e)}", exc_info=True)
             return None
     
+    def _fetch_unread_emails(self, days: int, max_results: int) -> List[Dict[str, Any]]:
+        """Fetch and parse unread emails from the last specified number of days."""
+        message_ids = self._list_unread_message_ids(days, max_results)
+        return self._parse_messages(self._fetch_messages(message_ids))
+    
+    def _list_new_message_ids(
+        self,
+        history_id: Optional[str],
+        days: int,
+        max_results: int
+    ) -> Tuple[List[str], Optional[str]]:
+        """
+        List unread messages added since history_id, or all recent ones without it.
+        
+        Falls back to listing the last `days` days when Gmail no longer has
+        history that old.
+        
+        Returns:
+            Tuple of (message IDs, historyId to resume from next time)
+        """
+        if history_id:
+            logger.info(f"Fetching mailbox history since {history_id}")
+            try:
+                with metrics.time_stage("list") as timing:
+                    message_ids, new_history_id = self._list_history(history_id)
+                    timing.items = len(message_ids)
+                logger.info(f"Found {len(message_ids)} new unread messages")
+                return message_ids, new_history_id
+            except HistoryExpiredError:
+                logger.warning(f"History from {history_id} has expired. Running a full sync")
+        
+        # Take the starting point before listing so mail arriving mid-sync is picked up next time
+        start_history_id = self.service.users().getProfile(userId='me').execute().get('historyId')
+        return self._list_unread_message_ids(days, max_results), start_history_id
+    
+    def _list_unread_message_ids(self, days: int, max_results: int) -> List[str]:
+        """List the IDs of unread messages from the last specified number of days."""
+        # Calculate the date for filtering
+        after_date = datetime.utcnow() - timedelta(days=days)
+        after_str = after_date.strftime('%Y/%m/%d')
+        
+        # Create query for unread messages after the specified date
+        query = f"is:unread after:{after_str}"
+        
+        logger.info(f"Fetching unread emails with query: {query}")
+        # List messages matching the query
+        with metrics.time_stage("list") as timing:
+            message_ids = self._list_message_ids(query, max_results)
+            timing.items = len(message_ids)
+        
+        logger.info(f"Found {len(message_ids)} unread messages")
+        
+        return message_ids
+    
+    def _list_history(self, history_id: str) -> Tuple[List[str], str]:
+        """
+        List the IDs of unread messages added since history_id, following nextPageToken.
+        
+        Returns:
+            Tuple of (message IDs, the mailbox's current historyId)
+        
+        Raises:
+            HistoryExpiredError: If Gmail no longer keeps history that old
+        """
+        message_ids = []
+        seen = set()
+        page_token = None
+        
+        while True:
+            try:
+                results = self.service.users().history().list(
+                    userId='me',
+                    startHistoryId=history_id,
+                    historyTypes='messageAdded',
+                    pageToken=page_token
+                ).execute()
+            except HttpError as e:
+                if e.resp.status == 404:
+                    raise HistoryExpiredError(history_id) from e
+                raise
+            
+            for record in results.get('history', []):
+                for added in record.get('messagesAdded', []):
+                    message = added['message']
+                    if 'UNREAD' in message.get('labelIds', []) and message['id'] not in seen:
+                        seen.add(message['id'])
+                        message_ids.append(message['id'])
+            
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                # The last page carries the mailbox's current historyId
+                return message_ids, results['historyId']
+    
+    def _parse_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Parse fetched messages, dropping any that fail to parse."""
+        emails = []
+        with metrics.time_stage("parse") as timing:
+            for msg in messages:
+                # Extract email details
+                email_data = self._parse_message(msg)
+                if email_data:
+                    emails.append(email_data)
+            timing.items = len(emails)
+        return emails
+    
+    def _build_service(self, creds: Optional[Credentials]):
+        """Build the Gmail API client, honouring GMAIL_API_ENDPOINT."""
+        self.credentials = creds
+        kwargs = {}
+        if settings.GMAIL_API_ENDPOINT:
+            kwargs['client_options'] = {'api_endpoint': settings.GMAIL_API_ENDPOINT}
+        if creds is None:
+            kwargs['http'] = httplib2.Http()
+        else:
+            kwargs['credentials'] = creds
+        return build('gmail', 'v1', static_discovery=True, **kwargs)
+    
+    def _new_http(self):
+        """Create an HTTP client for one fetch thread (httplib2 is not thread-safe)."""
+        http = httplib2.Http()
+        if self.credentials is None:
+            return http
+        return AuthorizedHttp(self.credentials, http=http)
+    
+    def _new_batch_request(self, callback) -> BatchHttpRequest:
+        """Create a batch request against the configured endpoint."""
+        if settings.GMAIL_API_ENDPOINT:
+            batch_uri = urljoin(settings.GMAIL_API_ENDPOINT, 'batch/gmail/v1')
+            return BatchHttpRequest(callback=callback, batch_uri=batch_uri)
+        return self.service.new_batch_http_request(callback=callback)
+    
+    def _list_message_ids(self, query: str, max_results: int) -> List[str]:
+        """List the IDs of messages matching a query, following nextPageToken."""
+        message_ids = []
+        page_token = None
+        
+        while True:
+            page_size = settings.GMAIL_LIST_PAGE_SIZE
+            if max_results:
+                page_size = min(page_size, max_results - len(message_ids))
+            
+            results = self.service.users().messages().list(
+                userId='me',
+                q=query,
+                maxResults=page_size,
+                pageToken=page_token
+            ).execute()
+            
+            message_ids.extend(message['id'] for message in results.get('messages', []))
+            page_token = results.get('nextPageToken')
+            
+            if not page_token or (max_results and len(message_ids) >= max_results):
+                return message_ids
+    
+    def _fetch_messages(self, message_ids: List[str]) -> List[Dict[str, Any]]:
+        """
+        Fetch full messages using batch requests sent concurrently.
+        
+        Messages are returned in the order of message_ids; any that could not
+        be fetched are skipped.
+        """
+        return [message for batch in self._iter_message_batches(message_ids) for message in batch]
+    
+    def _iter_emails(self, message_ids: List[str]) -> Iterator[List[Dict[str, Any]]]:
+        """Fetch and parse messages, yielding the emails of one batch request at a time."""
+        for messages in self._iter_message_batches(message_ids):
+            yield self._parse_messages(messages)
+    
+    def _iter_message_batches(self, message_ids: List[str]) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Fetch full messages with concurrent batch requests, yielding each batch in order.
+        
+        GMAIL_FETCH_CONCURRENCY requests are kept in flight, and a new one is
+        only sent when the consumer takes a finished batch.
+        """
+        if not message_ids:
+            return
+        
+        batch_size = max(1, min(settings.GMAIL_BATCH_SIZE, 100))
+        concurrency = max(1, settings.GMAIL_FETCH_CONCURRENCY)
+        batches = (message_ids[i:i + batch_size] for i in range(0, len(message_ids), batch_size))
+        
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            in_flight = deque(
+                (batch_ids, executor.submit(self._fetch_batch, batch_ids))
+                for batch_ids in islice(batches, concurrency)
+            )
+            while in_flight:
+                batch_ids, future = in_flight.popleft()
+                fetched = future.result()
+                
+                next_batch_ids = next(batches, None)
+                if next_batch_ids is not None:
+                    in_flight.append((next_batch_ids, executor.submit(self._fetch_batch, next_batch_ids)))
+                
+                yield [fetched[msg_id] for msg_id in batch_ids if msg_id in fetched]
+    
+    def _fetch_batch(self, message_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch up to 100 messages in a single batch HTTP request."""
+        with metrics.time_stage("get") as timing:
+            http = self._new_http()
+            fetched = {}
+            failed = []
+            
+            def callback(request_id, response, exception):
+                if exception is not None:
+                    failed.append(request_id)
+                else:
+                    fetched[request_id] = response
+            
+            batch = self._new_batch_request(callback)
+            for msg_id in message_ids:
+                batch.add(self.service.users().messages().get(userId='me', id=msg_id), request_id=msg_id)
+            batch.execute(http=http)
+            
+            # Retry messages rejected inside the batch (usually rate limiting) one at a time
+            for msg_id in failed:
+                try:
+                    fetched[msg_id] = self.service.users().messages().get(
+                        userId='me',
+                        id=msg_id
+                    ).execute(http=http, num_retries=3)
+                except Exception as e:
+                    logger.warning(f"Could not fetch message {msg_id}: {str(e)}")
+            timing.items = len(fetched)
+        
+        return fetched
+    
     def _parse_message(self, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Parse Gmail message into structured data."""
         try:
@@ -204,28 +484,11 @@ class GmailService:
     def _get_message_body(self, message: Dict[str, Any]) -> str:
         """Extract the message body from the Gmail message."""
         try:
-            # Check if the message has parts
-            if 'parts' in message['payload']:
-                for part in message['payload']['parts']:
-                    if part['mimeType'] == 'text/plain' and 'data' in part['body']:
-                        data = part['body']['data']
-                        text = base64.urlsafe_b64decode(data).decode('utf-8')
-                        return text
-                    elif part['mimeType'] == 'text/html' and 'data' in part['body']:
-                        data = part['body']['data']
-                        html = base64.urlsafe_b64decode(data).decode('utf-8')
-                        # Convert HTML to plain text
-                        h = html2text.HTML2Text()
-                        h.ignore_links = False
-                        return h.handle(html)
-            
-            # If no parts, check if the body is directly in the payload
-            if 'body' in message['payload'] and 'data' in message['payload']['body']:
-                data = message['payload']['body']['data']
-                text = base64.urlsafe_b64decode(data).decode('utf-8')
-                return text
-            
-            return "(No body)"
+            # Walk the whole MIME tree, decoding only as much as is kept
+            text = extract_text(message['payload'], settings.EMAIL_BODY_MAX_CHARS)
+            if text is None:
+                return "(No body)"
+            return text
         except Exception as e:
             logger.error(f"Error extracting message body: {str(e)}", exc_info=True)
             return "(Error extracting body)"
@@ -266,7 +529,7 @@ class GmailService:
         
         now = datetime.utcnow()
         
-        for i in range(min(count, len(mock_subjects))):
+        for i in range(min(count or len(mock_subjects), len(mock_subjects))):
             mock_email = {
                 'email_id': f"mock-{i}-{now.timestamp()}",
                 'sender': mock_senders[i % len(mock_senders)],
@@ -276,4 +539,7 @@ class GmailService:
             }
             mock_emails.append(mock_email)
         
-        return mock_emails 
\ No newline at end of file
+        return mock_emails 
+
+# Create a singleton instance
+gmail_service = GmailService()
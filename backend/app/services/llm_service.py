@@ -1,7 +1,9 @@
 import requests
-from typing import Optional
+from typing import Dict, Optional, List, Tuple
 import logging
+import os
 import re
+import numpy as np
 import torch
 
 # Add transformers imports
@@ -14,25 +16,90 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 logger = logging.getLogger(__name__)
 
 class LLMService:
+    # Beam search settings (also part of the summary cache key)
+    GENERATION_PARAMS = {
+        "max_length": 150,
+        "temperature": 0.3,
+        "repetition_penalty": 1.2,
+        "num_beams": 4,
+        "early_stopping": True
+    }
+    
+    # Number of body characters included in the prompt when LLM_LONG_MODE is off
+    BODY_CHAR_LIMIT = 1000
+    
+    # Summary returned when inference fails
+    ERROR_SUMMARY = "Error generating summary."
+    
     def __init__(self):
         self.api_key = settings.HUGGINGFACE_API_KEY
         self.model_name = settings.HUGGINGFACE_MODEL
+        self.backend = settings.LLM_BACKEND
         self.mock_mode = True
         self.local_model = None
         self.tokenizer = None
         
         try:
             # Try loading the model locally
-            logger.info(f"Attempting to load {self.model_name} locally")
+            logger.info(f"Attempting to load {self.model_name} locally with the {self.backend} backend")
             self.tokenizer = T5Tokenizer.from_pretrained(self.model_name)
-            self.local_model = T5ForConditionalGeneration.from_pretrained(self.model_name)
+            self.local_model = self._load_model()
             self.mock_mode = False
-            logger.info(f"Successfully loaded {self.model_name} locally")
+            logger.info(f"Successfully loaded {self.model_name} locally with the {self.backend} backend")
         except Exception as e:
             logger.error(f"Error loading model locally: {str(e)}")
             logger.warning("Falling back to mock mode")
             self.mock_mode = True
     
+    def _load_model(self):
+        """
+        Load the model for the configured inference backend
+        
+        "torch" loads the fp32 model, "torch-int8" applies dynamic int8
+        quantization to its Linear layers and "onnx" runs an ONNX Runtime
+        export (requires optimum[onnxruntime]).
+        """
+        if settings.LLM_NUM_THREADS > 0:
+            torch.set_num_threads(settings.LLM_NUM_THREADS)
+        
+        if self.backend == "onnx":
+            try:
+                return self._load_onnx_model()
+            except ImportError:
+                logger.warning("optimum[onnxruntime] is not installed. Falling back to the torch backend")
+                self.backend = "torch"
+        
+        model = T5ForConditionalGeneration.from_pretrained(self.model_name)
+        model.eval()
+        
+        if self.backend == "torch-int8":
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        elif self.backend != "torch":
+            logger.warning(f"Unknown LLM_BACKEND '{self.backend}'. Using the torch backend")
+            self.backend = "torch"
+        
+        return model
+    
+    def _load_onnx_model(self):
+        """Load an ONNX Runtime export of the model, exporting it on first use"""
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        
+        session_options = onnxruntime.SessionOptions()
+        if settings.LLM_NUM_THREADS > 0:
+            session_options.intra_op_num_threads = settings.LLM_NUM_THREADS
+        
+        # Reuse a previous export when LLM_ONNX_DIR holds one
+        onnx_dir = settings.LLM_ONNX_DIR
+        if onnx_dir and os.path.exists(os.path.join(onnx_dir, "config.json")):
+            return ORTModelForSeq2SeqLM.from_pretrained(onnx_dir, session_options=session_options)
+        
+        logger.info(f"Exporting {self.model_name} to ONNX")
+        model = ORTModelForSeq2SeqLM.from_pretrained(self.model_name, export=True, session_options=session_options)
+        if onnx_dir:
+            model.save_pretrained(onnx_dir)
+        return model
+    
     def summarize_email(self, subject: str, body: str, max_length: int = 100) -> Optional[str]:
         """
         Summarize email using Flan-T5 model
@@ -46,82 +113,302 @@ class LLMService:
             Summary text as a string of bullet points
         """
         logger.info(f"Summarizing email: {subject}")
+        return self.summarize_batch([(subject, body)], max_length)[0]
+    
+    def summarize_batch(
+        self,
+        emails: List[Tuple[str, str]],
+        max_length: int = 100,
+        usage: Optional[Dict[str, int]] = None
+    ) -> List[Optional[str]]:
+        """
+        Summarize several emails with batched Flan-T5 inference
+        
+        Inputs are sorted by token length and grouped into padded batches so that
+        each batch holds at most LLM_MAX_BATCH_SIZE emails and at most
+        LLM_BATCH_TOKEN_BUDGET padded input tokens. With LLM_LONG_MODE, bodies
+        longer than one chunk are summarized with map-reduce (see _summarize_long).
+        
+        Args:
+            emails: List of (subject, body) tuples
+            max_length: Maximum length of each summary in words
+            usage: Optional dictionary that input_tokens, padded_tokens,
+                output_tokens and batches are added to
+            
+        Returns:
+            List of summaries in the same order as the input emails
+        """
+        if not emails:
+            return []
         
-        # If in mock mode, return a mock summary
+        # If in mock mode, return mock summaries
         if self.mock_mode:
             logger.warning("Using mock summarization (no model loaded)")
+            return [self._mock_summary(subject, body) for subject, body in emails]
+        
+        if settings.LLM_LONG_MODE:
+            raw_summaries = self._summarize_long(emails, usage)
+        else:
+            try:
+                # Tokenize without padding so every input keeps its true length
+                prompts = [self._build_prompt(subject, body) for subject, body in emails]
+                input_ids = self.tokenizer(prompts).input_ids
+            except Exception as e:
+                logger.error(f"Error tokenizing email batch: {str(e)}", exc_info=True)
+                return [self.ERROR_SUMMARY] * len(emails)
+            raw_summaries = self._generate(input_ids, usage)
+        
+        return [
+            self._format_summary(raw_summary) if raw_summary is not None else self.ERROR_SUMMARY
+            for raw_summary in raw_summaries
+        ]
+    
+    def embed_batch(self, emails: List[Tuple[str, str]]) -> Optional[np.ndarray]:
+        """
+        Embed emails with the model's encoder
+        
+        Each email's subject and body, truncated to EMBEDDING_MAX_TOKENS, is
+        encoded and its last hidden states are mean-pooled over the real tokens.
+        
+        Args:
+            emails: List of (subject, body) tuples
             
-            # Truncate the body for the log message
-            short_body = body[:50] + "..." if len(body) > 50 else body
-            logger.info(f"Would summarize: Subject: {subject}, Body: {short_body}")
-            
-            # Generate a mock summary based on the subject (case insensitive matching)
-            subject_lower = subject.lower()
-            
-            # Meeting related emails
-            if re.search(r'meeting|conference|discussion', subject_lower):
-                return "• Meeting scheduled for project discussion.\n• Attendance required for all team members.\n• Prepare progress updates before the meeting.\n• Please review the agenda before attending."
-            
-            # Report related emails
-            elif re.search(r'report|quarterly|review|budget', subject_lower):
-                return "• Quarterly report is due by end of week.\n• Include sales figures and customer metrics.\n• Send draft for review before final submission.\n• Financial data must be verified by accounting."
-            
-            # Project related emails
-            elif re.search(r'project|proposal|plan', subject_lower):
-                return "• New project proposal requires immediate attention.\n• Timeline estimation needed by Friday.\n• Resource allocation should be discussed with department heads.\n• Client is expecting preliminary feedback next week."
-            
-            # Website/Tech related emails
-            elif re.search(r'website|update|tech|maintenance', subject_lower):
-                return "• Website updates scheduled for this weekend.\n• Backup systems will be tested during maintenance.\n• Expected downtime is approximately 2 hours.\n• Users have been notified of the planned maintenance."
-            
-            # Training related emails
-            elif re.search(r'training|session|learn|tool', subject_lower):
-                return "• Training session scheduled for new company tools.\n• All departments expected to attend.\n• Pre-training materials have been shared via email.\n• Please prepare questions in advance."
-            
-            # Welcome/HR related emails
-            elif re.search(r'welcome|team|hr|holiday|schedule', subject_lower):
-                return "• Welcome information for new team members.\n• Company policies and guidelines attached.\n• Schedule a meeting with HR for benefits enrollment.\n• Office tour scheduled for Friday morning."
-            
-            # Client/Feedback related emails
-            elif re.search(r'client|feedback|customer|release', subject_lower):
-                return "• Client feedback regarding the latest product release.\n• Overall positive response with minor concerns.\n• Development team should address UI issues.\n• Follow-up meeting with client scheduled for next week."
-            
-            # Default summary for other subjects
-            else:
-                return "• Important email requires your attention.\n• Action items need to be addressed within 24 hours.\n• Coordinate with relevant team members as needed.\n• Reply to confirm receipt of this information."
+        Returns:
+            float32 array of unit-length vectors, one row per email, or None in
+            mock mode or if encoding fails
+        """
+        if self.mock_mode or not emails:
+            return None
         
         try:
-            # Prepare prompt for the model
-            truncated_body = body[:1000] if len(body) > 1000 else body
-            input_text = f"summarize: Subject: {subject}\n\nBody: {truncated_body}"
-            
-            logger.info("Running local model inference")
+            input_ids = self.tokenizer(
+                [f"{subject}\n\n{body}" for subject, body in emails],
+                truncation=True,
+                max_length=settings.EMBEDDING_MAX_TOKENS
+            ).input_ids
             
-            # Generate summary using local model
-            input_ids = self.tokenizer(input_text, return_tensors="pt").input_ids
+            vectors: List[Optional[np.ndarray]] = [None] * len(emails)
+            for batch in self._plan_batches([len(ids) for ids in input_ids]):
+                encoded = self.tokenizer.pad({"input_ids": [input_ids[i] for i in batch]}, return_tensors="pt")
+                with torch.no_grad():
+                    hidden = self._encode(encoded["input_ids"], encoded["attention_mask"])
+                
+                mask = encoded["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+                for i, vector in zip(batch, pooled.float().numpy()):
+                    vectors[i] = vector
             
-            outputs = self.local_model.generate(
-                input_ids,
-                max_length=150,
-                temperature=0.3,
-                repetition_penalty=1.2,
-                num_beams=4,
-                early_stopping=True
-            )
-            
-            raw_summary = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-            logger.info(f"Raw summary from model: {raw_summary[:100]}...")
+            matrix = np.stack(vectors).astype(np.float32)
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            return matrix
+        except Exception as e:
+            logger.error(f"Error embedding email batch: {str(e)}", exc_info=True)
+            return None
+    
+    def _encode(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        """Run the encoder and return its last hidden states"""
+        if hasattr(self.local_model, "get_encoder"):
+            encoder = self.local_model.get_encoder()
+        else:
+            # ONNX Runtime models expose the encoder session directly
+            encoder = self.local_model.encoder
+        
+        hidden = encoder(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+        return hidden if isinstance(hidden, torch.Tensor) else torch.from_numpy(hidden)
+    
+    def _summarize_long(
+        self,
+        emails: List[Tuple[str, str]],
+        usage: Optional[Dict[str, int]] = None
+    ) -> List[Optional[str]]:
+        """
+        Map-reduce summarization over token-budgeted chunks
+        
+        Each body is tokenized once and capped at LLM_MAX_INPUT_TOKENS. Bodies
+        are split into LLM_CHUNK_TOKENS chunks, and every chunk of every email
+        is summarized in one batched pass. The partial summaries of each email
+        are joined and summarized again, repeating until they fit in one chunk.
+        
+        Returns:
+            Raw summaries in input order, or None where generation failed
+        """
+        results: List[Optional[str]] = [None] * len(emails)
+        chunk_tokens = settings.LLM_CHUNK_TOKENS
+        
+        try:
+            prefixes = self.tokenizer(
+                [f"summarize: Subject: {subject}\n\nBody:" for subject, _ in emails],
+                add_special_tokens=False
+            ).input_ids
+            body_ids = self.tokenizer([body for _, body in emails], add_special_tokens=False).input_ids
+        except Exception as e:
+            logger.error(f"Error tokenizing email batch: {str(e)}", exc_info=True)
+            return results
+        
+        # Email index -> body tokens still to be summarized
+        pending = {i: ids[:settings.LLM_MAX_INPUT_TOKENS] for i, ids in enumerate(body_ids)}
+        eos = [self.tokenizer.eos_token_id]
+        
+        while pending:
+            inputs = []
+            owners = []
+            for i, ids in pending.items():
+                for start in range(0, max(len(ids), 1), chunk_tokens):
+                    inputs.append(prefixes[i] + ids[start:start + chunk_tokens] + eos)
+                    owners.append(i)
             
-            # Format the summary as bullet points if needed
-            if not any(line.strip().startswith('•') or line.strip().startswith('-') for line in raw_summary.split('\n')):
-                logger.info("Converting summary to bullet points")
-                sentences = [s.strip() for s in raw_summary.split('.') if s.strip()]
-                formatted_summary = '\n'.join(f"• {s}." for s in sentences)
-            else:
-                formatted_summary = raw_summary
+            logger.info(f"Summarizing {len(inputs)} chunks from {len(pending)} emails")
+            partials: Dict[int, List[Optional[str]]] = {}
+            for i, raw_summary in zip(owners, self._generate(inputs, usage)):
+                partials.setdefault(i, []).append(raw_summary)
             
-            return formatted_summary
+            next_pending = {}
+            for i, chunk_summaries in partials.items():
+                if None in chunk_summaries:
+                    continue
+                if len(chunk_summaries) == 1:
+                    results[i] = chunk_summaries[0]
+                    continue
+                
+                # Reduce: summarize the joined partial summaries
+                ids = self.tokenizer(" ".join(chunk_summaries), add_special_tokens=False).input_ids
+                if len(ids) >= len(pending[i]):
+                    # Summaries did not shrink the input; keep what fits in one chunk
+                    ids = ids[:chunk_tokens]
+                next_pending[i] = ids
+            pending = next_pending
+        
+        return results
+    
+    def _generate(self, input_ids: List[List[int]], usage: Optional[Dict[str, int]] = None) -> List[Optional[str]]:
+        """
+        Run batched generation on tokenized inputs
+        
+        Args:
+            input_ids: Token IDs of each input
+            usage: Optional dictionary that token and batch counts are added to
             
-        except Exception as e:
-            logger.error(f"Error running local model: {str(e)}", exc_info=True)
-            return "Error generating summary." 
\ No newline at end of file
+        Returns:
+            Raw decoded output per input, or None where its batch failed
+        """
+        outputs_text: List[Optional[str]] = [None] * len(input_ids)
+        
+        batches = self._plan_batches([len(ids) for ids in input_ids])
+        logger.info(f"Running local model inference on {len(input_ids)} inputs in {len(batches)} batches")
+        
+        for batch in batches:
+            try:
+                # Pad the batch to its longest member and mask the padding
+                encoded = self.tokenizer.pad(
+                    {"input_ids": [input_ids[i] for i in batch]},
+                    return_tensors="pt"
+                )
+                
+                with torch.no_grad():
+                    outputs = self.local_model.generate(
+                        encoded["input_ids"],
+                        attention_mask=encoded["attention_mask"],
+                        **self.GENERATION_PARAMS
+                    )
+                
+                raw_summaries = self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+                if usage is not None:
+                    self._count_usage(usage, encoded, outputs)
+                for i, raw_summary in zip(batch, raw_summaries):
+                    logger.info(f"Raw summary from model: {raw_summary[:100]}...")
+                    outputs_text[i] = raw_summary
+                    
+            except Exception as e:
+                logger.error(f"Error running local model: {str(e)}", exc_info=True)
+        
+        return outputs_text
+    
+    def _count_usage(self, usage: Dict[str, int], encoded, outputs: torch.Tensor):
+        """Add a generated batch's real, padded and generated token counts to usage"""
+        input_tokens = int(encoded["attention_mask"].sum())
+        output_tokens = int((outputs != self.tokenizer.pad_token_id).sum())
+        usage["input_tokens"] = usage.get("input_tokens", 0) + input_tokens
+        usage["padded_tokens"] = usage.get("padded_tokens", 0) + encoded["input_ids"].numel()
+        usage["output_tokens"] = usage.get("output_tokens", 0) + output_tokens
+        usage["batches"] = usage.get("batches", 0) + 1
+    
+    def _plan_batches(self, lengths: List[int]) -> List[List[int]]:
+        """Group input indices into length-sorted batches capped by size and padded token budget"""
+        order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+        
+        batches = []
+        batch: List[int] = []
+        for i in order:
+            # Inputs are visited longest first, so the first member sets the padded width
+            padded_length = lengths[batch[0]] if batch else lengths[i]
+            if batch and (
+                len(batch) >= settings.LLM_MAX_BATCH_SIZE
+                or padded_length * (len(batch) + 1) > settings.LLM_BATCH_TOKEN_BUDGET
+            ):
+                batches.append(batch)
+                batch = []
+            batch.append(i)
+        
+        if batch:
+            batches.append(batch)
+        
+        return batches
+    
+    @classmethod
+    def prompt_body(cls, body: str) -> str:
+        """The part of a body the model reads: all of it with LLM_LONG_MODE, otherwise the first BODY_CHAR_LIMIT characters"""
+        return body if settings.LLM_LONG_MODE else body[:cls.BODY_CHAR_LIMIT]
+    
+    def _build_prompt(self, subject: str, body: str) -> str:
+        """Build the model prompt for an email"""
+        return f"summarize: Subject: {subject}\n\nBody: {self.prompt_body(body)}"
+    
+    def _format_summary(self, raw_summary: str) -> str:
+        """Format a raw model summary as bullet points if needed"""
+        if not any(line.strip().startswith('•') or line.strip().startswith('-') for line in raw_summary.split('\n')):
+            logger.info("Converting summary to bullet points")
+            sentences = [s.strip() for s in raw_summary.split('.') if s.strip()]
+            return '\n'.join(f"• {s}." for s in sentences)
+        
+        return raw_summary
+    
+    def _mock_summary(self, subject: str, body: str) -> str:
+        """Generate a mock summary based on the subject"""
+        # Truncate the body for the log message
+        short_body = body[:50] + "..." if len(body) > 50 else body
+        logger.info(f"Would summarize: Subject: {subject}, Body: {short_body}")
+        
+        # Generate a mock summary based on the subject (case insensitive matching)
+        subject_lower = subject.lower()
+        
+        # Meeting related emails
+        if re.search(r'meeting|conference|discussion', subject_lower):
+            return "• Meeting scheduled for project discussion.\n• Attendance required for all team members.\n• Prepare progress updates before the meeting.\n• Please review the agenda before attending."
+        
+        # Report related emails
+        elif re.search(r'report|quarterly|review|budget', subject_lower):
+            return "• Quarterly report is due by end of week.\n• Include sales figures and customer metrics.\n• Send draft for review before final submission.\n• Financial data must be verified by accounting."
+        
+        # Project related emails
+        elif re.search(r'project|proposal|plan', subject_lower):
+            return "• New project proposal requires immediate attention.\n• Timeline estimation needed by Friday.\n• Resource allocation should be discussed with department heads.\n• Client is expecting preliminary feedback next week."
+        
+        # Website/Tech related emails
+        elif re.search(r'website|update|tech|maintenance', subject_lower):
+            return "• Website updates scheduled for this weekend.\n• Backup systems will be tested during maintenance.\n• Expected downtime is approximately 2 hours.\n• Users have been notified of the planned maintenance."
+        
+        # Training related emails
+        elif re.search(r'training|session|learn|tool', subject_lower):
+            return "• Training session scheduled for new company tools.\n• All departments expected to attend.\n• Pre-training materials have been shared via email.\n• Please prepare questions in advance."
+        
+        # Welcome/HR related emails
+        elif re.search(r'welcome|team|hr|holiday|schedule', subject_lower):
+            return "• Welcome information for new team members.\n• Company policies and guidelines attached.\n• Schedule a meeting with HR for benefits enrollment.\n• Office tour scheduled for Friday morning."
+        
+        # Client/Feedback related emails
+        elif re.search(r'client|feedback|customer|release', subject_lower):
+            return "• Client feedback regarding the latest product release.\n• Overall positive response with minor concerns.\n• Development team should address UI issues.\n• Follow-up meeting with client scheduled for next week."
+        
+        # Default summary for other subjects
+        else:
+            return "• Important email requires your attention.\n• Action items need to be addressed within 24 hours.\n• Coordinate with relevant team members as needed.\n• Reply to confirm receipt of this information."
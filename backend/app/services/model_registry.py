@@ -0,0 +1,78 @@
+import gc
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from app.services.llm_service import LLMService
+
+logger = logging.getLogger(__name__)
+
+class ModelRegistry:
+    """
+    Process-wide summarization model, loaded on first use
+
+    Every caller in a process shares one LLMService, so the weights are held
+    once per process.
+    """
+    def __init__(self):
+        self.llm_service: Optional[LLMService] = None
+        self.status = "idle"  # idle, loading, ready or failed
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.lock = threading.Lock()
+
+    @property
+    def is_ready(self) -> bool:
+        return self.status == "ready"
+
+    def get(self) -> LLMService:
+        """
+        Get the shared summarizer, loading it if needed
+
+        Concurrent callers wait for the first load instead of starting their own.
+        """
+        if self.llm_service is None:
+            with self.lock:
+                if self.llm_service is None:
+                    self._load()
+        return self.llm_service
+
+    def preload(self):
+        """
+        Load the model now and freeze the objects created so far
+
+        Call before a server forks its workers (e.g. gunicorn --preload) so the
+        weights are shared copy-on-write. gc.freeze() keeps the collector from
+        writing to the inherited objects and unsharing their pages.
+        """
+        self.get()
+        gc.freeze()
+
+    def status_dict(self) -> Dict[str, Any]:
+        """Get the load status for the readiness endpoint"""
+        return {
+            "status": self.status,
+            "model": self.llm_service.model_name if self.llm_service else None,
+            "backend": self.llm_service.backend if self.llm_service else None,
+            "mock_mode": self.llm_service.mock_mode if self.llm_service else None,
+            "load_seconds": self.load_seconds,
+            "error": self.error
+        }
+
+    def _load(self):
+        """Construct the LLMService (lock held)"""
+        self.status = "loading"
+        start = time.perf_counter()
+        try:
+            self.llm_service = LLMService()
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+            raise
+        self.load_seconds = time.perf_counter() - start
+        self.status = "ready"
+        logger.info(f"Summarization model ready in {self.load_seconds:.1f}s")
+
+# Create a singleton instance
+model_registry = ModelRegistry()
@@ -0,0 +1,284 @@
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+from urllib.parse import unquote, urlparse
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Called with (user_id, message) for every notification received from the bus
+NotificationHandler = Callable[[Optional[int], Dict[str, Any]], Awaitable[None]]
+
+class LocalNotificationBus:
+    """
+    Delivers notifications to the clients of this process only
+
+    Enough for a single worker; with several workers use the Redis bus so every
+    worker sees every notification.
+    """
+    def __init__(self):
+        self.handler: Optional[NotificationHandler] = None
+        self.published = 0
+
+    async def start(self, handler: NotificationHandler):
+        """Start delivering published notifications to a handler"""
+        self.handler = handler
+
+    async def stop(self):
+        """Stop delivering notifications"""
+        self.handler = None
+
+    async def publish(self, user_id: Optional[int], message: Dict[str, Any]):
+        """Deliver a notification for a user's clients"""
+        self.published += 1
+        if self.handler is not None:
+            await self.handler(user_id, message)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get bus counters"""
+        return {"backend": "local", "published": self.published}
+
+
+class RedisNotificationBus:
+    """
+    Fans notifications out to every worker through Redis PUBLISH/SUBSCRIBE
+
+    Speaks the Redis protocol (RESP) directly over asyncio streams, so it works
+    with Redis, Valkey, KeyDB or devtools.fake_redis. Every worker publishes to
+    and subscribes on one channel; a worker's own notifications reach its
+    clients through the subscription like everyone else's. The subscriber
+    reconnects with backoff, and notifications published while the broker is
+    unreachable are dropped.
+
+    Args:
+        url: redis://[:password@]host[:port] or unix:///path/to/socket
+        channel: Channel shared by all workers
+    """
+    # Seconds waited before reconnecting, doubled up to the maximum
+    RECONNECT_DELAY = 0.5
+    MAX_RECONNECT_DELAY = 10.0
+
+    def __init__(self, url: str = settings.NOTIFY_REDIS_URL, channel: str = settings.NOTIFY_CHANNEL):
+        self.url = url
+        self.channel = channel
+        # Parse up front so a malformed URL fails at startup rather than in the subscriber task
+        self.target, self.credentials = _parse_broker_url(url)
+        # Broker address without credentials, for logs
+        address = urlparse(url)
+        self.address = address._replace(netloc=address.netloc.rpartition("@")[2]).geturl()
+        self.handler: Optional[NotificationHandler] = None
+        self._subscriber: Optional[asyncio.Task] = None
+        self._subscribed = asyncio.Event()
+        self._publisher: Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = None
+        self._publish_lock = asyncio.Lock()
+        self.published = 0
+        self.received = 0
+        self.publish_errors = 0
+        self.reconnects = 0
+
+    async def start(self, handler: NotificationHandler):
+        """Subscribe to the channel and deliver received notifications to a handler"""
+        self.handler = handler
+        if self._subscriber is None:
+            self._subscriber = asyncio.create_task(self._subscribe_loop())
+
+    async def wait_subscribed(self, timeout: Optional[float] = None):
+        """Wait until the subscription is active"""
+        await asyncio.wait_for(self._subscribed.wait(), timeout)
+
+    async def stop(self):
+        """Unsubscribe and close the broker connections"""
+        self.handler = None
+        if self._subscriber is not None:
+            self._subscriber.cancel()
+            try:
+                await self._subscriber
+            except asyncio.CancelledError:
+                pass
+            self._subscriber = None
+        async with self._publish_lock:
+            await self._close_publisher()
+
+    async def publish(self, user_id: Optional[int], message: Dict[str, Any]):
+        """Publish a notification for a user's clients to every worker"""
+        payload = json.dumps({"user_id": user_id, "message": message})
+        async with self._publish_lock:
+            # Retry once on a fresh connection in case the broker dropped the old one
+            for attempt in range(2):
+                try:
+                    if self._publisher is None:
+                        self._publisher = await self._open()
+                    reader, writer = self._publisher
+                    writer.write(_encode_command("PUBLISH", self.channel, payload))
+                    await writer.drain()
+                    await _read_reply(reader)
+                    self.published += 1
+                    return
+                except (OSError, asyncio.IncompleteReadError, RedisError) as e:
+                    await self._close_publisher()
+                    if attempt == 1:
+                        self.publish_errors += 1
+                        logger.error(f"Error publishing notification to {self.address}: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get bus counters"""
+        return {
+            "backend": "redis",
+            "channel": self.channel,
+            "subscribed": self._subscribed.is_set(),
+            "published": self.published,
+            "received": self.received,
+            "publish_errors": self.publish_errors,
+            "reconnects": self.reconnects
+        }
+
+    async def _subscribe_loop(self):
+        """Receive notifications from the channel, reconnecting when the connection drops"""
+        delay = self.RECONNECT_DELAY
+        while True:
+            writer = None
+            try:
+                reader, writer = await self._open()
+                writer.write(_encode_command("SUBSCRIBE", self.channel))
+                await writer.drain()
+
+                while True:
+                    reply = await _read_reply(reader)
+                    if not isinstance(reply, list) or not reply:
+                        continue
+                    kind = reply[0]
+                    if kind == b"subscribe":
+                        self._subscribed.set()
+                        delay = self.RECONNECT_DELAY
+                        logger.info(f"Subscribed to notifications on {self.address} ({self.channel})")
+                    elif kind == b"message" and len(reply) == 3:
+                        self.received += 1
+                        await self._handle(reply[2])
+            except asyncio.CancelledError:
+                raise
+            except (OSError, asyncio.IncompleteReadError, RedisError) as e:
+                logger.warning(f"Notification subscription to {self.address} lost: {str(e)}; retrying in {delay:.1f}s")
+            except Exception as e:
+                # Keep subscribing; a dead subscriber would silently drop other workers' notifications
+                logger.error(f"Unexpected error in notification subscription to {self.address}: {str(e)}; retrying in {delay:.1f}s", exc_info=True)
+            finally:
+                self._subscribed.clear()
+                if writer is not None:
+                    writer.close()
+
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.MAX_RECONNECT_DELAY)
+
+    async def _handle(self, payload: bytes):
+        """Deliver one received notification"""
+        try:
+            notification = json.loads(payload)
+            user_id, message = notification["user_id"], notification["message"]
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring malformed notification: {str(e)}")
+            return
+
+        if self.handler is not None:
+            try:
+                await self.handler(user_id, message)
+            except Exception as e:
+                logger.error(f"Error delivering notification: {str(e)}", exc_info=True)
+
+    async def _open(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """Connect to the broker and authenticate"""
+        if isinstance(self.target, str):
+            reader, writer = await asyncio.open_unix_connection(self.target)
+        else:
+            reader, writer = await asyncio.open_connection(*self.target)
+
+        if self.credentials:
+            writer.write(_encode_command("AUTH", *self.credentials))
+            await writer.drain()
+            try:
+                await _read_reply(reader)
+            except RedisError:
+                writer.close()
+                raise
+        return reader, writer
+
+    async def _close_publisher(self):
+        if self._publisher is not None:
+            self._publisher[1].close()
+            self._publisher = None
+
+
+class RedisError(Exception):
+    """Error reply from the broker"""
+
+
+def _parse_broker_url(url: str) -> Tuple[Union[str, Tuple[str, int]], List[str]]:
+    """
+    Parse a notification broker URL
+
+    Returns:
+        Tuple of (socket path, or (host, port), and AUTH arguments, empty without a password)
+
+    Raises:
+        ValueError: If the URL is not a valid redis:// or unix:// URL
+    """
+    parsed = urlparse(url)
+    if parsed.scheme == "unix":
+        if not parsed.path:
+            raise ValueError(f"Notification broker URL has no socket path: {url}")
+        target: Union[str, Tuple[str, int]] = parsed.path
+    elif parsed.scheme in ("redis", ""):
+        try:
+            port = parsed.port or 6379
+        except ValueError:
+            raise ValueError(f"Notification broker URL has an invalid port: {url}")
+        target = (parsed.hostname or "localhost", port)
+    else:
+        raise ValueError(f"Unsupported notification broker URL: {url}")
+
+    credentials = []
+    if parsed.password:
+        credentials = [unquote(parsed.username), unquote(parsed.password)] if parsed.username else [unquote(parsed.password)]
+    return target, credentials
+
+def _encode_command(*args: Union[str, bytes]) -> bytes:
+    """Encode a command as a RESP array of bulk strings"""
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg.encode("utf-8") if isinstance(arg, str) else arg
+        parts.append(f"${len(data)}\r\n".encode())
+        parts.append(data)
+        parts.append(b"\r\n")
+    return b"".join(parts)
+
+async def _read_reply(reader: asyncio.StreamReader) -> Union[bytes, int, List[Any], None]:
+    """Read one RESP reply, raising RedisError for error replies"""
+    line = await reader.readuntil(b"\r\n")
+    kind, data = line[:1], line[1:-2]
+    if kind == b"+":
+        return data
+    if kind == b"-":
+        raise RedisError(data.decode("utf-8", "replace"))
+    if kind == b":":
+        return int(data)
+    if kind == b"$":
+        length = int(data)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b"*":
+        length = int(data)
+        if length < 0:
+            return None
+        return [await _read_reply(reader) for _ in range(length)]
+    raise RedisError(f"Unexpected reply from broker: {line!r}")
+
+def create_notification_bus() -> Union[LocalNotificationBus, RedisNotificationBus]:
+    """Create the bus selected by NOTIFY_BACKEND"""
+    if settings.NOTIFY_BACKEND == "redis":
+        return RedisNotificationBus()
+    if settings.NOTIFY_BACKEND != "local":
+        logger.warning(f"Unknown NOTIFY_BACKEND {settings.NOTIFY_BACKEND!r}; using the local bus")
+    return LocalNotificationBus()
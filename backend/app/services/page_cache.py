@@ -0,0 +1,93 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+
+# (user_id, skip, cursor, limit) of a GET /summaries request
+PageKey = Tuple[Optional[int], int, Optional[str], int]
+
+class Page(NamedTuple):
+    """A rendered page of summaries"""
+    version: int
+    etag: str
+    body: bytes
+    next_cursor: Optional[str]
+
+def make_etag(key: PageKey, version: int) -> str:
+    """
+    Strong ETag of a page at a version of its mailbox's summaries
+
+    The page's content is fixed by the request and the change counter, so the
+    tag is known before anything is queried or rendered.
+    """
+    digest = hashlib.blake2b(repr(key).encode("utf-8"), digest_size=8).hexdigest()
+    return f'"{version}-{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header names this ETag (weak comparison, as RFC 7232 asks)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+class SummaryPageCache:
+    """
+    LRU cache of rendered GET /summaries pages
+
+    Entries remember the version of the mailbox's summaries they were rendered
+    at. Inserting summaries or marking one seen bumps the version in the
+    database (see SummaryRepository), which invalidates every cached page of
+    that mailbox in every worker; a stale entry is dropped when next looked up.
+    """
+    def __init__(self, max_entries: int = settings.SUMMARY_PAGE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.pages: "OrderedDict[PageKey, Page]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key: PageKey, version: int) -> Optional[Page]:
+        """Get a page rendered at this version, or None"""
+        with self.lock:
+            page = self.pages.get(key)
+            if page is not None and page.version == version:
+                self.pages.move_to_end(key)
+                self.hits += 1
+                return page
+            if page is not None:
+                del self.pages[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: PageKey, version: int, body: bytes, next_cursor: Optional[str]) -> Page:
+        """Store a rendered page and return it"""
+        page = Page(version, make_etag(key, version), body, next_cursor)
+        if self.max_entries <= 0:
+            return page
+        with self.lock:
+            self.pages[key] = page
+            self.pages.move_to_end(key)
+            while len(self.pages) > self.max_entries:
+                self.pages.popitem(last=False)
+        return page
+
+    def record_not_modified(self):
+        """Count a request answered with 304 Not Modified"""
+        with self.lock:
+            self.not_modified += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Get page counts and hit, miss and 304 counters"""
+        return {
+            "entries": len(self.pages),
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified
+        }
+
+# Create a singleton instance
+summary_page_cache = SummaryPageCache()
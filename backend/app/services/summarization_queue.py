@@ -0,0 +1,369 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.model_registry import model_registry
+
+logger = logging.getLogger(__name__)
+
+def _init_worker():
+    """Load the summarization model in a worker (a forked worker reuses the parent's)"""
+    model_registry.get()
+
+def _worker_status() -> Dict[str, Any]:
+    """Report the model status of a worker"""
+    return model_registry.status_dict()
+
+def _summarize_in_worker(emails: List[Tuple[str, str]]) -> Tuple[List[Optional[str]], bool, Dict[str, float]]:
+    """
+    Summarize a chunk of (subject, body) tuples with the worker's model
+
+    Returns:
+        Tuple of (summaries, whether they came from the real model and may be
+        cached, token counts and seconds spent for the parent's metrics)
+    """
+    llm_service = model_registry.get()
+    usage: Dict[str, float] = {}
+    start = time.perf_counter()
+    summaries = llm_service.summarize_batch(emails, usage=usage)
+    usage["seconds"] = time.perf_counter() - start
+    return summaries, not llm_service.mock_mode, usage
+
+def _embed_in_worker(emails: List[Tuple[str, str]]) -> Optional[np.ndarray]:
+    """Embed a chunk of (subject, body) tuples with the worker's model encoder"""
+    return model_registry.get().embed_batch(emails)
+
+
+class SummarizationJob:
+    """
+    Tracks the progress of one queued refresh
+    """
+    def __init__(self, user_id: Optional[int] = None):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.status = "queued"  # queued, running, completed or failed
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.total = 0
+        self.processed = 0
+        self.summary_ids: List[int] = []
+        self.error: Optional[str] = None
+        self._listeners: List[asyncio.Queue] = []
+
+    def subscribe(self) -> asyncio.Queue:
+        """
+        Listen to the summaries the job saves from now on
+
+        Returns:
+            Queue receiving each saved summary, then None once the job finishes
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        if self.finished_at is not None:
+            queue.put_nowait(None)
+        else:
+            self._listeners.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        """Stop listening to the job"""
+        if queue in self._listeners:
+            self._listeners.remove(queue)
+
+    def publish(self, summaries: List[Dict[str, Any]]):
+        """Record saved summaries and hand them to listeners"""
+        self.summary_ids.extend(summary_data["summary_id"] for summary_data in summaries)
+        for queue in self._listeners:
+            for summary_data in summaries:
+                queue.put_nowait(summary_data)
+
+    def finish(self):
+        """Mark the job finished and end its listeners' streams"""
+        self.finished_at = datetime.utcnow()
+        for queue in self._listeners:
+            queue.put_nowait(None)
+        self._listeners = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the job status for the API"""
+        return {
+            "job_id": self.id,
+            "user_id": self.user_id,
+            "status": self.status,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "total": self.total,
+            "processed": self.processed,
+            "summary_ids": self.summary_ids,
+            "error": self.error
+        }
+
+
+class SummarizationQueue:
+    """
+    Runs refresh jobs off the request path and summarizes on a pool of workers
+
+    Each worker process holds its own copy of the model unless LLM_PRELOAD
+    loaded it in the parent, in which case workers are forked and share its
+    weights copy-on-write. With SUMMARY_WORKERS set to 0 the model runs on a
+    single background thread using the process-wide model instead.
+
+    Chunks wait in one queue per tenant (user) and are handed to the workers
+    round-robin across tenants, so a large mailbox cannot starve small ones.
+    """
+    # Number of finished jobs kept for status lookups
+    MAX_FINISHED_JOBS = 100
+
+    # Chunks handed to the executor per worker; the rest wait in tenant queues
+    IN_FLIGHT_PER_WORKER = 2
+
+    def __init__(self, workers: int = settings.SUMMARY_WORKERS):
+        self.workers = workers
+        self.executor: Optional[Executor] = None
+        self.jobs: "OrderedDict[str, SummarizationJob]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._warm_up: Optional[asyncio.Future] = None
+        self._pending: "OrderedDict[Hashable, Deque[Tuple[Callable, List[Tuple[str, str]], asyncio.Future]]]" = OrderedDict()
+        self._in_flight = 0
+
+    def _get_executor(self) -> Executor:
+        """Start the worker pool on first use and load the model in the background"""
+        if self.executor is None:
+            if self.workers > 0:
+                start_method = "spawn"
+                if settings.LLM_PRELOAD and model_registry.is_ready and "fork" in multiprocessing.get_all_start_methods():
+                    # Forked workers inherit the preloaded model
+                    start_method = "fork"
+                logger.info(f"Starting {self.workers} summarization worker processes ({start_method})")
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(start_method),
+                    initializer=_init_worker
+                )
+            else:
+                logger.info("Starting in-process summarization worker thread")
+                self.executor = ThreadPoolExecutor(max_workers=1, initializer=_init_worker)
+
+            # Completes once a worker has loaded the model
+            self._warm_up = asyncio.get_running_loop().run_in_executor(self.executor, _worker_status)
+        return self.executor
+
+    def warm_up(self):
+        """Start the workers so the model loads before the first refresh"""
+        self._get_executor()
+
+    def readiness(self) -> Dict[str, Any]:
+        """
+        Check whether summarization requests can be served without a model load
+
+        Returns:
+            Dictionary with a ready flag and the worker's model status
+        """
+        ready = False
+        model = None
+        if self._warm_up is not None and self._warm_up.done():
+            if self._warm_up.cancelled():
+                model = {"status": "failed", "error": "Warm-up was cancelled"}
+            elif self._warm_up.exception() is not None:
+                model = {"status": "failed", "error": str(self._warm_up.exception())}
+            else:
+                model = self._warm_up.result()
+                ready = model["status"] == "ready"
+        elif self.workers == 0:
+            model = model_registry.status_dict()
+
+        return {"ready": ready, "workers": self.workers, "model": model}
+
+    def shutdown(self):
+        """Stop the worker pool"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+            self._warm_up = None
+
+    def submit(
+        self,
+        runner: Callable[[SummarizationJob], Awaitable[None]],
+        user_id: Optional[int] = None
+    ) -> SummarizationJob:
+        """
+        Queue a job and run it in the background
+
+        Args:
+            runner: Coroutine function that performs the job and updates its progress
+            user_id: User the job runs for, or None for the default mailbox
+
+        Returns:
+            The queued job
+        """
+        job = SummarizationJob(user_id)
+        self.jobs[job.id] = job
+        self._prune_jobs()
+        self._tasks[job.id] = asyncio.create_task(self._run(job, runner))
+        return job
+
+    def get_job(self, job_id: str) -> Optional[SummarizationJob]:
+        """Get a job by its ID"""
+        return self.jobs.get(job_id)
+
+    async def wait(self, job: SummarizationJob):
+        """Wait for a job to finish; cancelling the wait does not cancel the job"""
+        task = self._tasks.get(job.id)
+        if task is not None:
+            await asyncio.shield(task)
+
+    async def summarize_chunks(
+        self,
+        emails: List[Tuple[str, str]],
+        chunk_size: Optional[int] = None,
+        tenant: Hashable = None
+    ) -> AsyncIterator[Tuple[List[int], List[Optional[str]], bool]]:
+        """
+        Summarize emails on the worker pool
+
+        Args:
+            emails: List of (subject, body) tuples
+            chunk_size: Number of emails sent to a worker at a time
+            tenant: Key the chunks are scheduled fairly under, e.g. the user ID
+
+        Yields:
+            (indices, summaries, cacheable) for each chunk as soon as it completes
+        """
+        if not emails:
+            return
+
+        chunk_size = chunk_size or settings.LLM_MAX_BATCH_SIZE
+
+        async def run_chunk(indices: List[int]) -> Tuple[List[int], List[Optional[str]], bool]:
+            summaries, cacheable, usage = await self._schedule(tenant, [emails[i] for i in indices])
+            metrics.observe_stage("inference", usage.pop("seconds"), len(indices))
+            metrics.record_inference(usage)
+            return indices, summaries, cacheable
+
+        chunks = [
+            list(range(start, min(start + chunk_size, len(emails))))
+            for start in range(0, len(emails), chunk_size)
+        ]
+
+        tasks = [asyncio.ensure_future(run_chunk(indices)) for indices in chunks]
+        try:
+            for next_chunk in asyncio.as_completed(tasks):
+                yield await next_chunk
+        finally:
+            # The consumer stopped early (an error, a closed stream): queued chunks are never dispatched
+            for task in tasks:
+                task.cancel()
+
+    async def embed(
+        self,
+        emails: List[Tuple[str, str]],
+        chunk_size: Optional[int] = None,
+        tenant: Hashable = None
+    ) -> Optional[np.ndarray]:
+        """
+        Embed emails with the model encoder on the worker pool
+
+        Args:
+            emails: List of (subject, body) tuples
+            chunk_size: Number of emails sent to a worker at a time
+            tenant: Key the chunks are scheduled fairly under, e.g. the user ID
+
+        Returns:
+            Unit-length float32 vectors, one row per email, or None when the
+            model is not loaded
+        """
+        if not emails:
+            return None
+
+        chunk_size = chunk_size or settings.LLM_MAX_BATCH_SIZE * 4
+        chunks = await asyncio.gather(*[
+            self._schedule(tenant, emails[start:start + chunk_size], _embed_in_worker)
+            for start in range(0, len(emails), chunk_size)
+        ])
+        if any(vectors is None for vectors in chunks):
+            return None
+        return np.concatenate(chunks)
+
+    def _schedule(
+        self,
+        tenant: Hashable,
+        chunk: List[Tuple[str, str]],
+        fn: Callable = _summarize_in_worker
+    ) -> asyncio.Future:
+        """Queue a chunk behind the tenant's earlier chunks"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(tenant, deque()).append((fn, chunk, future))
+        self._dispatch()
+        return future
+
+    def _dispatch(self):
+        """Hand queued chunks to the executor, taking one per tenant in turn"""
+        executor = self._get_executor()
+        max_in_flight = max(1, self.workers) * self.IN_FLIGHT_PER_WORKER
+
+        while self._pending and self._in_flight < max_in_flight:
+            tenant, chunks = next(iter(self._pending.items()))
+            fn, chunk, future = chunks.popleft()
+            if chunks:
+                self._pending.move_to_end(tenant)
+            else:
+                del self._pending[tenant]
+
+            if future.cancelled():
+                continue
+
+            self._in_flight += 1
+            task = asyncio.get_running_loop().run_in_executor(executor, fn, chunk)
+            task.add_done_callback(lambda done, future=future: self._chunk_done(done, future))
+
+    def _chunk_done(self, done: asyncio.Future, future: asyncio.Future):
+        self._in_flight -= 1
+        if done.cancelled():
+            future.cancel()
+        elif not future.cancelled():
+            if done.exception() is not None:
+                future.set_exception(done.exception())
+            else:
+                future.set_result(done.result())
+        self._dispatch()
+
+    async def _run(self, job: SummarizationJob, runner: Callable[[SummarizationJob], Awaitable[None]]):
+        """Run a job and record its outcome"""
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        try:
+            await runner(job)
+            job.status = "completed"
+        except Exception as e:
+            logger.error(f"Summarization job {job.id} failed: {str(e)}", exc_info=True)
+            job.status = "failed"
+            job.error = str(e)
+            if isinstance(e, BrokenProcessPool):
+                # A worker died; start a fresh pool and reload the model
+                self.executor = None
+                self._warm_up = None
+                self._get_executor()
+        finally:
+            job.finish()
+            self._tasks.pop(job.id, None)
+
+    def _prune_jobs(self):
+        """Forget the oldest finished jobs"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished_at is not None]
+        for job_id in finished[:max(0, len(finished) - self.MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+# Create a singleton instance
+summarization_queue = SummarizationQueue()
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.repository import SummaryCacheRepository
+from app.services.llm_service import LLMService
+
+logger = logging.getLogger(__name__)
+
+class SummaryCache:
+    """
+    Content-addressed cache of generated summaries
+
+    Keys hash the model name and backend, generation and chunking parameters,
+    subject and exactly the part of the body the model reads (see
+    LLMService.prompt_body), so identical mails (newsletters, notifications,
+    forwards) are summarized once and mails the model would see differently
+    never share a summary. Entries
+    live in the summary_cache table with an in-memory LRU in front of it.
+    """
+    def __init__(self, max_entries: int = settings.SUMMARY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, str]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def make_key(self, subject: str, body: str) -> str:
+        """Build the cache key for an email"""
+        # Long mode reads the whole body, chunked by these limits
+        long_mode = [settings.LLM_CHUNK_TOKENS, settings.LLM_MAX_INPUT_TOKENS] if settings.LLM_LONG_MODE else None
+        payload = json.dumps([
+            settings.HUGGINGFACE_MODEL,
+            settings.LLM_BACKEND,
+            LLMService.GENERATION_PARAMS,
+            long_mode,
+            subject,
+            LLMService.prompt_body(body or "")
+        ], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_many(self, db: Session, keys: List[str]) -> List[Optional[str]]:
+        """
+        Look up summaries, checking memory before the database
+
+        Returns:
+            Cached summary text for each key, or None on a miss
+        """
+        results: List[Optional[str]] = [None] * len(keys)
+        if not settings.SUMMARY_CACHE_ENABLED:
+            return results
+
+        missing = []
+        with self.lock:
+            for i, key in enumerate(keys):
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    results[i] = self.entries[key]
+                    self.memory_hits += 1
+                else:
+                    missing.append(i)
+
+        stored = SummaryCacheRepository.get_many(db, list({keys[i] for i in missing}))
+
+        with self.lock:
+            for i in missing:
+                summary_text = stored.get(keys[i])
+                if summary_text is None:
+                    self.misses += 1
+                else:
+                    results[i] = summary_text
+                    self.db_hits += 1
+                    self._remember(keys[i], summary_text)
+
+        return results
+
+    def put_many(self, db: Session, entries: Dict[str, Optional[str]]):
+        """Store newly generated summaries, skipping failed generations"""
+        if not settings.SUMMARY_CACHE_ENABLED:
+            return
+
+        entries = {
+            key: summary_text for key, summary_text in entries.items()
+            if summary_text and summary_text != LLMService.ERROR_SUMMARY
+        }
+        if not entries:
+            return
+
+        with self.lock:
+            for key, summary_text in entries.items():
+                self._remember(key, summary_text)
+
+        SummaryCacheRepository.save_many(db, settings.HUGGINGFACE_MODEL, entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit and miss counters"""
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "enabled": settings.SUMMARY_CACHE_ENABLED,
+            "memory_entries": len(self.entries),
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.db_hits) / lookups if lookups else 0.0
+        }
+
+    def _remember(self, key: str, summary_text: str):
+        """Add an entry to the LRU, evicting the least recently used (lock held)"""
+        self.entries[key] = summary_text
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+# Create a singleton instance
+summary_cache = SummaryCache()
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.database import run_db, session_scope
+from app.db.repository import UserRepository, mailbox_key
+from app.services.email_service import email_service
+from app.services.gmail_service import gmail_service
+from app.services.summarization_queue import summarization_queue
+
+logger = logging.getLogger(__name__)
+
+class MailboxSchedule:
+    """
+    Polling state of one mailbox
+    """
+    def __init__(self, user_id: Optional[int], interval: float):
+        self.user_id = user_id
+        self.interval = interval
+        self.next_run = time.monotonic()
+        self.running = False
+        self.syncs = 0
+        self.failures = 0
+        self.last_started_at: Optional[datetime] = None
+        self.last_synced: Optional[float] = None  # time.monotonic() of the last successful sync
+        self.last_duration: Optional[float] = None
+        self.last_new_emails = 0
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        """Serialize the schedule for the API"""
+        return {
+            "user_id": self.user_id,
+            "interval": self.interval,
+            "next_sync_in": max(0.0, self.next_run - now),
+            "running": self.running,
+            "syncs": self.syncs,
+            "failures": self.failures,
+            "last_started_at": self.last_started_at.isoformat() if self.last_started_at else None,
+            "last_duration": self.last_duration,
+            "last_new_emails": self.last_new_emails,
+            "lag": now - self.last_synced if self.last_synced is not None else None
+        }
+
+
+class SyncScheduler:
+    """
+    Polls every connected mailbox in the background
+
+    A mailbox is polled every SYNC_MIN_INTERVAL seconds while it is receiving
+    mail. Each poll that finds nothing new, or fails, multiplies its interval by
+    SYNC_BACKOFF_FACTOR, up to SYNC_MAX_INTERVAL; new mail resets it. Polls go
+    through EmailService.start_refresh_job, so a poll and a client's
+    POST /refresh for the same mailbox share one sync.
+    """
+    def __init__(
+        self,
+        min_interval: float = settings.SYNC_MIN_INTERVAL,
+        max_interval: float = settings.SYNC_MAX_INTERVAL,
+        backoff_factor: float = settings.SYNC_BACKOFF_FACTOR
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.backoff_factor = max(1.0, backoff_factor)
+        self.mailboxes: Dict[Optional[int], MailboxSchedule] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._syncs: Dict[Optional[int], asyncio.Task] = {}
+
+        # Totals since startup
+        self.syncs = 0
+        self.failures = 0
+        self.new_emails = 0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.max_start_delay = 0.0
+
+    def start(self):
+        """Start polling in the background"""
+        if self._task is None:
+            logger.info(f"Starting background sync every {self.min_interval}-{self.max_interval}s")
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop polling and wait for running polls to be cancelled"""
+        tasks = list(self._syncs.values())
+        if self._task is not None:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get sync counters, durations and per-mailbox lag"""
+        now = time.monotonic()
+        mailboxes = [schedule.to_dict(now) for schedule in self.mailboxes.values()]
+        lags = [mailbox["lag"] for mailbox in mailboxes if mailbox["lag"] is not None]
+        return {
+            "enabled": self._task is not None,
+            "syncs": self.syncs,
+            "failures": self.failures,
+            "new_emails": self.new_emails,
+            "avg_duration": self.total_duration / self.syncs if self.syncs else 0.0,
+            "max_duration": self.max_duration,
+            "max_start_delay": self.max_start_delay,
+            "max_lag": max(lags) if lags else None,
+            "mailboxes": mailboxes
+        }
+
+    def collect_metrics(self):
+        """Report sync counters, durations, per-mailbox lag and backoff intervals when /metrics is scraped"""
+        now = time.monotonic()
+        lags = [
+            ({"mailbox": mailbox_key(schedule.user_id)}, now - schedule.last_synced)
+            for schedule in self.mailboxes.values()
+            if schedule.last_synced is not None
+        ]
+        intervals = [
+            ({"mailbox": mailbox_key(schedule.user_id)}, schedule.interval)
+            for schedule in self.mailboxes.values()
+        ]
+        return [
+            ("echoloop_sync_runs_total", "counter", "Background mailbox syncs run", [({}, self.syncs)]),
+            ("echoloop_sync_failures_total", "counter", "Background mailbox syncs that failed", [({}, self.failures)]),
+            ("echoloop_sync_new_emails_total", "counter", "New emails found by background syncs", [({}, self.new_emails)]),
+            ("echoloop_sync_duration_seconds_total", "counter", "Seconds spent in background syncs", [({}, self.total_duration)]),
+            ("echoloop_sync_max_duration_seconds", "gauge", "Longest background sync", [({}, self.max_duration)]),
+            ("echoloop_sync_max_start_delay_seconds", "gauge", "Longest delay between a sync falling due and starting", [({}, self.max_start_delay)]),
+            ("echoloop_sync_lag_seconds", "gauge", "Seconds since a mailbox last synced successfully", lags),
+            ("echoloop_sync_interval_seconds", "gauge", "Current polling interval of a mailbox, including backoff", intervals)
+        ]
+
+    async def _run(self):
+        """Start polls as mailboxes fall due"""
+        while True:
+            try:
+                await self._update_mailboxes()
+            except Exception as e:
+                logger.error(f"Error listing mailboxes to sync: {str(e)}", exc_info=True)
+
+            now = time.monotonic()
+            for schedule in self.mailboxes.values():
+                if not schedule.running and schedule.next_run <= now:
+                    self.max_start_delay = max(self.max_start_delay, now - schedule.next_run)
+                    schedule.running = True
+                    self._syncs[schedule.user_id] = asyncio.create_task(self._sync(schedule))
+
+            # Sleep until the next poll is due, checking for new mailboxes at least every min_interval
+            waiting = [schedule.next_run for schedule in self.mailboxes.values() if not schedule.running]
+            delay = min(waiting, default=now + self.min_interval) - now
+            await asyncio.sleep(min(max(delay, 1.0), self.min_interval))
+
+    async def _update_mailboxes(self):
+        """Track newly connected mailboxes and forget disconnected ones"""
+        async with session_scope() as db:
+            user_ids: List[Optional[int]] = await run_db(db, UserRepository.get_connected_user_ids)
+        if not gmail_service.use_mock:
+            user_ids.append(None)
+
+        for user_id in user_ids:
+            if user_id not in self.mailboxes:
+                self.mailboxes[user_id] = MailboxSchedule(user_id, self.min_interval)
+
+        for user_id in set(self.mailboxes) - set(user_ids):
+            if not self.mailboxes[user_id].running:
+                del self.mailboxes[user_id]
+
+    async def _sync(self, schedule: MailboxSchedule):
+        """Poll one mailbox and adapt its interval to what was found"""
+        started = time.monotonic()
+        schedule.last_started_at = datetime.utcnow()
+        try:
+            # Joins a refresh a client already started for this mailbox
+            job = email_service.start_refresh_job(schedule.user_id)
+            await summarization_queue.wait(job)
+            if job.status == "failed":
+                raise RuntimeError(job.error)
+
+            schedule.last_new_emails = job.total
+            schedule.last_synced = time.monotonic()
+            self.new_emails += job.total
+            if job.total:
+                schedule.interval = self.min_interval
+            else:
+                schedule.interval = min(schedule.interval * self.backoff_factor, self.max_interval)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Background sync of mailbox {schedule.user_id} failed: {str(e)}")
+            schedule.failures += 1
+            self.failures += 1
+            schedule.interval = min(schedule.interval * self.backoff_factor, self.max_interval)
+        finally:
+            duration = time.monotonic() - started
+            schedule.syncs += 1
+            schedule.last_duration = duration
+            schedule.next_run = time.monotonic() + schedule.interval
+            schedule.running = False
+            self._syncs.pop(schedule.user_id, None)
+            self.syncs += 1
+            self.total_duration += duration
+            self.max_duration = max(self.max_duration, duration)
+
+# Create a singleton instance
+sync_scheduler = SyncScheduler()
+metrics.register_collector(sync_scheduler.collect_metrics)
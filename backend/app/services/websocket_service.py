@@ -1,64 +1,274 @@
-from typing import Dict, List, Set, Any
+from typing import Dict, List, Set, Any, Optional, Hashable
 import json
 import asyncio
 from fastapi import WebSocket, WebSocketDisconnect
 
+from app.core.config import settings
+from app.core.metrics import WS_FANOUT, metrics
+from app.services.notification_bus import create_notification_bus
+
+# Close code sent to clients that fall too far behind (1013: try again later)
+SLOW_CLIENT_CLOSE_CODE = 1013
+
+class ClientConnection:
+    """
+    One connected client with its own bounded outbound queue
+    
+    A sender task drains the queue, so a slow client only delays its own
+    messages.
+    """
+    def __init__(self, websocket: WebSocket, topic: Hashable, max_queue: int):
+        self.websocket = websocket
+        self.topic = topic
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=max_queue)
+        self.sent = 0
+        self.dropped = 0
+        self.sender: Optional[asyncio.Task] = None
+    
+    def offer(self, message: str) -> bool:
+        """Queue a message without waiting; returns False if the queue is full"""
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+
 class ConnectionManager:
     """
     Manages WebSocket connections for real-time notifications
+    
+    Connections are grouped in sets by topic (one topic per user). Messages are
+    serialized once and queued on every recipient; each connection sends from
+    its own queue concurrently with the others. A client whose queue is full
+    loses the message (WS_SLOW_CLIENT_POLICY=drop) or is disconnected
+    (WS_SLOW_CLIENT_POLICY=disconnect) so it can reconnect and reload.
+    
+    User notifications go through a notification bus (NOTIFY_BACKEND) so they
+    reach clients connected to any worker, not just the one that published.
+    
+    New summaries for a user are coalesced over WS_BATCH_WINDOW_MS into one
+    new_summaries message of up to WS_BATCH_MAX_SIZE summaries; a summary that
+    arrives alone is still sent as a single new_summary message.
     """
-    def __init__(self):
+    def __init__(
+        self,
+        max_queue: int = settings.WS_SEND_QUEUE_SIZE,
+        slow_client_policy: str = settings.WS_SLOW_CLIENT_POLICY,
+        bus=None,
+        batch_window_ms: int = settings.WS_BATCH_WINDOW_MS,
+        batch_max_size: int = settings.WS_BATCH_MAX_SIZE
+    ):
+        self.max_queue = max_queue
+        self.slow_client_policy = slow_client_policy
+        self.bus = bus or create_notification_bus()
+        self.batch_window = batch_window_ms / 1000
+        self.batch_max_size = max(1, batch_max_size)
+        
         # Store active connections
-        self.active_connections: List[WebSocket] = []
+        self.connections: Dict[WebSocket, ClientConnection] = {}
+        
+        # Connections per topic
+        self.topics: Dict[Hashable, Set[ClientConnection]] = {}
+        
+        # New summaries waiting to be sent, and their flush timers, per user
+        self.pending_summaries: Dict[Optional[int], List[Dict[str, Any]]] = {}
+        self.flush_timers: Dict[Optional[int], asyncio.Task] = {}
+        
+        # Totals since startup
+        self.summary_messages = 0
+        self.batched_summaries = 0
+        self.messages_sent = 0
+        self.messages_dropped = 0
+        self.slow_disconnects = 0
+    
+    @staticmethod
+    def user_topic(user_id: Optional[int]) -> Hashable:
+        """Topic for a user's notifications (None for clients of the default mailbox)"""
+        return ("user", user_id)
     
-    async def connect(self, websocket: WebSocket):
+    async def connect(self, websocket: WebSocket, user_id: Optional[int] = None):
         """Connect a new client"""
         await websocket.accept()
-        self.active_connections.append(websocket)
+        connection = ClientConnection(websocket, self.user_topic(user_id), self.max_queue)
+        connection.sender = asyncio.create_task(self._send_loop(connection))
+        self.connections[websocket] = connection
+        self.topics.setdefault(connection.topic, set()).add(connection)
     
     def disconnect(self, websocket: WebSocket):
         """Disconnect a client"""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        connection = self.connections.pop(websocket, None)
+        if connection is None:
+            return
+        
+        self.messages_sent += connection.sent
+        self.messages_dropped += connection.dropped
+        
+        members = self.topics.get(connection.topic)
+        if members is not None:
+            members.discard(connection)
+            if not members:
+                del self.topics[connection.topic]
+        
+        if connection.sender is not None and connection.sender is not asyncio.current_task():
+            connection.sender.cancel()
+    
+    async def start(self):
+        """Start receiving notifications from the bus"""
+        await self.bus.start(self.send_to_user_locally)
+    
+    async def stop(self):
+        """Send pending summaries and stop receiving notifications from the bus"""
+        for user_id in list(self.pending_summaries):
+            await self._flush_summaries(user_id)
+        await self.bus.stop()
     
     async def send_personal_message(self, message: str, websocket: WebSocket):
         """Send a message to a specific client"""
-        try:
-            await websocket.send_text(message)
-        except Exception as e:
-            print(f"Error sending personal message: {e}")
-            self.disconnect(websocket)
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            self._deliver(connection, message)
     
     async def broadcast(self, message: Dict[str, Any]):
         """Broadcast a message to all connected clients"""
-        disconnected = []
-        
-        # Convert the message to JSON
+        # Convert the message to JSON once for every recipient
         json_message = json.dumps(message)
         
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(json_message)
-            except Exception as e:
-                print(f"Error broadcasting message: {e}")
-                disconnected.append(connection)
+        connections = list(self.connections.values())
+        if metrics.enabled:
+            WS_FANOUT.observe(len(connections))
+        for connection in connections:
+            self._deliver(connection, json_message)
+    
+    async def publish(self, topic: Hashable, message: Dict[str, Any]):
+        """Send a message to every client subscribed to a topic"""
+        members = self.topics.get(topic)
+        if not members:
+            return
+        
+        # Convert the message to JSON once for every recipient
+        json_message = json.dumps(message)
         
-        # Clean up disconnected clients
-        for conn in disconnected:
-            self.disconnect(conn)
+        if metrics.enabled:
+            WS_FANOUT.observe(len(members))
+        for connection in list(members):
+            self._deliver(connection, json_message)
     
-    async def broadcast_new_summary(self, summary_data: Dict[str, Any]):
+    async def send_to_user(self, message: Dict[str, Any], user_id: Optional[int]):
+        """Send a message to every client of one user, on every worker"""
+        await self.bus.publish(user_id, message)
+    
+    async def send_to_user_locally(self, user_id: Optional[int], message: Dict[str, Any]):
+        """Send a message to the clients of one user connected to this worker"""
+        await self.publish(self.user_topic(user_id), message)
+    
+    async def broadcast_new_summary(self, summary_data: Dict[str, Any], user_id: Optional[int] = None):
         """
-        Broadcast a notification about a new email summary
+        Notify a user's clients about a new email summary
         
         Args:
             summary_data: Dictionary with summary information
+            user_id: Owner of the summary, or None for the default mailbox
         """
-        notification = {
-            "type": "new_summary",
-            "data": summary_data
+        if self.batch_window <= 0:
+            self.summary_messages += 1
+            await self.send_to_user({"type": "new_summary", "data": summary_data}, user_id)
+            return
+        
+        pending = self.pending_summaries.setdefault(user_id, [])
+        pending.append(summary_data)
+        if len(pending) >= self.batch_max_size:
+            await self._flush_summaries(user_id)
+        elif user_id not in self.flush_timers:
+            self.flush_timers[user_id] = asyncio.create_task(self._flush_summaries_later(user_id))
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get connection and message counters"""
+        connections = list(self.connections.values())
+        return {
+            "connections": len(connections),
+            "topics": len(self.topics),
+            "queued": sum(connection.queue.qsize() for connection in connections),
+            "sent": self.messages_sent + sum(connection.sent for connection in connections),
+            "dropped": self.messages_dropped + sum(connection.dropped for connection in connections),
+            "slow_disconnects": self.slow_disconnects,
+            "pending_summaries": sum(len(pending) for pending in self.pending_summaries.values()),
+            "summary_messages": self.summary_messages,
+            "batched_summaries": self.batched_summaries,
+            "bus": self.bus.stats()
         }
-        await self.broadcast(notification)
+    
+    def collect_metrics(self):
+        """Report connection gauges and message counters when /metrics is scraped"""
+        stats = self.stats()
+        bus = stats["bus"]
+        return [
+            ("echoloop_ws_connections", "gauge", "Open WebSocket connections on this worker", [({}, stats["connections"])]),
+            ("echoloop_ws_topics", "gauge", "Users with open WebSocket connections on this worker", [({}, stats["topics"])]),
+            ("echoloop_ws_queued_messages", "gauge", "Messages waiting in client send queues", [({}, stats["queued"])]),
+            ("echoloop_ws_pending_summaries", "gauge", "New summaries waiting for their batch window", [({}, stats["pending_summaries"])]),
+            ("echoloop_ws_messages_sent_total", "counter", "Messages sent to WebSocket clients", [({}, stats["sent"])]),
+            ("echoloop_ws_messages_dropped_total", "counter", "Messages dropped for slow WebSocket clients", [({}, stats["dropped"])]),
+            ("echoloop_ws_slow_disconnects_total", "counter", "Slow WebSocket clients disconnected", [({}, stats["slow_disconnects"])]),
+            ("echoloop_notifications_published_total", "counter", "Notifications published on the bus", [({"backend": bus["backend"]}, bus["published"])])
+        ]
+    
+    async def _flush_summaries_later(self, user_id: Optional[int]):
+        """Send a user's pending summaries once the batch window has passed"""
+        await asyncio.sleep(self.batch_window)
+        self.flush_timers.pop(user_id, None)
+        await self._flush_summaries(user_id)
+    
+    async def _flush_summaries(self, user_id: Optional[int]):
+        """Send a user's pending summaries as one message"""
+        timer = self.flush_timers.pop(user_id, None)
+        if timer is not None:
+            timer.cancel()
+        
+        pending = self.pending_summaries.pop(user_id, None)
+        if not pending:
+            return
+        
+        self.summary_messages += 1
+        if len(pending) == 1:
+            notification = {"type": "new_summary", "data": pending[0]}
+        else:
+            self.batched_summaries += len(pending)
+            notification = {"type": "new_summaries", "data": pending}
+        await self.send_to_user(notification, user_id)
+    
+    def _deliver(self, connection: ClientConnection, json_message: str):
+        """Queue a message for a client, applying the slow client policy when it is full"""
+        if connection.offer(json_message) or self.slow_client_policy == "drop":
+            return
+        
+        print(f"Disconnecting slow WebSocket client ({self.max_queue} messages queued)")
+        self.slow_disconnects += 1
+        self.disconnect(connection.websocket)
+        asyncio.create_task(self._close(connection.websocket))
+    
+    async def _send_loop(self, connection: ClientConnection):
+        """Send a client's queued messages in order until it disconnects"""
+        try:
+            while True:
+                message = await connection.queue.get()
+                await connection.websocket.send_text(message)
+                connection.sent += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Error sending WebSocket message: {e}")
+            self.disconnect(connection.websocket)
+    
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await websocket.close(code=SLOW_CLIENT_CLOSE_CODE)
+        except Exception:
+            # Already closed by the client
+            pass
 
 # Create a singleton instance
-connection_manager = ConnectionManager() 
\ No newline at end of file
+connection_manager = ConnectionManager()
+metrics.register_collector(connection_manager.collect_metrics)
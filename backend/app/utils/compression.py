@@ -0,0 +1,108 @@
+import logging
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Codecs a stored body can be encoded with
+RAW = "raw"
+ZLIB = "zlib"
+ZSTD = "zstd"
+
+# zlib only looks back 32 KB, so a longer preset dictionary is wasted
+ZLIB_MAX_DICTIONARY = 32 * 1024
+
+_local = threading.local()
+
+def available_codec(codec: str) -> str:
+    """The configured codec, or zlib when zstd is requested but zstandard is not installed"""
+    if codec == ZSTD and zstandard is None:
+        logger.warning("zstandard is not installed. Compressing email bodies with zlib")
+        return ZLIB
+    return codec if codec in (RAW, ZLIB, ZSTD) else ZLIB
+
+def compress(text: str, codec: str, dictionary: Optional[bytes] = None, level: int = 6) -> bytes:
+    """
+    Compress text with a codec, optionally against a trained dictionary
+
+    Args:
+        text: Text to compress
+        codec: "raw", "zlib" or "zstd"
+        dictionary: Dictionary from train_dictionary for the same codec
+        level: Compression level
+    """
+    data = text.encode("utf-8")
+    if codec == ZSTD:
+        return _zstd_compressor(dictionary, level).compress(data)
+    if codec == ZLIB:
+        compressor = zlib.compressobj(level, zdict=dictionary) if dictionary else zlib.compressobj(level)
+        return compressor.compress(data) + compressor.flush()
+    return data
+
+def decompress(codec: str, data: Optional[bytes], dictionary: Optional[bytes] = None) -> Optional[str]:
+    """Reverse compress(); returns None for missing data"""
+    if data is None:
+        return None
+    if codec == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed email bodies")
+        raw = _zstd_decompressor(dictionary).decompress(data)
+    elif codec == ZLIB:
+        decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+        raw = decompressor.decompress(data) + decompressor.flush()
+    else:
+        raw = data
+    return raw.decode("utf-8")
+
+def train_dictionary(samples: List[str], codec: str, size: int) -> Optional[bytes]:
+    """
+    Build a dictionary of content common to the sample texts
+
+    zstd trains a real dictionary; zlib uses the tail of the concatenated
+    samples as a preset dictionary, which captures the boilerplate repeated
+    across mail from the same senders.
+
+    Returns:
+        Dictionary bytes, or None if the samples are too few to train on
+    """
+    encoded = [sample.encode("utf-8") for sample in samples if sample]
+    if not encoded or size <= 0:
+        return None
+    if codec == ZSTD:
+        try:
+            return zstandard.train_dictionary(size, encoded).as_bytes()
+        except zstandard.ZstdError as e:
+            logger.warning(f"Could not train a zstd dictionary: {str(e)}")
+            return None
+    if codec == ZLIB:
+        return b"".join(encoded)[-min(size, ZLIB_MAX_DICTIONARY):]
+    return None
+
+def _zstd_compressor(dictionary: Optional[bytes], level: int):
+    """Per-thread compressor for a dictionary (built once; loading a dictionary is not free)"""
+    compressors: Dict[Tuple[Optional[bytes], int], "zstandard.ZstdCompressor"] = _cache("zstd_compressors")
+    key = (dictionary, level)
+    if key not in compressors:
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        compressors[key] = zstandard.ZstdCompressor(level=level, dict_data=dict_data)
+    return compressors[key]
+
+def _zstd_decompressor(dictionary: Optional[bytes]):
+    decompressors: Dict[Optional[bytes], "zstandard.ZstdDecompressor"] = _cache("zstd_decompressors")
+    if dictionary not in decompressors:
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        decompressors[dictionary] = zstandard.ZstdDecompressor(dict_data=dict_data)
+    return decompressors[dictionary]
+
+def _cache(name: str) -> dict:
+    cache = getattr(_local, name, None)
+    if cache is None:
+        cache = {}
+        setattr(_local, name, cache)
+    return cache
@@ -0,0 +1,189 @@
+import base64
+import codecs
+import re
+import threading
+from html.parser import HTMLParser
+from typing import Any, Dict, Iterator, List, Optional
+
+# Base64 characters decoded per step (a multiple of 4)
+DECODE_CHUNK_CHARS = 64 * 1024
+
+# Tags whose text is never part of the readable body
+_SKIPPED_TAGS = {"head", "script", "style", "title", "template", "noscript"}
+
+# Tags that start a new line in the converted text
+_BLOCK_TAGS = {
+    "address", "article", "blockquote", "br", "dd", "div", "dl", "dt", "footer",
+    "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "ol", "p", "pre",
+    "section", "table", "td", "th", "tr", "ul"
+}
+
+_CHARSET_RE = re.compile(r'charset\s*=\s*"?([^\s;"]+)', re.IGNORECASE)
+
+
+class HTMLTextConverter(HTMLParser):
+    """
+    Incremental HTML to plain text converter
+
+    Feed HTML in chunks and read the text produced so far from `length` and
+    `text()`. Call reset() to reuse the instance for another document.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+
+    def reset(self):
+        super().reset()
+        self.pieces: List[str] = []
+        self.length = 0
+        self._skip_depth = 0
+        self._at_line_start = True
+
+    def handle_starttag(self, tag: str, attrs):
+        if tag in _SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag in _BLOCK_TAGS:
+            self._newline()
+
+    def handle_startendtag(self, tag: str, attrs):
+        if tag in _BLOCK_TAGS:
+            self._newline()
+
+    def handle_endtag(self, tag: str):
+        if tag in _SKIPPED_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in _BLOCK_TAGS:
+            self._newline()
+
+    def handle_data(self, data: str):
+        if self._skip_depth:
+            return
+        text = " ".join(data.split())
+        if not text:
+            return
+        if not self._at_line_start and data[:1].isspace():
+            text = " " + text
+        self._append(text)
+        self._at_line_start = False
+
+    def text(self) -> str:
+        """Get the converted text"""
+        return "".join(self.pieces).strip()
+
+    def _newline(self):
+        if not self._at_line_start:
+            self._append("\n")
+            self._at_line_start = True
+
+    def _append(self, text: str):
+        self.pieces.append(text)
+        self.length += len(text)
+
+
+# One converter per thread; messages are parsed on fetch worker threads
+_converters = threading.local()
+
+def _get_converter() -> HTMLTextConverter:
+    converter = getattr(_converters, "converter", None)
+    if converter is None:
+        converter = _converters.converter = HTMLTextConverter()
+    else:
+        converter.reset()
+    return converter
+
+def _iter_leaves(part: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Walk a Gmail MIME tree depth-first, yielding non-multipart parts in order"""
+    stack = [part]
+    while stack:
+        current = stack.pop()
+        children = current.get("parts")
+        if children:
+            stack.extend(reversed(children))
+        else:
+            yield current
+
+def _is_attachment(part: Dict[str, Any]) -> bool:
+    if part.get("filename"):
+        return True
+    return any(
+        header.get("name", "").lower() == "content-disposition"
+        and header.get("value", "").lower().startswith("attachment")
+        for header in part.get("headers", [])
+    )
+
+def _charset(part: Dict[str, Any]) -> str:
+    """Get the charset declared in a part's Content-Type, defaulting to UTF-8"""
+    for header in part.get("headers", []):
+        if header.get("name", "").lower() == "content-type":
+            match = _CHARSET_RE.search(header.get("value", ""))
+            if match:
+                try:
+                    return codecs.lookup(match.group(1)).name
+                except LookupError:
+                    break
+    return "utf-8"
+
+def _iter_decoded(part: Dict[str, Any]) -> Iterator[str]:
+    """Decode a part's base64url body to text one chunk at a time"""
+    data = part["body"]["data"]
+    decoder = codecs.getincrementaldecoder(_charset(part))(errors="replace")
+    for start in range(0, len(data), DECODE_CHUNK_CHARS):
+        chunk = data[start:start + DECODE_CHUNK_CHARS]
+        chunk += "=" * (-len(chunk) % 4)
+        yield decoder.decode(base64.urlsafe_b64decode(chunk))
+    yield decoder.decode(b"", final=True)
+
+def _read_plain(part: Dict[str, Any], max_chars: int) -> str:
+    pieces = []
+    length = 0
+    for text in _iter_decoded(part):
+        pieces.append(text)
+        length += len(text)
+        if max_chars and length >= max_chars:
+            break
+    text = "".join(pieces)
+    return text[:max_chars] if max_chars else text
+
+def _read_html(part: Dict[str, Any], max_chars: int) -> str:
+    converter = _get_converter()
+    for html in _iter_decoded(part):
+        converter.feed(html)
+        if max_chars and converter.length >= max_chars:
+            break
+    else:
+        converter.close()
+    text = converter.text()
+    return text[:max_chars] if max_chars else text
+
+def extract_text(payload: Dict[str, Any], max_chars: int = 0) -> Optional[str]:
+    """
+    Extract the readable body from a Gmail message payload
+
+    Walks nested multipart parts, preferring the first text/plain part and
+    falling back to the first text/html part. Bodies are decoded in chunks and
+    decoding stops once max_chars characters of text have been produced, so
+    the cost per message is bounded regardless of its size.
+
+    Args:
+        payload: The `payload` of a Gmail API message resource
+        max_chars: Maximum length of the returned text; 0 for no limit
+
+    Returns:
+        The body text, or None if the message has no inline text part
+    """
+    html_part = None
+    for part in _iter_leaves(payload):
+        if "data" not in part.get("body", {}) or _is_attachment(part):
+            continue
+        mime_type = part.get("mimeType", "").lower()
+        if mime_type == "text/plain":
+            return _read_plain(part, max_chars)
+        if mime_type == "text/html" and html_part is None:
+            html_part = part
+
+    if html_part is not None:
+        return _read_html(html_part, max_chars)
+
+    # A single-part message of another text type
+    if not payload.get("parts") and "data" in payload.get("body", {}):
+        return _read_plain(payload, max_chars)
+    return None
@@ -0,0 +1,32 @@
+import json
+import logging
+from datetime import date, datetime
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+JSON_MEDIA_TYPE = "application/json"
+
+if orjson is None:
+    logger.info("orjson is not installed; encoding JSON responses with the json module")
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(value: Any) -> bytes:
+    """
+    Encode a value as compact UTF-8 JSON, with datetimes in ISO 8601 as FastAPI renders them
+
+    Uses orjson when it is installed; the output is the same either way, so
+    workers with and without it produce identical bodies for one page.
+    """
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
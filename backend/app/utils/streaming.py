@@ -0,0 +1,19 @@
+import json
+from typing import Any, AsyncIterator, Dict
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+def format_ndjson(record: Dict[str, Any]) -> str:
+    """Encode a record as one line of newline-delimited JSON"""
+    return json.dumps(record) + "\n"
+
+def format_sse(record: Dict[str, Any]) -> str:
+    """Encode a {"type", "data"} record as a Server-Sent Event named by its type"""
+    return f"event: {record['type']}\ndata: {json.dumps(record['data'])}\n\n"
+
+async def encode_stream(records: AsyncIterator[Dict[str, Any]], sse: bool = False) -> AsyncIterator[str]:
+    """Encode records as Server-Sent Events or NDJSON as they are produced"""
+    encode = format_sse if sse else format_ndjson
+    async for record in records:
+        yield encode(record)
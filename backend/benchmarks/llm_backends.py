@@ -0,0 +1,172 @@
+"""
+Compare the summarization backends selectable with LLM_BACKEND.
+
+Each backend runs in its own subprocess so load time and peak memory are
+measured in isolation. Every run summarizes the same fixed corpus, once in
+batches and once email by email, and the summaries are scored against the
+fp32 "torch" baseline with ROUGE-L F1 and the exact-match rate.
+
+    python -m benchmarks.llm_backends --backends torch torch-int8 onnx --threads 4
+    python -m benchmarks.llm_backends --output results.json
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+BASELINE_BACKEND = "torch"
+
+_TOPICS = [
+    ("Quarterly budget review", "The finance team needs the updated budget figures for Q{n} by Thursday. Please include travel and hardware spend, and flag any line item that is more than ten percent over plan."),
+    ("Project kickoff meeting", "We are kicking off project {n} next Monday at 10am in the main conference room. Bring your capacity estimates for the next two sprints and a list of open risks."),
+    ("Website maintenance window", "The public website will be offline on Saturday from 1am to 3am for database upgrade {n}. Customer support has been asked to post a notice on the status page."),
+    ("Client feedback on release", "Client {n} reviewed the latest release and is happy with the new reporting screens. They asked for faster exports and reported a layout issue on small laptops."),
+    ("Training session invitation", "A hands-on training session for the new deployment tooling is scheduled for Wednesday. Session {n} is limited to twenty people, so please register by Tuesday noon."),
+    ("Invoice overdue reminder", "Invoice {n} for the consulting engagement is now fourteen days overdue. Please confirm the payment date or let us know if the purchase order details changed."),
+    ("Team offsite planning", "We are planning the team offsite for the week of the {n}th. Vote for one of the three venues in the survey and tell us about any dietary requirements."),
+    ("Security incident follow-up", "Following incident {n}, all staff must rotate their VPN passwords before Friday. The post-mortem will be shared once the remaining action items are closed.")
+]
+
+
+def build_corpus(size: int) -> List[Tuple[str, str]]:
+    """Build a deterministic list of (subject, body) tuples"""
+    corpus = []
+    for i in range(size):
+        subject, body = _TOPICS[i % len(_TOPICS)]
+        repeat = 1 + (i // len(_TOPICS)) % 3  # Vary input length
+        corpus.append((f"{subject} #{i}", " ".join([body.format(n=i)] * repeat)))
+    return corpus
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_backend(corpus_size: int, repeats: int) -> Dict[str, Any]:
+    """Load the backend selected by LLM_BACKEND and time it on the corpus"""
+    from app.services.llm_service import LLMService
+
+    corpus = build_corpus(corpus_size)
+
+    start = time.perf_counter()
+    llm_service = LLMService()
+    load_seconds = time.perf_counter() - start
+
+    # Warm up so one-off allocation and graph setup are not timed
+    llm_service.summarize_batch(corpus[:1])
+
+    batch_seconds = []
+    summaries: List[Optional[str]] = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        summaries = llm_service.summarize_batch(corpus)
+        batch_seconds.append(time.perf_counter() - start)
+
+    single_seconds = []
+    for subject, body in corpus:
+        start = time.perf_counter()
+        llm_service.summarize_batch([(subject, body)])
+        single_seconds.append(time.perf_counter() - start)
+
+    return {
+        "backend": llm_service.backend,
+        "mock_mode": llm_service.mock_mode,
+        "load_seconds": load_seconds,
+        "batch_ms_per_email": statistics.median(batch_seconds) * 1000 / len(corpus),
+        "single_ms_p50": statistics.median(single_seconds) * 1000,
+        "single_ms_max": max(single_seconds) * 1000,
+        "peak_rss_mb": _peak_rss_mb(),
+        "summaries": summaries
+    }
+
+
+def rouge_l_f1(candidate: str, reference: str) -> float:
+    """ROUGE-L F1 over whitespace tokens"""
+    a, b = (candidate or "").split(), (reference or "").split()
+    if not a or not b:
+        return float(a == b)
+
+    # Longest common subsequence, one row at a time
+    previous = [0] * (len(b) + 1)
+    for token in a:
+        current = [0]
+        for j, other in enumerate(b):
+            current.append(previous[j] + 1 if token == other else max(previous[j + 1], current[j]))
+        previous = current
+    lcs = previous[-1]
+
+    if lcs == 0:
+        return 0.0
+    precision, recall = lcs / len(a), lcs / len(b)
+    return 2 * precision * recall / (precision + recall)
+
+
+def compare(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Score every backend's summaries against the baseline backend"""
+    baseline = next((r for r in results if r.get("requested") == BASELINE_BACKEND), None)
+    report = []
+    for result in results:
+        row = {k: v for k, v in result.items() if k != "summaries"}
+        if baseline and "summaries" in result and "summaries" in baseline:
+            pairs = list(zip(result["summaries"], baseline["summaries"]))
+            row["rouge_l_vs_baseline"] = statistics.mean(rouge_l_f1(c, r) for c, r in pairs)
+            row["exact_match_vs_baseline"] = sum(c == r for c, r in pairs) / len(pairs)
+        report.append(row)
+    return report
+
+
+def spawn_backend(backend: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """Run one backend in a fresh interpreter and collect its result"""
+    env = dict(os.environ, LLM_BACKEND=backend, LLM_NUM_THREADS=str(args.threads))
+    if args.model:
+        env["HUGGINGFACE_MODEL"] = args.model
+
+    process = subprocess.run(
+        [sys.executable, "-m", "benchmarks.llm_backends", "--worker",
+         "--corpus-size", str(args.corpus_size), "--repeats", str(args.repeats)],
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    if process.returncode != 0:
+        return {"requested": backend, "error": process.stderr.strip().splitlines()[-1:]}
+
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    result["requested"] = backend
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare LLM inference backends")
+    parser.add_argument("--backends", nargs="+", default=["torch", "torch-int8", "onnx"])
+    parser.add_argument("--model", default=None, help="Override HUGGINGFACE_MODEL")
+    parser.add_argument("--threads", type=int, default=0, help="LLM_NUM_THREADS for every backend")
+    parser.add_argument("--corpus-size", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=3, help="Timed passes over the corpus in batch mode")
+    parser.add_argument("--output", default=None, help="Also write the report to this JSON file")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_backend(args.corpus_size, args.repeats)))
+        return
+
+    backends = [BASELINE_BACKEND] + [b for b in args.backends if b != BASELINE_BACKEND]
+    report = compare([spawn_backend(backend, args) for backend in backends])
+
+    output = json.dumps({"corpus_size": args.corpus_size, "threads": args.threads, "results": report}, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
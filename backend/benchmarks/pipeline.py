@@ -0,0 +1,372 @@
+"""
+End-to-end benchmark of the fetch -> summarize -> store -> list pipeline.
+
+Generates a synthetic mailbox, serves it from devtools.fake_gmail with the
+given latency, and drives EmailService.fetch_and_summarize_emails over it in
+rounds, each round delivering a new slice of mail the way a busy mailbox
+would. A deterministic stand-in replaces the model so results measure the
+pipeline, not inference; its cost per batch, email and body size is set on
+the command line. Afterwards GET /summaries is paged through the API.
+
+Every stage (Gmail batch requests, parsing, saving emails, summary cache lookup,
+summarizing, saving summaries, notifying, listing and, with --conditional,
+revalidating listed pages) is timed per call, and the report gives
+its throughput and p50/p95/p99 latencies as JSON for regression tracking.
+
+    python -m benchmarks.pipeline --emails 2000 --rounds 20 --latency-ms 20
+    python -m benchmarks.pipeline --html-ratio 0.5 --duplicate-rate 0.3 --model-ms-per-email 5 --output pipeline.json
+"""
+import argparse
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import math
+import os
+import random
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_SENTENCES = [
+    "The finance team needs the updated budget figures for the quarter by Thursday.",
+    "Please include travel and hardware spend and flag any line item over plan.",
+    "We are kicking off the project next Monday at 10am in the main conference room.",
+    "Bring your capacity estimates for the next two sprints and a list of open risks.",
+    "The public website will be offline on Saturday from 1am to 3am for a database upgrade.",
+    "The client reviewed the latest release and asked for faster exports.",
+    "A hands-on training session for the new deployment tooling is scheduled for Wednesday.",
+    "The invoice for the consulting engagement is now fourteen days overdue.",
+    "Vote for one of the three offsite venues in the survey by Friday.",
+    "All staff must rotate their VPN passwords before the end of the week."
+]
+
+_SUBJECTS = [
+    "Quarterly budget review", "Project kickoff", "Maintenance window", "Client feedback",
+    "Training invitation", "Invoice reminder", "Offsite planning", "Security follow-up"
+]
+
+
+def build_messages(
+    count: int,
+    body_chars: int,
+    html_ratio: float,
+    duplicate_rate: float,
+    rnd: random.Random,
+    start: int = 0,
+    previous: Optional[List[Tuple[str, str, bool]]] = None
+) -> List[Tuple[str, str, bool]]:
+    """
+    Generate (subject, body, is_html) tuples for synthetic mail
+
+    Args:
+        count: Number of messages
+        body_chars: Approximate body length in characters
+        html_ratio: Fraction of messages sent as HTML
+        duplicate_rate: Fraction of messages that repeat an earlier message exactly
+        rnd: Random source, so runs with the same seed get the same mail
+        start: Number of messages generated before, used in subjects
+        previous: Messages generated before, which duplicates may repeat
+    """
+    messages = previous if previous is not None else []
+    generated = []
+    for i in range(start, start + count):
+        if messages and rnd.random() < duplicate_rate:
+            message = rnd.choice(messages)
+        else:
+            sentences = []
+            while sum(len(sentence) + 1 for sentence in sentences) < body_chars:
+                sentences.append(rnd.choice(_SENTENCES))
+            html = rnd.random() < html_ratio
+            if html:
+                paragraphs = "".join(f"<p style=\"margin:0 0 8px\">{sentence}</p>" for sentence in sentences)
+                body = (
+                    "<html><head><style>p { font-family: Arial; }</style></head>"
+                    f"<body><table><tr><td>{paragraphs}</td></tr></table></body></html>"
+                )
+            else:
+                body = " ".join(sentences)
+            message = (f"{rnd.choice(_SUBJECTS)} #{i}", body, html)
+        messages.append(message)
+        generated.append(message)
+    return generated
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a list of values"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class StageTimer:
+    """
+    Wall-clock duration and item count of every call to a pipeline stage
+    """
+    def __init__(self):
+        self.calls: Dict[str, List[Tuple[float, int]]] = {}
+
+    def record(self, stage: str, seconds: float, items: int):
+        self.calls.setdefault(stage, []).append((seconds, items))
+
+    def wrap(self, owner: Any, name: str, stage: str, count: Callable[..., int]):
+        """
+        Time every call to a method of an object
+
+        Args:
+            owner: Object whose method is replaced on the instance
+            name: Method name
+            stage: Stage the calls are recorded under
+            count: Called with (result, *args) to get the number of items handled
+        """
+        method = getattr(owner, name)
+
+        if inspect.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def timed(*args, **kwargs):
+                start = time.perf_counter()
+                result = await method(*args, **kwargs)
+                self.record(stage, time.perf_counter() - start, count(result, *args))
+                return result
+        else:
+            @functools.wraps(method)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                result = method(*args, **kwargs)
+                self.record(stage, time.perf_counter() - start, count(result, *args))
+                return result
+
+        setattr(owner, name, timed)
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """Summarize each stage's calls"""
+        report = {}
+        for stage, calls in self.calls.items():
+            durations = [seconds for seconds, _ in calls]
+            items = sum(count for _, count in calls)
+            total = sum(durations)
+            report[stage] = {
+                "calls": len(calls),
+                "items": items,
+                "total_seconds": total,
+                "items_per_second": items / total if total else None,
+                "p50_ms": percentile(durations, 0.50) * 1000,
+                "p95_ms": percentile(durations, 0.95) * 1000,
+                "p99_ms": percentile(durations, 0.99) * 1000,
+                "max_ms": max(durations) * 1000
+            }
+        return report
+
+
+class StandInModel:
+    """
+    Deterministic summarizer with a configurable cost, standing in for LLMService
+
+    Each batch costs batch_ms plus email_ms per email plus kchar_ms per
+    thousand body characters. With spin the time is spent busy on the CPU
+    holding the GIL, like local inference; otherwise it is slept, like a call
+    to a remote model.
+    """
+    model_name = "benchmark-stand-in"
+    backend = "stand-in"
+    mock_mode = False
+
+    def __init__(self, batch_ms: float = 0.0, email_ms: float = 0.0, kchar_ms: float = 0.0, spin: bool = False):
+        self.batch_ms = batch_ms
+        self.email_ms = email_ms
+        self.kchar_ms = kchar_ms
+        self.spin = spin
+
+    def summarize_batch(
+        self,
+        emails: List[Tuple[str, str]],
+        max_length: int = 100,
+        usage: Optional[Dict[str, int]] = None
+    ) -> List[Optional[str]]:
+        chars = sum(len(body) for _, body in emails)
+        self._spend((self.batch_ms + self.email_ms * len(emails) + self.kchar_ms * chars / 1000) / 1000)
+        return [
+            f"Summary of {subject}: {hashlib.sha1(body.encode('utf-8')).hexdigest()[:12]}"
+            for subject, body in emails
+        ]
+
+    def summarize_email(self, subject: str, body: str, max_length: int = 100) -> Optional[str]:
+        return self.summarize_batch([(subject, body)], max_length)[0]
+
+    def _spend(self, seconds: float):
+        if seconds <= 0:
+            return
+        if not self.spin:
+            time.sleep(seconds)
+            return
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            pass
+
+
+def configure_environment(args: argparse.Namespace, workdir: str, endpoint: str):
+    """Point the backend at the fake Gmail server and a scratch database (before app imports)"""
+    os.environ.update({
+        "DATABASE_URL": args.database_url or f"sqlite:///{os.path.join(workdir, 'benchmark.db')}",
+        "GMAIL_API_ENDPOINT": endpoint,
+        "GMAIL_CREDENTIALS_FILE": os.path.join(workdir, "no-credentials.json"),
+        "EMAIL_FETCH_LIMIT": "0",
+        "EMBEDDING_INDEX_DIR": os.path.join(workdir, "embeddings"),
+        "SUMMARY_CACHE_ENABLED": "true" if args.summary_cache else "false",
+        "SUMMARY_WORKERS": "0",  # The stand-in model only exists in this process
+        "EMBEDDINGS_ENABLED": "false",
+        "PIPELINE_QUEUE_SIZE": str(args.queue_size),
+        "PIPELINE_SUMMARY_CONCURRENCY": str(args.summary_concurrency),
+        "HF_HUB_OFFLINE": "1"
+    })
+
+
+async def run_rounds(args: argparse.Namespace, mailbox: Any, timer: StageTimer) -> None:
+    """Deliver mail in rounds and sync it through the pipeline after each one"""
+    from app.db.database import SessionLocal
+    from app.services.email_service import email_service
+    from app.services.gmail_service import GmailService
+    from app.services.websocket_service import connection_manager
+
+    # Wrapped on the class, since every refresh gets its client from the pool
+    timer.wrap(GmailService, "_fetch_batch", "gmail_fetch", lambda result, *_: len(result))
+    timer.wrap(GmailService, "_parse_messages", "gmail_parse", lambda result, *_: len(result))
+    timer.wrap(email_service, "_save_new_emails", "save_emails", lambda result, *_: len(result))
+    timer.wrap(email_service, "_lookup_cached_summaries", "cache_lookup", lambda result, db, items: len(items))
+    timer.wrap(email_service, "_save_summaries", "save_summaries", lambda result, *_: len(result))
+    timer.wrap(connection_manager, "broadcast_new_summary", "notify", lambda *_: 1)
+    timer.wrap(email_service, "fetch_and_summarize_emails", "end_to_end", lambda result, *_: len(result))
+
+    rnd = random.Random(args.seed)
+    delivered: List[Tuple[str, str, bool]] = []
+    per_round = max(1, args.emails // args.rounds)
+
+    await connection_manager.start()
+    db = SessionLocal()
+    try:
+        for round_index in range(args.rounds):
+            count = per_round if round_index < args.rounds - 1 else args.emails - per_round * (args.rounds - 1)
+            for subject, body, html in build_messages(
+                count, args.body_chars, args.html_ratio, args.duplicate_rate, rnd, len(delivered), delivered
+            ):
+                mailbox.add_message(subject, f"Sender {rnd.randrange(50)} <sender@example.com>", body, html=html)
+            await email_service.fetch_and_summarize_emails(db)
+    finally:
+        db.close()
+        await connection_manager.stop()
+
+
+def run_listing(args: argparse.Namespace, timer: StageTimer) -> None:
+    """Page through GET /summaries with the cursor links, as clients do"""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.api.api import api_router
+    from app.core.config import settings
+
+    app = FastAPI()
+    app.include_router(api_router, prefix=settings.API_V1_STR)
+
+    with TestClient(app) as client:
+        cursor = None
+        seen: Dict[Optional[str], Tuple[str, int, Optional[str]]] = {}  # cursor -> (ETag, rows, next cursor)
+        for _ in range(args.page_requests):
+            params = {"limit": args.page_size}
+            if cursor:
+                params["cursor"] = cursor
+            headers = {"If-None-Match": seen[cursor][0]} if args.conditional and cursor in seen else {}
+            start = time.perf_counter()
+            response = client.get(f"{settings.API_V1_STR}/summaries", params=params, headers=headers)
+            elapsed = time.perf_counter() - start
+            if response.status_code == 304:
+                # Revalidated: the client reuses the page it already has
+                _, rows, next_cursor = seen[cursor]
+                timer.record("list_summaries_not_modified", elapsed, rows)
+            else:
+                response.raise_for_status()
+                rows, next_cursor = len(response.json()), response.headers.get("X-Next-Cursor")
+                seen[cursor] = (response.headers.get("ETag"), rows, next_cursor)
+                timer.record("list_summaries", elapsed, rows)
+            cursor = next_cursor  # Start over after the last page
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run the benchmark and build the report"""
+    from devtools.fake_gmail import FakeGmailServer, FakeMailbox
+
+    workdir = tempfile.mkdtemp(prefix="echoloop-bench-")
+    mailbox = FakeMailbox()
+    server = FakeGmailServer(
+        mailbox,
+        latency=args.latency_ms / 1000,
+        batch_item_latency=args.batch_item_latency_ms / 1000
+    ).start()
+    configure_environment(args, workdir, server.url)
+
+    from app.db.init_db import init_db
+    from app.services.model_registry import model_registry
+
+    init_db()
+    timer = StageTimer()
+    model = StandInModel(args.model_batch_ms, args.model_ms_per_email, args.model_ms_per_kchar, args.model_spin)
+    timer.wrap(model, "summarize_batch", "summarize", lambda result, *_: len(result))
+    model_registry.llm_service = model
+    model_registry.status = "ready"
+
+    try:
+        start = time.perf_counter()
+        asyncio.run(run_rounds(args, mailbox, timer))
+        pipeline_seconds = time.perf_counter() - start
+        run_listing(args, timer)
+    finally:
+        server.stop()
+
+    database = os.path.join(workdir, "benchmark.db")
+    return {
+        "config": vars(args),
+        "pipeline_seconds": pipeline_seconds,
+        "emails_per_second": args.emails / pipeline_seconds if pipeline_seconds else None,
+        "gmail_requests": server.request_count,
+        "database_bytes": os.path.getsize(database) if os.path.exists(database) else None,
+        "stages": timer.report()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the email summarization pipeline end to end")
+    parser.add_argument("--emails", type=int, default=1000, help="Messages delivered in total")
+    parser.add_argument("--rounds", type=int, default=10, help="Syncs the messages are spread over")
+    parser.add_argument("--body-chars", type=int, default=1500, help="Approximate body length")
+    parser.add_argument("--html-ratio", type=float, default=0.3, help="Fraction of HTML messages")
+    parser.add_argument("--duplicate-rate", type=float, default=0.1, help="Fraction of messages repeating an earlier one")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=10.0, help="Fake Gmail latency per HTTP request")
+    parser.add_argument("--batch-item-latency-ms", type=float, default=0.0, help="Extra latency per batched request")
+    parser.add_argument("--model-batch-ms", type=float, default=0.0, help="Stand-in model cost per batch")
+    parser.add_argument("--model-ms-per-email", type=float, default=2.0, help="Stand-in model cost per email")
+    parser.add_argument("--model-ms-per-kchar", type=float, default=0.0, help="Stand-in model cost per 1000 body characters")
+    parser.add_argument("--model-spin", action="store_true", help="Spend model time on the CPU instead of sleeping")
+    parser.add_argument("--queue-size", type=int, default=4, help="Batches buffered between pipeline stages")
+    parser.add_argument("--summary-concurrency", type=int, default=2, help="Fetched batches summarized at once")
+    parser.add_argument("--no-summary-cache", dest="summary_cache", action="store_false", help="Disable the summary cache")
+    parser.add_argument("--page-size", type=int, default=50, help="Summaries per GET /summaries page")
+    parser.add_argument("--page-requests", type=int, default=200, help="GET /summaries requests")
+    parser.add_argument("--conditional", action="store_true", help="Revalidate pages already listed with If-None-Match")
+    parser.add_argument("--database-url", default=None, help="Benchmark against this database instead of a scratch SQLite file")
+    parser.add_argument("--output", default=None, help="Also write the report to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="Show the backend's log output")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    output = json.dumps(run(args), indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
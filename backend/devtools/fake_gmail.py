@@ -0,0 +1,372 @@
+"""
+Local stand-in for the parts of the Gmail REST API used by GmailService.
+
+Serves getProfile, messages.list, messages.get, history.list and batch
+requests from an in-memory mailbox and sleeps before every response to
+simulate network latency. Extra mailboxes can be registered per OAuth access
+token to stand in for several connected users.
+Point the backend at it with GMAIL_API_ENDPOINT, e.g.:
+
+    python -m devtools.fake_gmail --port 8765 --messages 200 --latency-ms 80
+    GMAIL_API_ENDPOINT=http://127.0.0.1:8765/ uvicorn app.main:app
+"""
+import argparse
+import base64
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+def _encode(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii")
+
+
+class FakeMailbox:
+    """
+    In-memory mailbox holding Gmail API message resources
+    """
+    def __init__(self, address: str = "fake.user@example.com"):
+        self.address = address
+        self.lock = threading.Lock()
+        self.messages: Dict[str, Dict[str, Any]] = {}
+        self.order: List[str] = []  # Oldest first
+        self.history_id = 1000
+        self.history: List[Tuple[int, str]] = []  # (historyId, message ID) per added message
+        self.history_floor = self.history_id  # Oldest historyId history.list still accepts
+
+    def add_message(
+        self,
+        subject: str,
+        sender: str,
+        body: str,
+        html: bool = False,
+        received_at: Optional[datetime] = None,
+        unread: bool = True
+    ) -> str:
+        """
+        Add a message to the mailbox
+
+        Returns:
+            The new message ID
+        """
+        received_at = received_at or datetime.utcnow()
+        message_id = uuid.uuid4().hex[:16]
+        headers = [
+            {"name": "Subject", "value": subject},
+            {"name": "From", "value": sender},
+            {"name": "Date", "value": received_at.strftime("%a, %d %b %Y %H:%M:%S +0000")}
+        ]
+        mime_type = "text/html" if html else "text/plain"
+
+        with self.lock:
+            self.history_id += 1
+            self.history.append((self.history_id, message_id))
+            self.messages[message_id] = {
+                "id": message_id,
+                "threadId": message_id,
+                "historyId": str(self.history_id),
+                "labelIds": ["INBOX", "UNREAD"] if unread else ["INBOX"],
+                "snippet": body[:100],
+                "internalDate": str(int(received_at.timestamp() * 1000)),
+                "payload": {
+                    "mimeType": "multipart/alternative",
+                    "headers": headers,
+                    "body": {"size": 0},
+                    "parts": [{
+                        "partId": "0",
+                        "mimeType": mime_type,
+                        "headers": [{"name": "Content-Type", "value": f"{mime_type}; charset=UTF-8"}],
+                        "body": {"size": len(body), "data": _encode(body)}
+                    }]
+                }
+            }
+            self.order.append(message_id)
+        return message_id
+
+    def populate(self, count: int, html_ratio: float = 0.0):
+        """Fill the mailbox with simple synthetic messages"""
+        now = datetime.utcnow()
+        html_every = round(1 / html_ratio) if html_ratio > 0 else 0
+        for i in range(count):
+            html = bool(html_every) and i % html_every == 0
+            body = f"Message {i} body. Please review the update and reply by Friday."
+            if html:
+                body = f"<html><body><p>{body}</p></body></html>"
+            self.add_message(
+                subject=f"Synthetic message {i}",
+                sender=f"Sender {i % 7} <sender{i % 7}@example.com>",
+                body=body,
+                html=html,
+                received_at=now - timedelta(minutes=count - i)
+            )
+
+    def list_messages(self, query: str, max_results: int, page_token: Optional[str]) -> Dict[str, Any]:
+        """Implement users.messages.list (only is:unread is honoured in the query)"""
+        with self.lock:
+            ids = list(reversed(self.order))
+            if "is:unread" in query:
+                ids = [i for i in ids if "UNREAD" in self.messages[i]["labelIds"]]
+
+        start = int(page_token or 0)
+        page = ids[start:start + max_results]
+        result = {
+            "messages": [{"id": i, "threadId": i} for i in page],
+            "resultSizeEstimate": len(ids)
+        }
+        if start + max_results < len(ids):
+            result["nextPageToken"] = str(start + max_results)
+        return result
+
+    def get_message(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """Implement users.messages.get"""
+        with self.lock:
+            return self.messages.get(message_id)
+
+    def get_profile(self) -> Dict[str, Any]:
+        """Implement users.getProfile"""
+        with self.lock:
+            return {
+                "emailAddress": self.address,
+                "messagesTotal": len(self.messages),
+                "threadsTotal": len(self.messages),
+                "historyId": str(self.history_id)
+            }
+
+    def list_history(self, start_history_id: int, max_results: int, page_token: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Implement users.history.list for messageAdded records
+
+        Returns:
+            The history page, or None when start_history_id has expired
+        """
+        with self.lock:
+            if start_history_id < self.history_floor:
+                return None
+            records = [
+                {
+                    "id": str(history_id),
+                    "messagesAdded": [{"message": {
+                        "id": message_id,
+                        "threadId": message_id,
+                        "labelIds": self.messages[message_id]["labelIds"]
+                    }}]
+                }
+                for history_id, message_id in self.history
+                if history_id > start_history_id
+            ]
+            current = self.history_id
+
+        start = int(page_token or 0)
+        result = {"history": records[start:start + max_results], "historyId": str(current)}
+        if start + max_results < len(records):
+            result["nextPageToken"] = str(start + max_results)
+        return result
+
+    def expire_history(self):
+        """Forget all history so older historyIds get a 404, as Gmail does after about a week"""
+        with self.lock:
+            self.history_floor = self.history_id
+            self.history = []
+
+
+class FakeGmailHandler(BaseHTTPRequestHandler):
+    """Routes Gmail API requests to the server's FakeMailbox"""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # Keep benchmark output clean
+        pass
+
+    def do_GET(self):
+        self.server.simulate_latency()
+        status, payload = self.server.dispatch("GET", self.path, self._mailbox())
+        self._send(status, "application/json; charset=UTF-8", json.dumps(payload).encode("utf-8"))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        self.server.simulate_latency()
+
+        if urlparse(self.path).path.startswith("/batch"):
+            content_type, response = self.server.dispatch_batch(self.headers["Content-Type"], body, self._mailbox())
+            self._send(200, content_type, response)
+        else:
+            self._send(404, "application/json", json.dumps(_error(404, "Not Found")).encode("utf-8"))
+
+    def _mailbox(self) -> "FakeMailbox":
+        """Pick the mailbox registered for the request's bearer token"""
+        authorization = self.headers.get("Authorization", "")
+        token = authorization[len("Bearer "):] if authorization.startswith("Bearer ") else None
+        return self.server.mailboxes.get(token, self.server.mailbox)
+
+    def _send(self, status: int, content_type: str, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _error(code: int, message: str) -> Dict[str, Any]:
+    return {"error": {"code": code, "message": message, "errors": [{"message": message}]}}
+
+
+class FakeGmailServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server serving a FakeMailbox
+
+    Args:
+        mailbox: Mailbox served to requests without a registered access token
+        latency: Seconds slept before answering each HTTP request
+        batch_item_latency: Extra seconds slept per request inside a batch
+    """
+    daemon_threads = True
+
+    def __init__(
+        self,
+        mailbox: FakeMailbox,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        batch_item_latency: float = 0.0
+    ):
+        super().__init__((host, port), FakeGmailHandler)
+        self.mailbox = mailbox
+        self.mailboxes: Dict[str, FakeMailbox] = {}  # Access token -> mailbox
+        self.latency = latency
+        self.batch_item_latency = batch_item_latency
+        self.request_count = 0
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Endpoint to use as GMAIL_API_ENDPOINT"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> "FakeGmailServer":
+        """Serve on a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving"""
+        self.shutdown()
+        self.server_close()
+
+    def add_mailbox(self, access_token: str, mailbox: FakeMailbox):
+        """Serve a mailbox to requests authorized with the given access token"""
+        self.mailboxes[access_token] = mailbox
+
+    def simulate_latency(self, seconds: Optional[float] = None):
+        self.request_count += 1
+        seconds = self.latency if seconds is None else seconds
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def dispatch(self, method: str, path: str, mailbox: Optional[FakeMailbox] = None) -> Tuple[int, Dict[str, Any]]:
+        """Route a single API call"""
+        mailbox = mailbox or self.mailbox
+        url = urlparse(path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        parts = url.path.strip("/").split("/")
+
+        # gmail/v1/users/{userId}/...
+        if method != "GET" or parts[:3] != ["gmail", "v1", "users"] or len(parts) < 5:
+            return 404, _error(404, "Not Found")
+
+        resource = parts[4:]
+        if resource == ["profile"]:
+            return 200, mailbox.get_profile()
+        if resource == ["history"]:
+            history = mailbox.list_history(
+                int(params.get("startHistoryId", 0)),
+                int(params.get("maxResults", 100)),
+                params.get("pageToken")
+            )
+            if history is None:
+                return 404, _error(404, "Requested entity was not found.")
+            return 200, history
+        if resource == ["messages"]:
+            return 200, mailbox.list_messages(
+                params.get("q", ""),
+                int(params.get("maxResults", 100)),
+                params.get("pageToken")
+            )
+        if len(resource) == 2 and resource[0] == "messages":
+            message = mailbox.get_message(resource[1])
+            if message is None:
+                return 404, _error(404, "Requested entity was not found.")
+            return 200, message
+
+        return 404, _error(404, "Not Found")
+
+    def dispatch_batch(
+        self,
+        content_type: str,
+        body: bytes,
+        mailbox: Optional[FakeMailbox] = None
+    ) -> Tuple[str, bytes]:
+        """Answer a multipart/mixed batch request"""
+        envelope = BytesParser().parsebytes(
+            b"Content-Type: " + content_type.encode("ascii") + b"\r\n\r\n" + body
+        )
+        boundary = f"batch_{uuid.uuid4().hex}"
+        chunks = []
+
+        for part in envelope.get_payload():
+            content_id = part["Content-ID"].strip("<>")
+            request_line = part.get_payload().lstrip().splitlines()[0]
+            method, path = request_line.split(" ")[:2]
+
+            self.simulate_latency(self.batch_item_latency)
+            status, payload = self.dispatch(method, path, mailbox)
+            reason = "OK" if status == 200 else "Not Found"
+            chunks.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {reason}\r\n"
+                "Content-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{json.dumps(payload)}\r\n"
+            )
+
+        chunks.append(f"--{boundary}--\r\n")
+        return f"multipart/mixed; boundary={boundary}", "".join(chunks).encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local Gmail API stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--messages", type=int, default=100, help="Number of synthetic messages")
+    parser.add_argument("--html-ratio", type=float, default=0.0, help="Fraction of HTML messages")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Latency per HTTP request")
+    parser.add_argument("--batch-item-latency-ms", type=float, default=0.0, help="Extra latency per batched request")
+    args = parser.parse_args()
+
+    mailbox = FakeMailbox()
+    mailbox.populate(args.messages, args.html_ratio)
+    server = FakeGmailServer(
+        mailbox,
+        host=args.host,
+        port=args.port,
+        latency=args.latency_ms / 1000,
+        batch_item_latency=args.batch_item_latency_ms / 1000
+    )
+    print(f"Fake Gmail API listening on {server.url} with {args.messages} messages")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Local stand-in for the Redis pub/sub commands used by RedisNotificationBus.
+
+Understands PING, AUTH, SUBSCRIBE, UNSUBSCRIBE, PUBLISH and QUIT over the
+Redis protocol, which is enough to fan notifications out between several
+backend workers without a real Redis server. Point the backend at it with
+NOTIFY_BACKEND and NOTIFY_REDIS_URL, e.g.:
+
+    python -m devtools.fake_redis --port 6390
+    NOTIFY_BACKEND=redis NOTIFY_REDIS_URL=redis://127.0.0.1:6390 uvicorn app.main:app --workers 4
+"""
+import argparse
+import socket
+import socketserver
+import threading
+from typing import Dict, List, Optional, Set
+
+
+def _bulk(data: bytes) -> bytes:
+    return b"$" + str(len(data)).encode() + b"\r\n" + data + b"\r\n"
+
+
+def _array(items: List[bytes]) -> bytes:
+    return b"*" + str(len(items)).encode() + b"\r\n" + b"".join(items)
+
+
+def _integer(value: int) -> bytes:
+    return b":" + str(value).encode() + b"\r\n"
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    """
+    Serves one client connection
+    """
+    def setup(self):
+        super().setup()
+        self.write_lock = threading.Lock()
+        self.channels: Set[bytes] = set()
+
+    def handle(self):
+        while True:
+            command = self._read_command()
+            if command is None:
+                break
+            name, args = command[0].upper(), command[1:]
+            if name == b"QUIT":
+                self.send(b"+OK\r\n")
+                break
+            self.send(self.server.execute(self, name, args))
+
+    def finish(self):
+        self.server.unsubscribe(self, list(self.channels))
+        super().finish()
+
+    def send(self, data: bytes) -> bool:
+        """Write a reply or pushed message; returns False if the client is gone"""
+        try:
+            with self.write_lock:
+                self.wfile.write(data)
+                self.wfile.flush()
+            return True
+        except OSError:
+            return False
+
+    def _read_command(self) -> Optional[List[bytes]]:
+        """Read one RESP array of bulk strings, or an inline command"""
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split() or [b"PING"]
+
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    """
+    Threaded TCP server implementing Redis pub/sub
+
+    Args:
+        password: Password clients must AUTH with, or None to accept anyone
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, password: Optional[str] = None):
+        super().__init__((host, port), FakeRedisHandler)
+        self.password = password
+        self.lock = threading.Lock()
+        self.subscribers: Dict[bytes, Set[FakeRedisHandler]] = {}
+        self.published = 0
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Address to use as NOTIFY_REDIS_URL"""
+        host, port = self.server_address[:2]
+        auth = f":{self.password}@" if self.password else ""
+        return f"redis://{auth}{host}:{port}"
+
+    def start(self) -> "FakeRedisServer":
+        """Serve on a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving"""
+        self.shutdown()
+        self.server_close()
+
+    def execute(self, client: FakeRedisHandler, name: bytes, args: List[bytes]) -> bytes:
+        """Run a command and return its reply"""
+        if name == b"PING":
+            return b"+PONG\r\n"
+        if name == b"AUTH":
+            if self.password is None or (args and args[-1].decode() == self.password):
+                return b"+OK\r\n"
+            return b"-WRONGPASS invalid username-password pair\r\n"
+        if name == b"SUBSCRIBE" and args:
+            replies = []
+            with self.lock:
+                for channel in args:
+                    self.subscribers.setdefault(channel, set()).add(client)
+                    client.channels.add(channel)
+                    replies.append(_array([_bulk(b"subscribe"), _bulk(channel), _integer(len(client.channels))]))
+            return b"".join(replies)
+        if name == b"UNSUBSCRIBE":
+            channels = args or list(client.channels)
+            self.unsubscribe(client, channels)
+            return b"".join(
+                _array([_bulk(b"unsubscribe"), _bulk(channel), _integer(len(client.channels))])
+                for channel in channels
+            )
+        if name == b"PUBLISH" and len(args) == 2:
+            return _integer(self.publish(args[0], args[1]))
+        return b"-ERR unknown command '" + name + b"'\r\n"
+
+    def publish(self, channel: bytes, message: bytes) -> int:
+        """Push a message to every subscriber of a channel"""
+        with self.lock:
+            self.published += 1
+            receivers = list(self.subscribers.get(channel, ()))
+        pushed = _array([_bulk(b"message"), _bulk(channel), _bulk(message)])
+        return sum(1 for receiver in receivers if receiver.send(pushed))
+
+    def unsubscribe(self, client: FakeRedisHandler, channels: List[bytes]):
+        with self.lock:
+            for channel in channels:
+                client.channels.discard(channel)
+                members = self.subscribers.get(channel)
+                if members is not None:
+                    members.discard(client)
+                    if not members:
+                        del self.subscribers[channel]
+
+    def disconnect_all(self):
+        """Drop every client connection, e.g. to exercise reconnects"""
+        with self.lock:
+            clients = {client for members in self.subscribers.values() for client in members}
+        for client in clients:
+            try:
+                client.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local Redis pub/sub stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    parser.add_argument("--password", default=None)
+    args = parser.parse_args()
+
+    server = FakeRedisServer(host=args.host, port=args.port, password=args.password)
+    print(f"Fake Redis pub/sub listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
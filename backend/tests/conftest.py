@@ -0,0 +1,73 @@
+import os
+import tempfile
+
+# Point the app at a scratch database before any app module reads the settings
+_db_dir = tempfile.mkdtemp(prefix="echoloop-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ["DATABASE_ASYNC"] = "false"
+os.environ["EMBEDDINGS_ENABLED"] = "false"
+os.environ["NOTIFY_BACKEND"] = "local"
+os.environ["SUMMARY_WORKERS"] = "0"
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.api import api_router
+from app.core.config import settings
+from app.db.database import Base, SessionLocal
+from app.db.init_db import init_db
+from app.db.repository import EmailRepository, SummaryRepository
+from app.services.page_cache import summary_page_cache
+
+init_db()
+
+@pytest.fixture
+def db():
+    """A session on an empty database"""
+    session = SessionLocal()
+    for table in reversed(Base.metadata.sorted_tables):
+        session.execute(table.delete())
+    session.commit()
+    summary_page_cache.pages.clear()
+    yield session
+    session.close()
+
+@pytest.fixture
+def client(db):
+    """A client for the API routes, without the static frontend"""
+    app = FastAPI()
+    app.include_router(api_router, prefix=settings.API_V1_STR)
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def add_emails(db):
+    """Store emails with summaries and return their email row IDs"""
+    def add(subjects, user_id=None, summaries=None):
+        now = datetime.utcnow()
+        emails = [
+            {
+                "email_id": f"msg-{user_id}-{subject}-{i}",
+                "sender": "Alice <alice@example.com>",
+                "subject": subject,
+                "received_at": now
+            }
+            for i, subject in enumerate(subjects)
+        ]
+        ids = EmailRepository.create_emails_bulk(db, emails, user_id)
+        SummaryRepository.create_summaries_bulk(db, [
+            {
+                "summary_text": summaries[i] if summaries else f"Summary of {subject}",
+                "email_id": email_id,
+                "user_id": user_id,
+                # Distinct timestamps, newest last
+                "created_at": now + timedelta(seconds=i)
+            }
+            for i, (email_id, subject) in enumerate(zip(ids, subjects))
+        ])
+        return ids
+    return add
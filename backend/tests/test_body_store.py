@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from app.db.repository import EmailRepository, SearchRepository, SummaryRepository
+from app.services.body_store import BodyStore
+from app.utils.compression import zstandard
+
+BODIES = [
+    "Hi team,\n\nThe quarterly report is attached. Café at 3pm? ✓\n\nThanks,\nAlice",
+    "",
+    "x" * 100_000,
+]
+
+CODECS = ["raw", "zlib"] + (["zstd"] if zstandard is not None else [])
+
+def save_emails(db, store, bodies, user_id=None, received_at=None):
+    ids = EmailRepository.create_emails_bulk(db, [
+        {
+            "email_id": f"msg-{i}",
+            "sender": "alice@example.com",
+            "subject": f"Subject {i}",
+            "received_at": received_at or datetime.utcnow()
+        }
+        for i in range(len(bodies))
+    ], user_id)
+    store.save(db, dict(zip(ids, bodies)))
+    return ids
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_bodies_round_trip(db, codec):
+    store = BodyStore(codec=codec, dictionary_size=0)
+    ids = save_emails(db, store, BODIES)
+    assert [store.load(db, email_id)["body"] for email_id in ids] == BODIES
+
+def test_bodies_are_compressed(db):
+    store = BodyStore(codec="zlib", dictionary_size=0)
+    save_emails(db, store, BODIES)
+    stats = store.stats(db)
+    assert stats["bodies"] == len(BODIES)
+    assert stats["compressed_size"] < stats["size"] / 10
+
+def test_bodies_are_private_to_their_mailbox(db):
+    store = BodyStore(codec="zlib", dictionary_size=0)
+    email_id, = save_emails(db, store, ["secret"], user_id=1)
+    assert store.load(db, email_id, 1)["body"] == "secret"
+    assert store.load(db, email_id) is None
+    assert store.load(db, email_id, 2) is None
+
+@pytest.mark.parametrize("codec", [codec for codec in CODECS if codec != "raw"])
+def test_dictionary_is_trained_and_used(db, codec):
+    store = BodyStore(codec=codec, dictionary_size=4096, dictionary_samples=20)
+    samples = [f"Dear customer {i}, your order #{i * 7} has shipped. Track it in your account." for i in range(20)]
+    save_emails(db, store, samples)
+    dictionary_id = store.train(db)
+    assert dictionary_id is not None
+
+    later = "Dear customer 99, your order #693 has shipped. Track it in your account."
+    email_id, = EmailRepository.create_emails_bulk(db, [
+        {"email_id": "later", "sender": "shop@example.com", "subject": "Shipped", "received_at": datetime.utcnow()}
+    ])
+    store.save(db, {email_id: later})
+    # A fresh store reads the dictionary back from the database
+    reader = BodyStore(codec=codec)
+    assert reader.load(db, email_id)["body"] == later
+    assert reader.stats(db)["dictionary_id"] == dictionary_id
+
+def test_legacy_inline_bodies_are_migrated(db):
+    store = BodyStore(codec="zlib", dictionary_size=0)
+    email_id, = EmailRepository.create_emails_bulk(db, [
+        {"email_id": "legacy", "sender": "a@example.com", "subject": "Old", "received_at": datetime.utcnow()}
+    ])
+    db.execute(text("UPDATE emails SET body = 'stored inline by an older version' WHERE id = :id"), {"id": email_id})
+    db.commit()
+    assert store.load(db, email_id)["body"] == "stored inline by an older version"
+
+    assert store.migrate_legacy(db) == 1
+    assert store.stats(db)["legacy_bodies"] == 0
+    assert store.load(db, email_id)["body"] == "stored inline by an older version"
+    assert [row["id"] for row in SearchRepository.search(db, "inline")] == [email_id]
+
+def test_retention_drops_old_summarized_bodies(db):
+    store = BodyStore(codec="zlib", dictionary_size=0)
+    old_id, = save_emails(db, store, ["old newsletter"], received_at=datetime.utcnow() - timedelta(days=30))
+    unsummarized_id, = save_emails(db, store, ["old but unsummarized"], user_id=1, received_at=datetime.utcnow() - timedelta(days=30))
+    SummaryRepository.create_summaries_bulk(db, [{"summary_text": "A newsletter", "email_id": old_id}])
+
+    assert store.apply_retention(db, datetime.utcnow() - timedelta(days=7)) == 1
+    # The email and its summary stay, without a body
+    assert store.load(db, old_id) == {"id": old_id, "body": None}
+    assert store.load(db, unsummarized_id, 1)["body"] == "old but unsummarized"
+    assert SearchRepository.search(db, "newsletter")[0]["id"] == old_id
+    assert SearchRepository.search(db, "old") == []
@@ -0,0 +1,60 @@
+import base64
+
+from app.core.config import settings
+from app.services.gmail_service import GmailService
+from app.utils.mime import extract_text
+
+def encode(text, charset="utf-8"):
+    return base64.urlsafe_b64encode(text.encode(charset)).decode("ascii")
+
+def part(mime_type, body, charset="utf-8", **extra):
+    return {
+        "mimeType": mime_type,
+        "headers": [{"name": "Content-Type", "value": f"{mime_type}; charset={charset}"}],
+        "body": {"data": encode(body, charset)},
+        **extra
+    }
+
+HTML = "<html><head><title>Ignored</title><style>p {}</style></head><body><p>Hello</p><p>World &amp; more</p></body></html>"
+
+def test_multipart_prefers_plain_text():
+    payload = {
+        "mimeType": "multipart/alternative",
+        "parts": [part("text/html", HTML), part("text/plain", "Plain body")]
+    }
+    assert extract_text(payload) == "Plain body"
+
+def test_nested_multipart_skips_attachments():
+    payload = {
+        "mimeType": "multipart/mixed",
+        "parts": [
+            {"mimeType": "multipart/alternative", "parts": [part("text/plain", "Nested body")]},
+            part("text/plain", "Attached notes", filename="notes.txt")
+        ]
+    }
+    assert extract_text(payload) == "Nested body"
+
+def test_html_only_message_is_converted():
+    text = extract_text(part("text/html", HTML))
+    assert "Hello" in text and "World & more" in text
+    assert "Ignored" not in text
+    assert text.index("Hello") < text.index("World")
+    assert "\n" in text
+
+def test_html_alternative_when_no_plain_part():
+    payload = {"mimeType": "multipart/alternative", "parts": [part("text/html", HTML)]}
+    assert "Hello" in extract_text(payload)
+
+def test_declared_charset_and_limit():
+    assert extract_text(part("text/plain", "café crème", charset="iso-8859-1")) == "café crème"
+    assert extract_text(part("text/plain", "x" * 1000), max_chars=10) == "x" * 10
+
+def test_message_without_text():
+    payload = {"mimeType": "multipart/mixed", "parts": [part("image/png", "png", filename="a.png")]}
+    assert extract_text(payload) is None
+
+def test_stored_bodies_are_not_cut_by_default():
+    body = "word " * 20_000
+    message = {"id": "msg", "payload": {**part("text/plain", body), "headers": [{"name": "Subject", "value": "Long"}]}}
+    assert settings.EMAIL_BODY_MAX_CHARS == 0
+    assert GmailService()._parse_message(message)["body"] == body
@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from app.services.notification_bus import LocalNotificationBus, RedisNotificationBus
+from devtools.fake_redis import FakeRedisServer
+
+@pytest.fixture
+def broker():
+    server = FakeRedisServer(password="secret").start()
+    yield server
+    server.stop()
+
+class Inbox:
+    """Notification handler collecting what it receives"""
+    def __init__(self):
+        self.received = []
+        self.arrived = asyncio.Event()
+
+    async def __call__(self, user_id, message):
+        self.received.append((user_id, message))
+        self.arrived.set()
+
+    async def wait_for(self, count):
+        while len(self.received) < count:
+            self.arrived.clear()
+            await asyncio.wait_for(self.arrived.wait(), 5)
+
+def test_local_bus_delivers_to_its_handler():
+    async def run():
+        bus = LocalNotificationBus()
+        inbox = Inbox()
+        await bus.start(inbox)
+        await bus.publish(1, {"type": "new_summary"})
+        await bus.stop()
+        await bus.publish(1, {"type": "dropped"})
+        return inbox.received
+
+    assert asyncio.run(run()) == [(1, {"type": "new_summary"})]
+
+def test_redis_bus_fans_out_to_every_worker(broker):
+    async def run():
+        workers = [RedisNotificationBus(broker.url, "test") for _ in range(3)]
+        inboxes = [Inbox() for _ in workers]
+        for bus, inbox in zip(workers, inboxes):
+            await bus.start(inbox)
+            await bus.wait_subscribed(5)
+
+        await workers[0].publish(None, {"n": 1})
+        await workers[2].publish(7, {"n": 2})
+        for inbox in inboxes:
+            await inbox.wait_for(2)
+        for bus in workers:
+            await bus.stop()
+        return inboxes
+
+    for inbox in asyncio.run(run()):
+        assert inbox.received == [(None, {"n": 1}), (7, {"n": 2})]
+
+def test_redis_bus_resubscribes_after_disconnect(broker, monkeypatch):
+    monkeypatch.setattr(RedisNotificationBus, "RECONNECT_DELAY", 0.05)
+
+    async def run():
+        bus = RedisNotificationBus(broker.url, "test")
+        inbox = Inbox()
+        await bus.start(inbox)
+        await bus.wait_subscribed(5)
+
+        broker.disconnect_all()
+        while bus.reconnects == 0:
+            await asyncio.sleep(0.01)
+        await bus.wait_subscribed(5)
+        await bus.publish(None, {"after": "reconnect"})
+        await inbox.wait_for(1)
+        await bus.stop()
+        return inbox.received
+
+    assert asyncio.run(run()) == [(None, {"after": "reconnect"})]
+
+def test_handler_errors_do_not_stop_the_subscriber(broker):
+    async def run():
+        bus = RedisNotificationBus(broker.url, "test")
+        inbox = Inbox()
+
+        async def handler(user_id, message):
+            if message.get("fail"):
+                raise RuntimeError("handler failed")
+            await inbox(user_id, message)
+
+        await bus.start(handler)
+        await bus.wait_subscribed(5)
+        await bus.publish(None, {"fail": True})
+        await bus.publish(None, {"fail": False})
+        await inbox.wait_for(1)
+        await bus.stop()
+        return inbox.received
+
+    assert asyncio.run(run()) == [(None, {"fail": False})]
+
+def test_wrong_password_counts_publish_errors(broker):
+    async def run():
+        bus = RedisNotificationBus(broker.url.replace("secret", "wrong"), "test")
+        await bus.publish(None, {})
+        await bus.stop()
+        return bus.stats()
+
+    assert asyncio.run(run())["publish_errors"] == 1
+
+@pytest.mark.parametrize("url", ["http://localhost:6379", "redis://localhost:notaport", "unix://"])
+def test_malformed_broker_url_is_rejected(url):
+    with pytest.raises(ValueError):
+        RedisNotificationBus(url)
@@ -0,0 +1,59 @@
+from app.db.repository import SummaryRepository
+from app.services.page_cache import SummaryPageCache, etag_matches, make_etag
+
+KEY = (None, 0, None, 100)
+
+def test_etag_matches():
+    etag = make_etag(KEY, 3)
+    assert etag_matches(etag, etag)
+    assert etag_matches(f"W/{etag}", etag)
+    assert etag_matches(f'"other", {etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches(make_etag(KEY, 4), etag)
+    assert not etag_matches(make_etag((None, 0, None, 50), 3), etag)
+
+def test_page_cache_drops_stale_versions():
+    cache = SummaryPageCache(max_entries=2)
+    cache.put(KEY, 1, b"[]", None)
+    assert cache.get(KEY, 1).body == b"[]"
+    assert cache.get(KEY, 2) is None
+    assert cache.get(KEY, 1) is None
+    assert cache.stats()["entries"] == 0
+
+def test_page_cache_evicts_least_recently_used():
+    cache = SummaryPageCache(max_entries=2)
+    for skip in range(3):
+        cache.put((None, skip, None, 100), 1, b"[]", None)
+    assert cache.get((None, 0, None, 100), 1) is None
+    assert cache.get((None, 2, None, 100), 1) is not None
+
+def test_version_bumps_on_insert_and_seen(db, add_emails):
+    assert SummaryRepository.get_version(db) == 0
+    add_emails(["first"])
+    after_insert = SummaryRepository.get_version(db)
+    assert after_insert > 0
+
+    summary = SummaryRepository.get_summaries(db)[0]
+    SummaryRepository.mark_as_seen(db, summary.id)
+    assert SummaryRepository.get_version(db) > after_insert
+    # Other mailboxes keep their version
+    assert SummaryRepository.get_version(db, 1) == 0
+
+def test_summaries_revalidate(client, add_emails):
+    add_emails(["first"])
+    response = client.get("/api/v1/summaries")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    not_modified = client.get("/api/v1/summaries", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == etag
+
+    summary_id = response.json()[0]["summary_id"]
+    assert client.put(f"/api/v1/summaries/{summary_id}/seen").status_code == 200
+
+    changed = client.get("/api/v1/summaries", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()[0]["seen"] is True
@@ -0,0 +1,39 @@
+from datetime import datetime
+
+import pytest
+
+from app.utils.pagination import decode_cursor, encode_cursor
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 17, 9, 30, 15, 123456)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor(datetime(2024, 5, 17, 9, 30, 15), 7)
+    assert "=" not in cursor
+    assert "/" not in cursor and "+" not in cursor
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", "bm9waXBl", encode_cursor(datetime(2024, 1, 1), 1)[:-3]])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+def test_pages_follow_cursor(client, add_emails):
+    add_emails([f"subject {i}" for i in range(5)])
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/v1/summaries", params=params)
+        assert response.status_code == 200
+        seen += [row["subject"] for row in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert seen == [f"subject {i}" for i in reversed(range(5))]
+
+def test_bad_cursor_is_rejected(client):
+    response = client.get("/api/v1/summaries", params={"cursor": "not a cursor"})
+    assert response.status_code == 400
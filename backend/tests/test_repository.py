@@ -0,0 +1,41 @@
+from datetime import datetime
+
+from app.db.repository import EmailRepository, SummaryRepository
+from app.models.email import EmailSummary
+
+def new_emails(count, prefix="msg"):
+    return [
+        {"email_id": f"{prefix}-{i}", "sender": "a@example.com", "subject": f"Subject {i}", "received_at": datetime.utcnow()}
+        for i in range(count)
+    ]
+
+def test_bulk_emails_return_ids_in_input_order(db):
+    emails = new_emails(50)
+    ids = EmailRepository.create_emails_bulk(db, emails[::-1])
+    assert [EmailRepository.get_email(db, email_id).email_id for email_id in ids] == [e["email_id"] for e in emails[::-1]]
+
+def test_bulk_summaries_return_their_own_ids(db):
+    email_ids = EmailRepository.create_emails_bulk(db, new_emails(1200))
+    summary_ids = SummaryRepository.create_summaries_bulk(db, [
+        {"summary_text": f"Summary {email_id}", "email_id": email_id} for email_id in email_ids
+    ])
+    assert len(set(summary_ids)) == len(email_ids)
+    for summary_id, email_id in zip(summary_ids, email_ids):
+        summary = db.get(EmailSummary, summary_id)
+        assert (summary.email_id, summary.summary_text) == (email_id, f"Summary {email_id}")
+
+def test_bulk_summaries_bump_each_mailbox_once(db):
+    default_ids = EmailRepository.create_emails_bulk(db, new_emails(3))
+    user_ids = EmailRepository.create_emails_bulk(db, new_emails(2), user_id=1)
+    SummaryRepository.create_summaries_bulk(db, [
+        *({"summary_text": "s", "email_id": email_id} for email_id in default_ids),
+        *({"summary_text": "s", "email_id": email_id, "user_id": 1} for email_id in user_ids)
+    ])
+    assert SummaryRepository.get_version(db) == 1
+    assert SummaryRepository.get_version(db, 1) == 1
+    assert SummaryRepository.get_version(db, 2) == 0
+
+def test_empty_bulk_inserts(db):
+    assert EmailRepository.create_emails_bulk(db, []) == []
+    assert SummaryRepository.create_summaries_bulk(db, []) == []
+    assert SummaryRepository.get_version(db) == 0
@@ -0,0 +1,63 @@
+from datetime import datetime
+
+from sqlalchemy import text
+
+from app.db.repository import SearchRepository, SummaryRepository
+
+def subjects(db, query, user_id=None):
+    return [row["subject"] for row in SearchRepository.search(db, query, user_id=user_id)]
+
+def test_insert_is_indexed(db, add_emails):
+    add_emails(["quarterly budget", "team lunch"], summaries=["Numbers are due friday", "Pizza at noon"])
+    assert subjects(db, "budget") == ["quarterly budget"]
+    assert subjects(db, "pizza") == ["team lunch"]
+    assert subjects(db, "budg*") == ["quarterly budget"]
+    assert subjects(db, "budget lunch") == []
+
+def test_update_is_indexed(db, add_emails):
+    email_id, = add_emails(["quarterly budget"], summaries=["Numbers are due friday"])
+    db.execute(text("UPDATE emails SET subject = 'renamed report' WHERE id = :id"), {"id": email_id})
+    db.commit()
+    assert subjects(db, "quarterly") == []
+    assert subjects(db, "renamed") == ["renamed report"]
+    # The summary is still indexed under the new subject
+    assert subjects(db, "friday") == ["renamed report"]
+
+def test_latest_summary_is_indexed(db, add_emails):
+    email_id, = add_emails(["quarterly budget"], summaries=["first draft"])
+    SummaryRepository.create_summaries_bulk(db, [
+        {"summary_text": "second take", "email_id": email_id, "user_id": None, "created_at": datetime.utcnow()}
+    ])
+    assert subjects(db, "draft") == []
+    assert subjects(db, "second") == ["quarterly budget"]
+
+    latest = SummaryRepository.get_summaries(db)[0]
+    db.delete(latest)
+    db.commit()
+    assert subjects(db, "second") == []
+    assert subjects(db, "draft") == ["quarterly budget"]
+
+def test_delete_is_unindexed(db, add_emails):
+    email_id, = add_emails(["quarterly budget"])
+    db.execute(text("DELETE FROM email_summaries WHERE email_id = :id"), {"id": email_id})
+    db.execute(text("DELETE FROM emails WHERE id = :id"), {"id": email_id})
+    db.commit()
+    assert subjects(db, "budget") == []
+
+def test_results_are_scoped_to_owner(db, add_emails):
+    add_emails(["default budget"])
+    add_emails(["user budget"], user_id=1)
+    add_emails(["other budget"], user_id=2)
+    assert subjects(db, "budget") == ["default budget"]
+    assert subjects(db, "budget", user_id=1) == ["user budget"]
+    # An owner token in the query does not widen the search
+    assert subjects(db, "owner user2 budget", user_id=1) == []
+
+def test_query_syntax_is_quoted(db, add_emails):
+    add_emails(["quarterly budget"])
+    for query in ['"); DROP TABLE emails; --', "budget OR lunch", "NEAR(budget", "subject:budget", "*", "-budget"]:
+        SearchRepository.search(db, query)
+    assert subjects(db, "budget OR lunch") == []
+    assert subjects(db, "subject:budget") == []
+    assert subjects(db, "(budget)") == ["quarterly budget"]
+    assert subjects(db, "  ") == []
@@ -0,0 +1,72 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+from starlette.websockets import WebSocketDisconnect
+
+from app.api.deps import create_session
+from app.core.config import settings
+from app.db.repository import EmailRepository, UserRepository
+
+def connect_account(db, address):
+    """Store a connected account and start a session for it"""
+    user = UserRepository.save_gmail_token(db, address, '{"token": "t"}')
+    return user.id, asyncio.run(create_session(db, user.id))
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+def test_default_mailbox_is_open_until_an_account_exists(db, client):
+    assert client.get("/api/v1/summaries").status_code == 200
+    connect_account(db, "a@example.com")
+    response = client.get("/api/v1/summaries")
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Not signed in"
+
+def test_sessions_see_only_their_mailbox(db, client, add_emails):
+    alice, alice_token = connect_account(db, "a@example.com")
+    bob, bob_token = connect_account(db, "b@example.com")
+    add_emails(["for alice"], user_id=alice)
+    add_emails(["for bob"], user_id=bob)
+
+    assert [row["subject"] for row in client.get("/api/v1/summaries", headers=bearer(alice_token)).json()] == ["for alice"]
+    client.cookies.set(settings.SESSION_COOKIE_NAME, bob_token)
+    assert [row["subject"] for row in client.get("/api/v1/summaries").json()] == ["for bob"]
+
+def test_unknown_and_ended_sessions_are_rejected(db, client):
+    _, token = connect_account(db, "a@example.com")
+    assert client.get("/api/v1/summaries", headers=bearer("forged")).status_code == 401
+    assert client.post("/api/v1/auth/logout", headers=bearer(token)).status_code == 204
+    assert client.get("/api/v1/summaries", headers=bearer(token)).status_code == 401
+
+def test_websocket_needs_a_session_once_accounts_exist(db, client):
+    _, token = connect_account(db, "a@example.com")
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with client.websocket_connect("/api/v1/ws") as websocket:
+            websocket.receive_text()
+    assert closed.value.code == 1008
+    with client.websocket_connect("/api/v1/ws", headers=bearer(token)) as websocket:
+        websocket.send_text('{"type": "ping"}')
+        assert websocket.receive_json() == {"type": "pong"}
+
+@pytest.mark.parametrize("path", ["/cache/stats", "/sync/stats", "/embeddings/stats", "/bodies/stats", "/ws/stats"])
+def test_stats_need_the_stats_token(db, client, monkeypatch, path):
+    assert client.get(f"/api/v1{path}").status_code == 200
+    _, session_token = connect_account(db, "a@example.com")
+    # A user's session does not grant access to server-wide stats
+    assert client.get(f"/api/v1{path}", headers=bearer(session_token)).status_code == 401
+
+    monkeypatch.setattr(settings, "STATS_TOKEN", "operator")
+    assert client.get(f"/api/v1{path}").status_code == 401
+    assert client.get(f"/api/v1{path}", headers=bearer("wrong")).status_code == 401
+    assert client.get(f"/api/v1{path}", headers=bearer("operator")).status_code == 200
+
+def test_gmail_ids_are_unique_per_mailbox(db):
+    email = {"email_id": "msg", "sender": "a@example.com", "subject": "Hi", "received_at": datetime.utcnow()}
+    EmailRepository.create_emails_bulk(db, [email])
+    # The same message in another mailbox is a different email
+    EmailRepository.create_emails_bulk(db, [email], user_id=1)
+    with pytest.raises(IntegrityError):
+        EmailRepository.create_emails_bulk(db, [email])
+    db.rollback()
@@ -0,0 +1,112 @@
+import asyncio
+import time
+from datetime import datetime
+
+import pytest
+
+from app.db.repository import EmailRepository, SummaryRepository
+from app.services.email_service import email_service
+from app.services.summarization_queue import SummarizationJob, SummarizationQueue, summarization_queue
+
+def summarize(chunk):
+    time.sleep(0.01)
+    return [f"Summary of {subject}" for subject, _ in chunk], True, {"seconds": 0.01}
+
+@pytest.fixture
+def queue(monkeypatch):
+    """A queue on a worker thread, summarizing without a model"""
+    queue = SummarizationQueue(workers=0)
+    schedule = queue._schedule
+    monkeypatch.setattr(queue, "_schedule", lambda tenant, chunk, fn=summarize: schedule(tenant, chunk, fn))
+    yield queue
+    queue.shutdown()
+
+def emails(count, prefix="email"):
+    return [(f"{prefix} {i}", "body") for i in range(count)]
+
+def test_every_chunk_is_yielded(queue):
+    async def run():
+        return [chunk async for chunk in queue.summarize_chunks(emails(7), chunk_size=3)]
+
+    chunks = asyncio.run(run())
+    assert sorted(len(indices) for indices, _, _ in chunks) == [1, 3, 3]
+    by_index = {i: summary for indices, summaries, _ in chunks for i, summary in zip(indices, summaries)}
+    assert by_index == {i: f"Summary of email {i}" for i in range(7)}
+
+def test_closing_early_cancels_queued_chunks(queue, monkeypatch):
+    calls = []
+
+    def slow(chunk):
+        calls.append(len(chunk))
+        return summarize(chunk)
+
+    schedule = queue._schedule
+    monkeypatch.setattr(queue, "_schedule", lambda tenant, chunk, fn=slow: schedule(tenant, chunk, fn))
+
+    async def run():
+        chunks = queue.summarize_chunks(emails(40), chunk_size=2)
+        async for _ in chunks:
+            break
+        await chunks.aclose()
+        await asyncio.sleep(0.2)
+
+    asyncio.run(run())
+    assert len(calls) < 20
+    assert not queue._pending
+    assert queue._in_flight == 0
+
+def test_tenants_take_turns(queue):
+    order = []
+
+    def record(chunk):
+        order.append(chunk[0][0])
+        return summarize(chunk)
+
+    async def run():
+        futures = [queue._schedule("big", [(f"big {i}", "")], record) for i in range(4)]
+        futures += [queue._schedule("small", [(f"small {i}", "")], record) for i in range(2)]
+        await asyncio.gather(*futures)
+
+    asyncio.run(run())
+    # Two chunks go straight to the worker; the rest alternate between tenants
+    assert order == ["big 0", "big 1", "big 2", "small 0", "big 3", "small 1"]
+
+def test_failed_job_is_recorded(queue):
+    async def fail(job):
+        raise RuntimeError("broken")
+
+    async def run():
+        job = queue.submit(fail)
+        await queue.wait(job)
+        return job
+
+    job = asyncio.run(run())
+    assert job.status == "failed"
+    assert job.error == "broken"
+    assert job.finished_at is not None
+
+def test_refresh_job_summarizes_the_mailbox(db):
+    async def run():
+        job = email_service.start_refresh_job()
+        await summarization_queue.wait(job)
+        return job
+
+    job = asyncio.run(run())
+    assert job.status == "completed", job.error
+    assert job.total == 10
+    assert len(job.summary_ids) == 10
+    assert job.processed == 10
+    assert len(SummaryRepository.get_summaries(db)) == 10
+
+def test_job_counts_only_saved_summaries(db):
+    emails = [
+        {"email_id": f"msg-{i}", "sender": "a@example.com", "subject": f"Subject {i}", "received_at": datetime.utcnow()}
+        for i in range(3)
+    ]
+    ids = EmailRepository.create_emails_bulk(db, emails)
+    job = SummarizationJob()
+
+    summaries = asyncio.run(email_service._publish_summaries(db, list(zip(ids, emails)), ["first", None, "third"], None, job))
+    assert [summary["summary_text"] for summary in summaries] == ["first", "third"]
+    assert job.processed == 2
+    assert job.summary_ids == [summary["summary_id"] for summary in summaries]
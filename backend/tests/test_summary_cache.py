@@ -0,0 +1,32 @@
+from app.core.config import settings
+from app.services.llm_service import LLMService
+from app.services.summary_cache import SummaryCache
+
+LIMIT = LLMService.BODY_CHAR_LIMIT
+
+def test_key_covers_exactly_the_prompt_body():
+    cache = SummaryCache()
+    body = "a" * LIMIT
+    # Text past the prompt's cutoff never reaches the model
+    assert cache.make_key("Hi", body + " first tail") == cache.make_key("Hi", body + " second tail")
+    # Whitespace inside the cutoff does
+    assert cache.make_key("Hi", "one  two") != cache.make_key("Hi", "one two")
+    assert cache.make_key("Hi", "body") != cache.make_key("Hello", "body")
+
+def test_long_mode_keys_cover_the_whole_body(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_LONG_MODE", True)
+    cache = SummaryCache()
+    body = "a" * LIMIT
+    assert cache.make_key("Hi", body + " first tail") != cache.make_key("Hi", body + " second tail")
+
+def test_prompt_uses_the_same_body():
+    service = LLMService.__new__(LLMService)
+    body = "word " * LIMIT
+    assert service._build_prompt("Hi", body).endswith("Body: " + LLMService.prompt_body(body))
+    assert len(LLMService.prompt_body(body)) == LIMIT
+
+def test_long_mode_keys_differ_from_short_mode(monkeypatch):
+    cache = SummaryCache()
+    short_key = cache.make_key("Hi", "body")
+    monkeypatch.setattr(settings, "LLM_LONG_MODE", True)
+    assert cache.make_key("Hi", "body") != short_key
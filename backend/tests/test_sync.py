@@ -0,0 +1,23 @@
+import asyncio
+
+import pytest
+
+from app.db.repository import EmailRepository, SyncStateRepository, mailbox_key
+from app.services.email_service import email_service
+from app.services.gmail_service import gmail_service
+
+def test_listing_error_fails_the_sync(db, monkeypatch):
+    def fail(*args):
+        raise RuntimeError("quota exceeded")
+
+    monkeypatch.setattr(gmail_service, "use_mock", False)
+    monkeypatch.setattr(gmail_service, "_list_new_message_ids", fail)
+
+    with pytest.raises(RuntimeError, match="quota exceeded"):
+        asyncio.run(email_service.fetch_and_summarize_emails(db))
+
+    # No mock mail stands in for the real mailbox, and the next sync starts from the same place
+    assert EmailRepository.get_emails(db) == []
+    assert SyncStateRepository.get_history_id(db, mailbox_key(None)) is None
+    # The lease was released
+    assert SyncStateRepository.acquire_lease(db, mailbox_key(None), "other-worker", 60)
@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.repository import SyncStateRepository, mailbox_key
+from app.services.email_service import email_service
+from app.services.sync_scheduler import MailboxSchedule, SyncScheduler
+
+DEFAULT = mailbox_key(None)
+
+def test_lease_is_exclusive(db):
+    assert SyncStateRepository.acquire_lease(db, DEFAULT, "worker-a", 60)
+    assert not SyncStateRepository.acquire_lease(db, DEFAULT, "worker-b", 60)
+    # Other mailboxes are leased separately
+    assert SyncStateRepository.acquire_lease(db, mailbox_key(1), "worker-b", 60)
+
+def test_owner_renews_its_lease(db):
+    assert SyncStateRepository.acquire_lease(db, DEFAULT, "worker-a", 0.05)
+    assert SyncStateRepository.acquire_lease(db, DEFAULT, "worker-a", 60)
+    time.sleep(0.1)
+    assert not SyncStateRepository.acquire_lease(db, DEFAULT, "worker-b", 60)
+
+def test_expired_lease_is_taken_over(db):
+    assert SyncStateRepository.acquire_lease(db, DEFAULT, "worker-a", 0.05)
+    time.sleep(0.1)
+    assert SyncStateRepository.acquire_lease(db, DEFAULT, "worker-b", 60)
+    assert not SyncStateRepository.acquire_lease(db, DEFAULT, "worker-a", 60)
+
+def test_only_the_owner_releases(db):
+    SyncStateRepository.acquire_lease(db, DEFAULT, "worker-a", 60)
+    SyncStateRepository.release_lease(db, DEFAULT, "worker-b")
+    assert not SyncStateRepository.acquire_lease(db, DEFAULT, "worker-b", 60)
+    SyncStateRepository.release_lease(db, DEFAULT, "worker-a")
+    assert SyncStateRepository.acquire_lease(db, DEFAULT, "worker-b", 60)
+
+def test_sync_skips_a_mailbox_leased_elsewhere(db):
+    SyncStateRepository.acquire_lease(db, DEFAULT, "other-worker", 60)
+    assert asyncio.run(email_service.fetch_and_summarize_emails(db)) == []
+
+def test_lease_is_renewed_while_syncing(db, monkeypatch):
+    monkeypatch.setattr(settings, "SYNC_LEASE_SECONDS", 0.15)
+
+    async def hold():
+        async with email_service._mailbox_lease(None) as leased:
+            assert leased
+            # Outlive the lease several times over
+            await asyncio.sleep(0.5)
+            assert not SyncStateRepository.acquire_lease(db, DEFAULT, "other-worker", 60)
+        # Released on exit
+        assert SyncStateRepository.acquire_lease(db, DEFAULT, "other-worker", 60)
+
+    asyncio.run(hold())
+
+def test_sync_metrics_are_exported():
+    scheduler = SyncScheduler(min_interval=30, max_interval=600)
+    synced = MailboxSchedule(None, 30)
+    synced.last_synced = time.monotonic() - 12
+    backing_off = MailboxSchedule(1, 240)
+    scheduler.mailboxes = {None: synced, 1: backing_off}
+    scheduler.syncs, scheduler.failures, scheduler.total_duration = 5, 1, 2.5
+
+    collected = {name: samples for name, _, _, samples in scheduler.collect_metrics()}
+    assert collected["echoloop_sync_runs_total"] == [({}, 5)]
+    assert collected["echoloop_sync_failures_total"] == [({}, 1)]
+    (labels, lag), = collected["echoloop_sync_lag_seconds"]
+    assert labels == {"mailbox": DEFAULT} and 12 <= lag < 13
+    assert collected["echoloop_sync_interval_seconds"] == [({"mailbox": DEFAULT}, 30), ({"mailbox": mailbox_key(1)}, 240)]
+
+def test_sync_metrics_are_scraped():
+    rendered = metrics.render()
+    assert "# TYPE echoloop_sync_runs_total counter" in rendered
+    assert "# TYPE echoloop_sync_lag_seconds gauge" in rendered